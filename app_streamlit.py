@@ -2044,7 +2044,16 @@ with tab_setups:
     ):
         st.session_state.historical_manager = create_historical_manager(symbol_hist, timeframe_hist)
         st.session_state.historical_visualizer = create_historical_visualizer(st.session_state.historical_manager)
-        st.session_state.historical_manager.create_detailed_historical_timeline(period_hist[1], intervals=intervals_hist)
+        # Los snapshots se analizan en paralelo y el progreso se muestra según terminan
+        progress_hist = st.progress(0.0, text="📅 Analizando snapshots históricos...")
+        st.session_state.historical_manager.create_detailed_historical_timeline(
+            period_hist[1], intervals=intervals_hist,
+            max_workers=2,  # Pocos procesos: el servidor atiende otras sesiones a la vez
+            on_snapshot=lambda snapshot, done, total: progress_hist.progress(
+                done / total, text=f"📅 Snapshot {done}/{total}: {snapshot.timestamp.strftime('%Y-%m-%d %H:%M')}"
+            )
+        )
+        progress_hist.empty()
         st.session_state.last_hist_params = (symbol_hist, timeframe_hist, period_hist, intervals_hist)
     # Mostrar timeline cargado
     if 'historical_manager' in st.session_state and st.session_state.historical_manager.snapshots:
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la unión de eventos de SMCTradeEngine._generate_trade_signals
+
+Compara la combinación anidada original (sweeps × breaks × zonas × confirmaciones)
+con la unión ordenada por tiempo sobre un DataFrame sintético de 10k velas.
+"""
+import time
+import numpy as np
+import pandas as pd
+from smc_trade_engine import SMCTradeEngine
+
+def generate_benchmark_data(n_bars: int = 10_000, n_events: int = 60, seed: int = 42):
+    """
+    Generar velas y eventos SMC sintéticos
+
+    Returns:
+        Tupla (df, sweeps, breaks, zones)
+    """
+    rng = np.random.default_rng(seed)
+    close = 50000 * np.cumprod(1 + rng.normal(0, 0.003, n_bars))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.002, n_bars)) * close
+    df = pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + spread * rng.random(n_bars),
+        'low': np.minimum(open_, close) - spread * rng.random(n_bars),
+        'close': close,
+        'volume': rng.integers(50, 200, n_bars).astype(float),
+    }, index=pd.date_range('2024-01-01', periods=n_bars, freq='15min'))
+
+    current_price = close[-1]
+
+    def random_positions():
+        return np.sort(rng.integers(0, n_bars - 1, n_events))
+
+    sweeps = [{
+        'type': 'low_sweep' if rng.random() < 0.5 else 'high_sweep',
+        'level': close[i] * (1 + rng.normal(0, 0.01)),
+        'index': int(i),
+        'timestamp': df.index[i]
+    } for i in random_positions()]
+
+    breaks = [{
+        'type': 'BOS' if rng.random() < 0.5 else 'CHOCH',
+        'level': close[i],
+        'index': int(i),
+        'timestamp': df.index[i]
+    } for i in random_positions()]
+
+    # Un tercio de las zonas contiene el precio actual
+    zones = []
+    for i in random_positions():
+        center = current_price if rng.random() < 0.33 else close[i]
+        width = center * 0.002
+        zones.append({
+            'type': 'OB' if rng.random() < 0.5 else 'FVG',
+            'top': center + width,
+            'bottom': center - width,
+            'index': int(i),
+            'timestamp': df.index[i],
+            'mitigated': bool(rng.random() < 0.2)
+        })
+
+    return df, sweeps, breaks, zones
+
+def nested_join(engine: SMCTradeEngine, df: pd.DataFrame, sweeps, breaks, zones, confirmations):
+    """Combinación anidada original: una señal por cada combinación completa"""
+    signals = []
+    current_price = df['close'].iloc[-1]
+
+    for sweep_type, direction, calculate_entry in [('low_sweep', 'bullish', engine._calculate_long_entry),
+                                                   ('high_sweep', 'bearish', engine._calculate_short_entry)]:
+        for sweep in sweeps:
+            if sweep['type'] != sweep_type:
+                continue
+            for structure_break in breaks:
+                if not (structure_break['timestamp'] > sweep['timestamp'] and
+                        structure_break['type'] in ['BOS', 'CHOCH']):
+                    continue
+                for zone in zones:
+                    if not (zone['timestamp'] > sweep['timestamp'] and
+                            zone['bottom'] <= current_price <= zone['top'] and
+                            not zone['mitigated']):
+                        continue
+                    for confirmation in confirmations:
+                        if (confirmation['timestamp'] > zone['timestamp'] and
+                                confirmation['direction'] == direction and
+                                confirmation['strength'] >= 1.2):
+                            signal = calculate_entry(df, sweep, zone, confirmation, current_price)
+                            if signal and signal.risk_reward >= engine.min_rr:
+                                signals.append(signal)
+    return signals
+
+def run_benchmark(n_bars: int = 10_000, n_events: int = 60):
+    """Ejecutar ambas versiones y mostrar tiempos y número de señales"""
+    print(f"📊 Generando {n_bars} velas y {n_events} eventos por tipo...")
+    df, sweeps, breaks, zones = generate_benchmark_data(n_bars, n_events)
+
+    engine = SMCTradeEngine()
+    confirmations = engine._detect_candle_confirmations(df)
+    print(f"   ✅ {len(confirmations)} confirmaciones de vela")
+
+    start = time.perf_counter()
+    nested = nested_join(engine, df, sweeps, breaks, zones, confirmations)
+    nested_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ordered = engine._generate_trade_signals(df, sweeps, breaks, zones, confirmations)
+    ordered_time = time.perf_counter() - start
+
+    print(f"\n⏱️ Unión anidada:  {nested_time:8.3f}s  ({len(nested)} señales)")
+    print(f"⏱️ Unión ordenada: {ordered_time:8.3f}s  ({len(ordered)} señales, una por sweep)")
+    print(f"🚀 Aceleración: {nested_time / max(ordered_time, 1e-9):.0f}x")
+
+    return {'nested_time': nested_time, 'ordered_time': ordered_time,
+            'nested_signals': len(nested), 'ordered_signals': len(ordered)}
+
+if __name__ == "__main__":
+    run_benchmark()
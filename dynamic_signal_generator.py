@@ -10,7 +10,10 @@ import pandas as pd
 import numpy as np
 from typing import List, Tuple, Optional
 from smc_trade_engine import TradeSignal, SignalType, ConfirmationType
-from smc_backtester import calculate_adaptive_levels, validate_sl_tp_levels, LevelValidationResult
+from smc_backtester import (
+    calculate_adaptive_levels, validate_sl_tp_levels, validate_sl_tp_levels_batch,
+    LevelValidationResult, ValidationContext
+)
 
 class DynamicSignalGenerator:
     """Generador de señales con niveles dinámicos"""
@@ -31,11 +34,16 @@ class DynamicSignalGenerator:
                                            symbol: str = "BTCUSDT",
                                            timeframe: str = "1h",
                                            confidence: float = 0.8,
-                                           max_retries: int = 5) -> Optional[TradeSignal]:
+                                           max_retries: int = 5,
+                                           context: Optional[ValidationContext] = None) -> Optional[TradeSignal]:
         """
         Generar señal con niveles adaptativos basados en ATR, validando niveles antes de crear la señal.
         Reintenta con diferentes índices o multiplicadores si los niveles son inválidos.
+
+        El rango histórico y el ATR (context) se calculan una vez y se reutilizan
+        en todos los reintentos.
         """
+        context = context or ValidationContext.from_dataframe(df)
         for attempt in range(max_retries):
             try:
                 # Ajustar entry_idx en cada intento si es necesario
@@ -47,34 +55,17 @@ class DynamicSignalGenerator:
 
                 # Calcular niveles adaptativos
                 stop_loss, take_profit = calculate_adaptive_levels(
-                    df, entry_price, signal_type.value, self.risk_multiplier
+                    df, entry_price, signal_type.value, self.risk_multiplier, context=context
                 )
 
                 # Validar niveles
                 validation = validate_sl_tp_levels(
-                    df, entry_price, stop_loss, take_profit, signal_type.value
+                    df, entry_price, stop_loss, take_profit, signal_type.value, context=context
                 )
 
                 if validation.result == LevelValidationResult.VALID:
-                    # Calcular Risk/Reward ratio
-                    sl_pct = abs((stop_loss - entry_price) / entry_price) * 100
-                    tp_pct = abs((take_profit - entry_price) / entry_price) * 100
-                    risk_reward = tp_pct / sl_pct if sl_pct > 0 else 2.0
-
-                    signal = TradeSignal(
-                        timestamp=timestamp,
-                        symbol=symbol,
-                        timeframe=timeframe,
-                        signal_type=signal_type,
-                        entry_price=entry_price,
-                        stop_loss=stop_loss,
-                        take_profit=take_profit,
-                        risk_reward=risk_reward,
-                        confidence=confidence,
-                        setup_components={'atr_adaptive': True},
-                        confirmation_type=ConfirmationType.ENGULFING
-                    )
-                    return signal
+                    return self._build_signal(df, idx, signal_type, stop_loss, take_profit,
+                                              symbol, timeframe, confidence)
                 else:
                     print(f"⚠️ Intento {attempt+1}: Niveles inválidos en {timestamp}: {validation.message}")
                     for suggestion in validation.suggestions:
@@ -87,6 +78,54 @@ class DynamicSignalGenerator:
         print(f"❌ No se pudo generar señal válida en idx {entry_idx} tras {max_retries} intentos.")
         return None
 
+    def _build_signal(self, df: pd.DataFrame, idx: int, signal_type: SignalType,
+                      stop_loss: float, take_profit: float, symbol: str = "BTCUSDT",
+                      timeframe: str = "1h", confidence: float = 0.8) -> TradeSignal:
+        """Crear la TradeSignal de niveles ya validados en la vela idx"""
+        entry_price = df['close'].iloc[idx]
+
+        # Calcular Risk/Reward ratio
+        sl_pct = abs((stop_loss - entry_price) / entry_price) * 100
+        tp_pct = abs((take_profit - entry_price) / entry_price) * 100
+        risk_reward = tp_pct / sl_pct if sl_pct > 0 else 2.0
+
+        return TradeSignal(
+            timestamp=df['timestamp'].iloc[idx],
+            symbol=symbol,
+            timeframe=timeframe,
+            signal_type=signal_type,
+            entry_price=entry_price,
+            stop_loss=stop_loss,
+            take_profit=take_profit,
+            risk_reward=risk_reward,
+            confidence=confidence,
+            setup_components={'atr_adaptive': True},
+            confirmation_type=ConfirmationType.ENGULFING
+        )
+
+    def _validate_first_attempts(self, df: pd.DataFrame, context: ValidationContext,
+                                 indices: List[int], signal_types: List[SignalType]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Niveles adaptativos y validación del primer intento de muchos candidatos a la vez
+
+        Mismas operaciones que calculate_adaptive_levels con el risk_multiplier actual.
+
+        Returns:
+            (stop_loss, take_profit, niveles válidos) por candidato
+        """
+        entry_price = df['close'].to_numpy(dtype=float)[indices]
+        sides = [signal_type.value for signal_type in signal_types]
+        is_long = np.array(sides) == "LONG"
+
+        atr_pct = (context.atr / entry_price) * 100
+        sl_pct = atr_pct * 1.0 * self.risk_multiplier
+        tp_pct = atr_pct * 2.0 * self.risk_multiplier
+        stop_loss = np.where(is_long, entry_price * (1 - sl_pct / 100), entry_price * (1 + sl_pct / 100))
+        take_profit = np.where(is_long, entry_price * (1 + tp_pct / 100), entry_price * (1 - tp_pct / 100))
+
+        validation = validate_sl_tp_levels_batch(context, entry_price, stop_loss, take_profit, sides)
+        return stop_loss, take_profit, validation.valid
+
     def generate_multiple_signals(self,
                                  df: pd.DataFrame,
                                  signal_count: int = 3,
@@ -106,15 +145,34 @@ class DynamicSignalGenerator:
         print(f"   🎯 Modo: {'Conservador' if self.risk_multiplier < 1.0 else 'Normal'}")
 
         signal_types = [SignalType.LONG, SignalType.SHORT, SignalType.LONG]
-        attempts = 0
-        i = 0
-        idx = 20
-        while len(signals) < signal_count and idx < len(df) - 10 and attempts < signal_count * 3:
-            signal_type = signal_types[i % len(signal_types)]
+        candidates = list(range(20, len(df) - 10, spacing))[:signal_count * 3]
+        candidate_types = [signal_types[i % len(signal_types)] for i in range(len(candidates))]
+
+        # Rango histórico y ATR una sola vez; el primer intento de todos los
+        # candidatos se valida en bloque y solo los inválidos pasan a reintentos
+        context = ValidationContext.from_dataframe(df)
+        first_attempts = None
+        batch_multiplier = None
+
+        for i, idx in enumerate(candidates):
+            if len(signals) >= signal_count:
+                break
+            signal_type = candidate_types[i]
             confidence = 0.8 + (i * 0.05)
-            signal = self.generate_signal_with_adaptive_levels(
-                df, idx, signal_type, confidence=confidence
-            )
+
+            # Los reintentos fallidos cambian risk_multiplier: revalidar los pendientes
+            if batch_multiplier != self.risk_multiplier:
+                first_attempts = self._validate_first_attempts(df, context, candidates[i:], candidate_types[i:])
+                first_offset = i
+                batch_multiplier = self.risk_multiplier
+
+            stop_loss, take_profit, valid = (values[i - first_offset] for values in first_attempts)
+            if valid:
+                signal = self._build_signal(df, idx, signal_type, stop_loss, take_profit, confidence=confidence)
+            else:
+                signal = self.generate_signal_with_adaptive_levels(
+                    df, idx, signal_type, confidence=confidence, context=context
+                )
             if signal:
                 signals.append(signal)
                 sl_pct = abs((signal.stop_loss - signal.entry_price) / signal.entry_price) * 100
@@ -125,9 +183,6 @@ class DynamicSignalGenerator:
                 print(f"      RR: {signal.risk_reward:.1f}")
             else:
                 print(f"   ⏭️  Saltando idx {idx} por niveles inválidos.")
-            i += 1
-            idx += spacing
-            attempts += 1
         return signals
 
     def analyze_market_conditions(self, df: pd.DataFrame) -> dict:
@@ -141,13 +196,9 @@ class DynamicSignalGenerator:
             dict con análisis de condiciones
         """
         try:
-            # Calcular ATR
-            high_low = df['high'] - df['low']
-            high_close = np.abs(df['high'] - df['close'].shift())
-            low_close = np.abs(df['low'] - df['close'].shift())
-
-            true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-            atr = true_range.rolling(window=self.atr_period).mean()
+            # Calcular ATR (compartido con el resto de módulos)
+            from smc_advanced import INDICATOR_CACHE
+            atr = INDICATOR_CACHE.atr(df, self.atr_period)
             current_atr = atr.iloc[-1]
             atr_pct = (current_atr / df['close'].iloc[-1]) * 100
 
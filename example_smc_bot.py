@@ -12,6 +12,7 @@ import numpy as np
 from datetime import datetime, timedelta
 from fetch_data import get_ohlcv
 from smc_bot import SMCBot, SMCConfig, SignalType
+from smc_incremental import IncrementalSMCBot
 
 def generate_sample_data():
     """
@@ -184,25 +185,32 @@ def run_live_simulation():
     print("\n🔄 Iniciando simulación en tiempo real...")
     print("(Presiona Ctrl+C para detener)")
 
+    # Bot incremental: se calienta una vez y luego solo procesa velas nuevas
+    config = SMCConfig(swing_length=5, equal_tolerance=0.15, min_rr=1.5)
+    bot = IncrementalSMCBot(config)
+
     try:
         while True:
             print(f"\n⏰ {datetime.now().strftime('%H:%M:%S')} - Analizando mercado...")
 
             # Obtener datos actuales
             try:
-                df = get_ohlcv("BTC/USDT", "5m")
-
-                # Crear bot con configuración rápida
-                config = SMCConfig(swing_length=5, equal_tolerance=0.15, min_rr=1.5)
-                bot = SMCBot(config)
+                df = get_ohlcv("BTC/USDT", "5m").set_index('timestamp')
+                closed = df.iloc[:-1]  # La última vela sigue abierta
 
-                # Análisis rápido
-                analysis = bot.analyze_market(df)
+                if not bot.timestamps:
+                    bot.warm_up(closed)
+                    new_signals = []
+                else:
+                    new_candles = closed[closed.index > bot.timestamps[-1]]
+                    new_signals = []
+                    for timestamp, candle in new_candles.iterrows():
+                        new_signals.extend(bot.update(candle, timestamp)['signals'])
 
-                # Mostrar solo si hay señales
-                if bot.signals:
+                # Mostrar solo si hay señales nuevas
+                if new_signals:
                     print("🚨 NUEVA SEÑAL DETECTADA:")
-                    for signal in bot.signals[-1:]:  # Solo la última
+                    for signal in new_signals[-1:]:  # Solo la última
                         bot.place_trade(signal)
                 else:
                     print("   📊 Sin señales - Monitoreando...")
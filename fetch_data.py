@@ -1,7 +1,23 @@
 import os
+import threading
 CACHE_DIR = os.path.join(os.path.dirname(__file__), 'data_cache')
+# Descargas simultáneas de rangos que faltan (respetando el rate limit de Binance)
+MAX_DOWNLOAD_WORKERS = 3
+# yf.download no es seguro entre hilos (comparte estado global): una descarga a la vez
+_YAHOO_LOCK = threading.Lock()
+# Un único cliente de Binance para todos los hilos, así el rate limit de ccxt es común
+_BINANCE_LOCK = threading.Lock()
+_BINANCE_EXCHANGE = None
 
-def get_ohlcv_with_cache(symbol, timeframe, start, end, provider_hint=None):
+def _binance_exchange():
+    """Cliente ccxt de Binance compartido por el proceso (con enableRateLimit)"""
+    global _BINANCE_EXCHANGE
+    with _BINANCE_LOCK:
+        if _BINANCE_EXCHANGE is None:
+            _BINANCE_EXCHANGE = ccxt.binance({'enableRateLimit': True})
+        return _BINANCE_EXCHANGE
+
+def get_ohlcv_with_cache(symbol, timeframe, start, end, provider_hint=None, writable=False):
     """
     Devuelve un DataFrame OHLCV para el rango solicitado, usando caché local y descargas incrementales si faltan datos.
     Guarda y actualiza la caché automáticamente.
@@ -9,13 +25,19 @@ def get_ohlcv_with_cache(symbol, timeframe, start, end, provider_hint=None):
     - timeframe: str (ej: '15m', '1h')
     - start, end: str o datetime
     - provider_hint: 'binance' o 'yahoo' (opcional, para forzar proveedor)
+    - writable: devolver una copia propia en lugar de vistas de solo lectura
+    Las particiones se leen de la caché Arrow mapeada (compartida por todas las
+    sesiones) y, por defecto, el resultado son vistas de solo lectura sobre esas
+    páginas: reasignar columnas funciona, pero las escrituras in situ
+    (df.loc[i, 'close'] = ...) fallan. Los llamadores que editan valores deben
+    pedir writable=True o hacer .copy().
     """
     import pandas as pd
     import numpy as np
     from datetime import datetime, timedelta
     import streamlit as st
-    os.makedirs(CACHE_DIR, exist_ok=True)
-    cache_path = os.path.join(CACHE_DIR, f"{symbol.replace('/', '_')}_{timeframe}.parquet")
+    from ohlcv_store import OHLCVStore, timeframe_to_minutes
+    store = OHLCVStore(symbol, timeframe, CACHE_DIR)
     start_dt = pd.to_datetime(start)
     end_dt = pd.to_datetime(end)
     # Ensure tz-awareness for all datetime objects (force UTC)
@@ -34,124 +56,103 @@ def get_ohlcv_with_cache(symbol, timeframe, start, end, provider_hint=None):
     else:
         provider = 'binance'
 
-    # --- In-memory session cache for fast incremental updates ---
-    session_key = f"ohlcv_{symbol.replace('/', '_')}_{timeframe}"
-    cache_loaded_from = None
-    if hasattr(st, 'session_state') and session_key in st.session_state:
-        cache_df = st.session_state[session_key]
-        cache_loaded_from = 'memory'
-        print(f"[CACHE] Cache hit in memory for {session_key} ({len(cache_df)} rows)")
-    elif os.path.exists(cache_path):
-        cache_df = pd.read_parquet(cache_path)
-        cache_df['timestamp'] = pd.to_datetime(cache_df['timestamp'])
-        if hasattr(st, 'session_state'):
-            st.session_state[session_key] = cache_df.copy()
+    # --- Partitioned disk cache: coverage comes from the manifest, no data is read yet ---
+    min_cached, max_cached = store.coverage()
+    if min_cached is not None:
         cache_loaded_from = 'disk'
-        print(f"[CACHE] Cache hit on disk for {session_key} ({len(cache_df)} rows)")
+        print(f"[CACHE] Cache hit on disk for {store.name} ({len(store)} rows, {min_cached} -> {max_cached})")
     else:
-        cache_df = pd.DataFrame()
         cache_loaded_from = 'none'
-        print(f"[CACHE] No cache found for {session_key}")
+        print(f"[CACHE] No cache found for {store.name}")
 
-    # Determine missing ranges
-    if not cache_df.empty:
-        cache_df['timestamp'] = pd.to_datetime(cache_df['timestamp'])
-        # Force all cache timestamps to UTC tz-aware
-        if getattr(cache_df['timestamp'].dt, 'tz', None) is None:
-            cache_df['timestamp'] = cache_df['timestamp'].dt.tz_localize('UTC')
-        else:
-            cache_df['timestamp'] = cache_df['timestamp'].dt.tz_convert('UTC')
-        min_cached = cache_df['timestamp'].min()
-        max_cached = cache_df['timestamp'].max()
-    else:
-        min_cached = max_cached = None
-    missing_ranges = []
-    if min_cached is None or start_dt < min_cached:
-        missing_ranges.append((start_dt, min_cached or end_dt))
-    if max_cached is None or end_dt > max_cached:
-        missing_ranges.append((max_cached or start_dt, end_dt))
+    # Determine missing ranges: expected bars vs cached bars (holes inside the cached range too).
+    # Only 24/7 Binance markets are checked inside; Yahoo markets close at night and on weekends.
+    minutes = timeframe_to_minutes(timeframe)
+    step = pd.Timedelta(minutes=minutes) if minutes else None
+    missing_ranges = store.missing_ranges(start_dt, end_dt, step, interior=provider == 'binance')
+    # Pad each range by one bar on each side: the cached bars that come back bracket the hole,
+    # so an outage with no bars at all is recorded as confirmed-empty instead of re-requested
+    if step is not None:
+        missing_ranges = [(rng_start - step, rng_end + step) for rng_start, rng_end in missing_ranges]
 
-    # Download and join only missing blocks
-    new_data = []
-    downloaded_any = False
-    for rng_start, rng_end in missing_ranges:
-        if rng_start is None or rng_end is None or rng_start >= rng_end:
-            continue
-        print(f"[DOWNLOAD] Downloading {symbol} {timeframe} from {rng_start} to {rng_end}")
-        downloaded_any = True
-        if provider == 'binance':
-            df = get_ohlcv_full(symbol, timeframe, since=rng_start, until=rng_end)
-        else:
-            import yfinance as yf
-            interval_map = {"1m": "1m", "5m": "5m", "15m": "15m", "1h": "60m", "4h": "240m", "1d": "1d"}
-            ymap = {"EUR/USD": "EURUSD=X", "GBP/USD": "GBPUSD=X", "XAU/USD": "XAUUSD=X", "SP500": "^GSPC"}
-            yf_symbol = ymap.get(symbol, symbol)
-            yf_interval = interval_map.get(timeframe, "15m")
-            df = yf.download(yf_symbol, start=rng_start, end=rng_end + timedelta(days=1), interval=yf_interval, progress=False)
-            if not df.empty:
-                df = df.reset_index()
-                if isinstance(df.columns, pd.MultiIndex):
-                    df.columns = ['_'.join([str(i) for i in col if i]) for col in df.columns.values]
-                df.columns = [str(col).lower() for col in df.columns]
-                if 'datetime' in df.columns:
-                    df['timestamp'] = pd.to_datetime(df['datetime'])
-                elif 'date' in df.columns:
-                    df['timestamp'] = pd.to_datetime(df['date'])
-                elif 'index' in df.columns:
-                    df['timestamp'] = pd.to_datetime(df['index'])
-                else:
-                    df['timestamp'] = pd.to_datetime(df.iloc[:, 0], errors='coerce')
-                for col in ['open', 'high', 'low', 'close']:
-                    if col not in df.columns:
-                        candidates = [c for c in df.columns if c.startswith(col)]
-                        if candidates:
-                            df[col] = df[candidates[0]]
-                if 'volume' not in df.columns:
-                    df['volume'] = 0.0
-                required_cols = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
-                missing = [col for col in ['open', 'high', 'low', 'close'] if col not in df.columns]
-                if missing:
-                    print(f"❌ Missing required price columns from Yahoo Finance for {symbol}: {missing}")
-                    continue
-                df = df[required_cols]
-        if not df.empty:
-            new_data.append(df)
+    # Download the planned blocks with bounded concurrency
+    downloads = []
+    downloaded_any = bool(missing_ranges)
+    if missing_ranges:
+        from concurrent.futures import ThreadPoolExecutor
+        for rng_start, rng_end in missing_ranges:
+            print(f"[DOWNLOAD] Downloading {symbol} {timeframe} from {rng_start} to {rng_end}")
+        with ThreadPoolExecutor(max_workers=min(MAX_DOWNLOAD_WORKERS, len(missing_ranges))) as pool:
+            frames = pool.map(lambda rng: _download_range(symbol, timeframe, provider, *rng), missing_ranges)
+            downloads = [(rng_start, rng_end, df) for (rng_start, rng_end), df in zip(missing_ranges, frames)]
 
-    # Merge all and clean duplicates
-    all_data = pd.concat([cache_df] + new_data, ignore_index=True)
-    if not all_data.empty:
-        all_data = all_data.drop_duplicates(subset=['timestamp']).sort_values('timestamp').reset_index(drop=True)
-        # Ensure tz-awareness matches for filtering
-        if hasattr(all_data['timestamp'], 'dt') and all_data['timestamp'].dt.tz is not None:
-            # If timestamps are tz-aware, localize/convert start_dt and end_dt to UTC
-            import pandas as pd
-            if getattr(start_dt, 'tzinfo', None) is None:
-                start_dt = pd.Timestamp(start_dt).tz_localize('UTC')
-            else:
-                start_dt = pd.Timestamp(start_dt).tz_convert('UTC')
-            if getattr(end_dt, 'tzinfo', None) is None:
-                end_dt = pd.Timestamp(end_dt).tz_localize('UTC')
-            else:
-                end_dt = pd.Timestamp(end_dt).tz_convert('UTC')
-        # Filter only requested range
-        mask = (all_data['timestamp'] >= start_dt) & (all_data['timestamp'] <= end_dt)
-        result = all_data.loc[mask].copy()
-        # Update both disk and session cache
-        all_data.to_parquet(cache_path, index=False)
-        if hasattr(st, 'session_state'):
-            st.session_state[session_key] = all_data.copy()
+    # Validate continuity and store only new bars: the months they fall in are rewritten atomically
+    if downloads:
+        added = store.commit_downloads(downloads, step)
+        print(f"[CACHE] Stored {added} new rows for {store.name}")
+
+    # Read only the partitions that overlap the requested range (memory-mapped, shared by every session);
+    # callers that edit values in place ask for their own writable copy
+    result = store.read(start_dt, end_dt, writable=writable)
+    if not result.empty:
         # UI indicator for cache/download source
         if hasattr(st, 'info'):
             if downloaded_any:
                 st.info(f"Data for {symbol} {timeframe} was downloaded and cached. Rows: {len(result)}")
-            elif cache_loaded_from == 'memory':
-                st.info(f"Data for {symbol} {timeframe} loaded from memory cache. Rows: {len(result)}")
             elif cache_loaded_from == 'disk':
                 st.info(f"Data for {symbol} {timeframe} loaded from disk cache. Rows: {len(result)}")
             else:
                 st.info(f"Data for {symbol} {timeframe} loaded. Rows: {len(result)}")
         return result
     return pd.DataFrame()
+
+def _download_range(symbol, timeframe, provider, rng_start, rng_end):
+    """
+    Descargar las velas de [rng_start, rng_end] del proveedor indicado
+
+    Returns:
+        DataFrame OHLCV con columna 'timestamp' (vacío si no hay datos)
+    """
+    import pandas as pd
+    from datetime import timedelta
+    if provider == 'binance':
+        df = get_ohlcv_full(symbol, timeframe, since=rng_start, until=rng_end)
+    else:
+        import yfinance as yf
+        interval_map = {"1m": "1m", "5m": "5m", "15m": "15m", "1h": "60m", "4h": "240m", "1d": "1d"}
+        ymap = {"EUR/USD": "EURUSD=X", "GBP/USD": "GBPUSD=X", "XAU/USD": "XAUUSD=X", "SP500": "^GSPC"}
+        yf_symbol = ymap.get(symbol, symbol)
+        yf_interval = interval_map.get(timeframe, "15m")
+        with _YAHOO_LOCK:
+            df = yf.download(yf_symbol, start=rng_start, end=rng_end + timedelta(days=1), interval=yf_interval, progress=False)
+        if not df.empty:
+            df = df.reset_index()
+            if isinstance(df.columns, pd.MultiIndex):
+                df.columns = ['_'.join([str(i) for i in col if i]) for col in df.columns.values]
+            df.columns = [str(col).lower() for col in df.columns]
+            if 'datetime' in df.columns:
+                df['timestamp'] = pd.to_datetime(df['datetime'])
+            elif 'date' in df.columns:
+                df['timestamp'] = pd.to_datetime(df['date'])
+            elif 'index' in df.columns:
+                df['timestamp'] = pd.to_datetime(df['index'])
+            else:
+                df['timestamp'] = pd.to_datetime(df.iloc[:, 0], errors='coerce')
+            for col in ['open', 'high', 'low', 'close']:
+                if col not in df.columns:
+                    candidates = [c for c in df.columns if c.startswith(col)]
+                    if candidates:
+                        df[col] = df[candidates[0]]
+            if 'volume' not in df.columns:
+                df['volume'] = 0.0
+            required_cols = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+            missing = [col for col in ['open', 'high', 'low', 'close'] if col not in df.columns]
+            if missing:
+                print(f"❌ Missing required price columns from Yahoo Finance for {symbol}: {missing}")
+                return pd.DataFrame()
+            df = df[required_cols]
+    return df
+
 import ccxt
 import pandas as pd
 from datetime import datetime, timedelta
@@ -228,7 +229,7 @@ def get_ohlcv_full(symbol="BTC/USDT", timeframe="1m", since=None, until=None, ma
         DataFrame con todas las velas en el rango
     """
     try:
-        exchange = ccxt.binance()
+        exchange = _binance_exchange()
         all_ohlcv = []
         since_ms = int(since.timestamp() * 1000) if isinstance(since, datetime) else since
         until_ms = int(until.timestamp() * 1000) if isinstance(until, datetime) else until
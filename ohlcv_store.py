@@ -0,0 +1,640 @@
+#!/usr/bin/env python3
+"""
+Almacén OHLCV particionado
+==========================
+
+Velas por símbolo/timeframe en particiones mensuales de parquet con un
+manifest.json que guarda filas y rango temporal de cada partición:
+
+    data_cache/BTC_USDT_15m/
+        manifest.json
+        2025-06.parquet
+        2025-07.parquet
+
+Las lecturas por rango abren solo las particiones que se solapan con él, y
+las escrituras solo reescriben los meses que reciben velas nuevas (nunca el
+histórico completo). Cada fichero se escribe en un temporal y se sustituye
+con os.replace, de modo que una interrupción nunca deja una partición o el
+manifest a medias.
+
+Antes de descargar, missing_ranges compara las velas esperadas del timeframe
+con las guardadas (huecos al principio, al final y en medio del rango) y
+agrupa los huecos en el mínimo de descargas; commit_downloads valida las velas
+recibidas antes de guardarlas y recuerda los huecos que el exchange confirma
+vacíos para no pedirlos en cada llamada.
+
+Junto a cada parquet se guarda una copia Arrow IPC sin comprimir
+(YYYY-MM.arrow) que se lee con memory-map: todas las sesiones de Streamlit
+del proceso comparten la misma tabla y los demás procesos (workers de
+backtest) mapean el mismo fichero, así que las velas se leen de las mismas
+páginas físicas en lugar de copiarse en cada sesión.
+
+Las escrituras (append, commit_downloads, migración) se serializan por
+almacén con un lock de hilo y un flock sobre data_cache/<nombre>.lock para
+los demás procesos; dentro del lock el manifest se vuelve a leer de disco,
+así que dos escritores nunca pisan las particiones o el manifest del otro.
+"""
+
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se serializan los hilos del proceso
+    fcntl = None
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+def _utc(value) -> pd.Timestamp:
+    """Timestamp en UTC (los valores sin zona horaria se interpretan como UTC)"""
+    ts = pd.Timestamp(value)
+    return ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+
+def timeframe_to_minutes(timeframe: str) -> Optional[float]:
+    """
+    Minutos por vela de un timeframe tipo '15m', '1h', '4h', '1d' o '1w'
+
+    Returns:
+        Minutos por vela, o None si el formato no se reconoce
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*([mhdw])\s*', str(timeframe))
+    if not match:
+        return None
+    amount, unit = int(match.group(1)), match.group(2)
+    return amount * {'m': 1, 'h': 60, 'd': 1440, 'w': 10080}[unit]
+
+def normalize_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizar velas al esquema del almacén
+
+    Args:
+        df: DataFrame con columna 'timestamp' (o índice de timestamps) y OHLC
+
+    Returns:
+        DataFrame con OHLCV_COLUMNS, timestamps UTC en ns, ordenado y sin duplicados
+    """
+    if 'timestamp' not in df.columns:
+        df = df.rename_axis('timestamp').reset_index()
+    df = df.copy()
+    if 'volume' not in df.columns:
+        df['volume'] = 0.0
+    timestamps = pd.to_datetime(df['timestamp'])
+    if timestamps.dt.tz is None:
+        timestamps = timestamps.dt.tz_localize('UTC')
+    df['timestamp'] = timestamps.dt.tz_convert('UTC').dt.as_unit('ns')
+    df = df[OHLCV_COLUMNS].astype({col: float for col in OHLCV_COLUMNS[1:]})
+    return df.drop_duplicates(subset=['timestamp']).sort_values('timestamp').reset_index(drop=True)
+
+# Tablas mapeadas del proceso: ruta .arrow -> ((inodo, mtime_ns, tamaño), tabla)
+_MAPPED_TABLES: Dict[str, Tuple[Tuple[int, int, int], pa.Table]] = {}
+_MAPPED_LOCK = threading.Lock()
+
+def _write_arrow(path: str, table: pa.Table) -> None:
+    """Fichero Arrow IPC sin comprimir (mapeable sin decodificar)"""
+    with ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+def mapped_table(path: str) -> pa.Table:
+    """
+    Tabla Arrow de un fichero IPC mapeado en memoria
+
+    La tabla se reutiliza en todo el proceso mientras el fichero no cambie;
+    un fichero sustituido con os.replace tiene otra firma y se vuelve a mapear.
+    """
+    stat = os.stat(path)
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _MAPPED_LOCK:
+        cached = _MAPPED_TABLES.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        with pa.memory_map(path) as source:
+            table = ipc.open_file(source).read_all()
+        _MAPPED_TABLES[path] = (signature, table)
+        return table
+
+def clear_mapped_tables() -> None:
+    """Soltar las tablas mapeadas del proceso"""
+    with _MAPPED_LOCK:
+        _MAPPED_TABLES.clear()
+
+class _StoreLock:
+    """Lock reentrante de escritura de un almacén: hilos del proceso + flock entre procesos"""
+
+    def __init__(self, lock_path: str):
+        self.lock_path = lock_path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+                self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._close()
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    @property
+    def outermost(self) -> bool:
+        """True en la sección más externa (no anidada) del hilo que tiene el lock"""
+        return self._depth == 1
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            self._close()
+        self._thread_lock.release()
+
+    def _close(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+# Un lock por almacén compartido por todas las instancias del proceso
+_STORE_LOCKS: Dict[str, _StoreLock] = {}
+_STORE_LOCKS_GUARD = threading.Lock()
+
+def store_lock(lock_path: str) -> _StoreLock:
+    """Lock de escritura del almacén cuyo fichero de lock es lock_path"""
+    lock_path = os.path.abspath(lock_path)
+    with _STORE_LOCKS_GUARD:
+        lock = _STORE_LOCKS.get(lock_path)
+        if lock is None:
+            lock = _STORE_LOCKS[lock_path] = _StoreLock(lock_path)
+        return lock
+
+def _write_atomic(path: str, write) -> None:
+    """Escribir en un temporal del mismo directorio y sustituir el destino de una vez"""
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def find_gaps(timestamps: np.ndarray, start_ns: int, end_ns: int, step_ns: int,
+              interior: bool = True) -> List[Tuple[int, int]]:
+    """
+    Velas esperadas que faltan en [start_ns, end_ns]
+
+    Args:
+        timestamps: Timestamps guardados en el rango (int64 ns, ordenados)
+        start_ns, end_ns: Rango pedido
+        step_ns: Duración de una vela
+        interior: Si False solo se miran los extremos (mercados con cierres)
+
+    Returns:
+        Lista de (primera, última) vela que falta, ambos inclusive
+    """
+    if len(timestamps) == 0:
+        return [(start_ns, end_ns)] if end_ns >= start_ns else []
+    gaps = []
+    if timestamps[0] - start_ns >= step_ns:
+        gaps.append((start_ns, int(timestamps[0]) - step_ns))
+    if interior:
+        holes = np.flatnonzero(np.diff(timestamps) > step_ns)
+        gaps.extend((int(timestamps[i]) + step_ns, int(timestamps[i + 1]) - step_ns) for i in holes)
+    if end_ns - timestamps[-1] >= step_ns:
+        gaps.append((int(timestamps[-1]) + step_ns, end_ns))
+    # Recortar al rango pedido (los extremos guardados pueden quedar fuera)
+    gaps = [(max(gap_start, start_ns), min(gap_end, end_ns)) for gap_start, gap_end in gaps]
+    return [(gap_start, gap_end) for gap_start, gap_end in gaps if gap_start <= gap_end]
+
+def subtract_ranges(ranges: Sequence[Tuple[int, int]], excluded: Sequence[Sequence[int]]) -> List[Tuple[int, int]]:
+    """Quitar de cada rango (inclusive) las partes cubiertas por excluded"""
+    result = []
+    for start, end in ranges:
+        pieces = [(start, end)]
+        for ex_start, ex_end in excluded:
+            pieces = [
+                piece
+                for piece_start, piece_end in pieces
+                for piece in ((piece_start, min(piece_end, ex_start - 1)), (max(piece_start, ex_end + 1), piece_end))
+                if piece[0] <= piece[1]
+            ]
+        result.extend(pieces)
+    return result
+
+def merge_ranges(ranges: Sequence[Sequence[int]]) -> List[Tuple[int, int]]:
+    """Unir rangos (inclusive) solapados o contiguos"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def plan_fetch_ranges(gaps: Sequence[Tuple[int, int]], step_ns: int, page_size: int = 1000) -> List[Tuple[int, int]]:
+    """
+    Agrupar huecos en el mínimo de descargas paginadas
+
+    Dos huecos se descargan juntos cuando hacerlo no cuesta más páginas que
+    pedirlos por separado (velas ya guardadas entre ellos se ignoran al guardar).
+
+    Returns:
+        Rangos (inicio, fin) a descargar, ambos inclusive
+    """
+    def pages(start, end):
+        return -(-((end - start) // step_ns + 1) // page_size)
+
+    plan = []
+    for start, end in merge_ranges(gaps):
+        if plan and pages(plan[-1][0], end) <= pages(*plan[-1]) + pages(start, end):
+            plan[-1] = (plan[-1][0], end)
+        else:
+            plan.append((start, end))
+    return plan
+
+def validate_bars(df: pd.DataFrame, step_ns: Optional[int] = None,
+                  anchor_ns: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Descartar velas descargadas que no se pueden guardar
+
+    Args:
+        df: Velas OHLCV descargadas
+        step_ns: Duración de una vela (None = no comprobar la rejilla)
+        anchor_ns: Vela de referencia de la rejilla (por defecto la primera de df)
+
+    Returns:
+        (velas válidas normalizadas, {motivo: velas descartadas})
+    """
+    df = normalize_ohlcv(df)
+    prices = df[PRICE_COLUMNS].to_numpy()
+    problems = {
+        'nan': np.isnan(prices).any(axis=1),
+        'ohlc': (df['high'].to_numpy() < prices.max(axis=1)) | (df['low'].to_numpy() > prices.min(axis=1)),
+    }
+    if step_ns and len(df):
+        timestamps = df['timestamp'].array.asi8
+        anchor = timestamps[0] if anchor_ns is None else anchor_ns
+        problems['misaligned'] = (timestamps - anchor) % step_ns != 0
+    invalid = np.zeros(len(df), dtype=bool)
+    for flags in problems.values():
+        invalid |= flags
+    return df.loc[~invalid].reset_index(drop=True), {key: int(flags.sum()) for key, flags in problems.items() if flags.any()}
+
+class OHLCVStore:
+    """
+    Velas de un símbolo/timeframe en particiones mensuales
+
+    El manifest permite conocer la cobertura y elegir particiones sin abrir
+    ningún parquet.
+    """
+
+    def __init__(self, symbol: str, timeframe: str, cache_dir: str):
+        """
+        Args:
+            symbol: Par (ej: 'BTC/USDT')
+            timeframe: Marco temporal (ej: '15m')
+            cache_dir: Directorio raíz de la caché (data_cache)
+        """
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.cache_dir = cache_dir
+        self.name = f"{symbol.replace('/', '_')}_{timeframe}"
+        self.path = os.path.join(cache_dir, self.name)
+        self.manifest_path = os.path.join(self.path, MANIFEST_NAME)
+        # Fichero único del formato anterior (se importa en el primer uso)
+        self.legacy_path = os.path.join(cache_dir, f"{self.name}.parquet")
+        self.lock_path = os.path.join(cache_dir, f"{self.name}.lock")
+        self._manifest = None
+
+    @contextmanager
+    def _writing(self):
+        """
+        Sección de escritura exclusiva del almacén
+
+        Al entrar se descarta el manifest en memoria: otro hilo o proceso
+        puede haber añadido particiones desde la última lectura.
+        """
+        with store_lock(self.lock_path) as lock:
+            if lock.outermost:
+                self._manifest = None
+            yield
+
+    # ==================== MANIFEST ====================
+
+    @property
+    def manifest(self) -> Dict:
+        """Manifest cargado de disco (o reconstruido si falta o está dañado)"""
+        if self._manifest is None:
+            self._manifest = self._load_manifest()
+        return self._manifest
+
+    @property
+    def partitions(self) -> Dict[str, Dict]:
+        """mes ('YYYY-MM') -> {'file', 'rows', 'start', 'end'}"""
+        return self.manifest['partitions']
+
+    @property
+    def empty_ranges(self) -> List[List[int]]:
+        """Rangos [inicio, fin] (ns) que el exchange confirmó sin velas"""
+        return self.manifest.setdefault('empty', [])
+
+    def _load_manifest(self) -> Dict:
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+                if manifest.get('version') == MANIFEST_VERSION:
+                    return manifest
+            except (OSError, ValueError):
+                pass
+        return self.rebuild_manifest()
+
+    def rebuild_manifest(self) -> Dict:
+        """Reconstruir el manifest a partir de las particiones presentes en disco"""
+        manifest = {'version': MANIFEST_VERSION, 'symbol': self.symbol,
+                    'timeframe': self.timeframe, 'partitions': {}}
+        if os.path.isdir(self.path):
+            for file_name in sorted(os.listdir(self.path)):
+                if not file_name.endswith('.parquet'):
+                    continue
+                timestamps = pd.read_parquet(os.path.join(self.path, file_name), columns=['timestamp'])['timestamp']
+                if len(timestamps):
+                    manifest['partitions'][file_name[:-len('.parquet')]] = self._partition_entry(file_name, timestamps)
+        self._manifest = manifest
+        if manifest['partitions']:
+            with store_lock(self.lock_path):
+                self._save_manifest()
+        return manifest
+
+    @staticmethod
+    def _partition_entry(file_name: str, timestamps: pd.Series) -> Dict:
+        return {
+            'file': file_name,
+            'rows': int(len(timestamps)),
+            'start': int(timestamps.min().value),
+            'end': int(timestamps.max().value),
+        }
+
+    def _save_manifest(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(self._manifest, f, indent=2, sort_keys=True)
+
+        _write_atomic(self.manifest_path, write)
+
+    # ==================== LECTURA ====================
+
+    def coverage(self) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        """
+        Primera y última vela almacenadas, sin leer datos
+
+        Returns:
+            (min, max) en UTC, o (None, None) si el almacén está vacío
+        """
+        self.migrate_legacy()
+        if not self.partitions:
+            return None, None
+        start = min(entry['start'] for entry in self.partitions.values())
+        end = max(entry['end'] for entry in self.partitions.values())
+        return pd.Timestamp(start, tz='UTC'), pd.Timestamp(end, tz='UTC')
+
+    def missing_ranges(self, start, end, step: Optional[pd.Timedelta] = None,
+                       interior: bool = True, page_size: int = 1000) -> List[Tuple[pd.Timestamp, pd.Timestamp]]:
+        """
+        Rangos a descargar para cubrir [start, end]
+
+        Con step se comparan las velas esperadas con las guardadas (también
+        los huecos internos) y se agrupan en el mínimo de descargas; sin step
+        (timeframe irregular, p. ej. '1M') solo se miran los extremos.
+
+        Args:
+            start, end: Rango pedido
+            step: Duración de una vela
+            interior: Buscar huecos dentro del rango guardado
+            page_size: Velas por página del proveedor
+
+        Returns:
+            Lista de (inicio, fin) en UTC, ambos inclusive
+        """
+        start_ts, end_ts = _utc(start), _utc(end)
+        min_cached, max_cached = self.coverage()
+        if step is None:
+            ranges = []
+            if min_cached is None or start_ts < min_cached:
+                ranges.append((start_ts, min_cached or end_ts))
+            if max_cached is None or end_ts > max_cached:
+                ranges.append((max_cached or start_ts, end_ts))
+            return [(rng_start, rng_end) for rng_start, rng_end in ranges if rng_start < rng_end]
+
+        step_ns = pd.Timedelta(step).value
+        if interior:
+            timestamps = self.read_table(start_ts, end_ts).column('timestamp')
+            timestamps = np.asarray(timestamps.cast(pa.int64()).to_numpy()) if len(timestamps) else np.array([], dtype=np.int64)
+        elif min_cached is not None:
+            timestamps = np.array([min_cached.value, max_cached.value])
+        else:
+            timestamps = np.array([], dtype=np.int64)
+        gaps = subtract_ranges(find_gaps(timestamps, start_ts.value, end_ts.value, step_ns, interior), self.empty_ranges)
+        return [(pd.Timestamp(rng_start, tz='UTC'), pd.Timestamp(rng_end, tz='UTC'))
+                for rng_start, rng_end in plan_fetch_ranges(gaps, step_ns, page_size)]
+
+    def __len__(self) -> int:
+        return sum(entry['rows'] for entry in self.partitions.values())
+
+    def partitions_for_range(self, start=None, end=None) -> List[str]:
+        """Meses cuyas velas se solapan con [start, end]"""
+        start_ns = _utc(start).value if start is not None else None
+        end_ns = _utc(end).value if end is not None else None
+        return [
+            month for month, entry in sorted(self.partitions.items())
+            if (start_ns is None or entry['end'] >= start_ns) and (end_ns is None or entry['start'] <= end_ns)
+        ]
+
+    def read(self, start=None, end=None, writable: bool = False) -> pd.DataFrame:
+        """
+        Leer las velas de [start, end] (ambos inclusive)
+
+        Por defecto, si el rango cae en un solo mes las columnas son vistas de
+        solo lectura sobre el fichero mapeado (sin copia).
+
+        Args:
+            start, end: Límites (str, datetime o Timestamp); None = sin límite
+            writable: Copiar las velas a memoria propia para poder modificarlas in situ
+
+        Returns:
+            DataFrame con OHLCV_COLUMNS ordenado por timestamp
+        """
+        table = self.read_table(start, end)
+        if table.num_rows == 0:
+            return pd.DataFrame(columns=OHLCV_COLUMNS)
+        if writable:
+            return table.to_pandas()  # Bloques consolidados: siempre una copia escribible
+        return table.to_pandas(split_blocks=True)
+
+    def read_table(self, start=None, end=None) -> pa.Table:
+        """
+        Velas de [start, end] como tabla Arrow sobre las particiones mapeadas
+
+        Returns:
+            pa.Table con OHLCV_COLUMNS (cortes sin copia de cada partición)
+        """
+        self.migrate_legacy()
+        start_ns = _utc(start).value if start is not None else None
+        end_ns = _utc(end).value if end is not None else None
+        tables = []
+        for month in self.partitions_for_range(start, end):
+            table = self._mapped_partition(month)
+            timestamps = table.column('timestamp').chunk(0).view(pa.int64()).to_numpy()
+            first = np.searchsorted(timestamps, start_ns, side='left') if start_ns is not None else 0
+            last = np.searchsorted(timestamps, end_ns, side='right') if end_ns is not None else len(timestamps)
+            if last > first:
+                tables.append(table.slice(first, last - first))
+        if not tables:
+            return pa.table({col: [] for col in OHLCV_COLUMNS})
+        return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+    def _arrow_path(self, month: str) -> str:
+        return os.path.join(self.path, f"{month}.arrow")
+
+    def _mapped_partition(self, month: str) -> pa.Table:
+        """Partición mapeada; la copia .arrow se regenera si falta o es anterior al parquet"""
+        parquet_path = os.path.join(self.path, self.partitions[month]['file'])
+        arrow_path = self._arrow_path(month)
+        if (not os.path.exists(arrow_path)
+                or os.stat(arrow_path).st_mtime_ns < os.stat(parquet_path).st_mtime_ns):
+            table = pa.Table.from_pandas(self._read_partition(month), preserve_index=False)
+            _write_atomic(arrow_path, lambda tmp_path: _write_arrow(tmp_path, table))
+        return mapped_table(arrow_path)
+
+    def _read_partition(self, month: str) -> pd.DataFrame:
+        df = pd.read_parquet(os.path.join(self.path, self.partitions[month]['file']))
+        df['timestamp'] = df['timestamp'].dt.as_unit('ns')
+        return df
+
+    # ==================== ESCRITURA ====================
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Añadir velas al almacén
+
+        Solo se reescriben los meses que reciben velas nuevas; las que ya
+        existen (mismo timestamp) se ignoran. Sin velas nuevas no se escribe
+        nada en disco.
+
+        Args:
+            df: Velas OHLCV (columna 'timestamp' o índice de timestamps)
+
+        Returns:
+            Número de velas nuevas guardadas
+        """
+        with self._writing():
+            self.migrate_legacy()
+            return self._append(df)
+
+    def _append(self, df: pd.DataFrame) -> int:
+        if df is None or df.empty:
+            return 0
+        df = normalize_ohlcv(df)
+        months = df['timestamp'].dt.tz_convert(None).dt.strftime('%Y-%m')
+
+        added = 0
+        for month, rows in df.groupby(months.to_numpy(), sort=True):
+            if month in self.partitions:
+                existing = self._read_partition(month)
+                rows = rows[~rows['timestamp'].isin(existing['timestamp'])]
+                if rows.empty:
+                    continue
+                rows = pd.concat([existing, rows], ignore_index=True).sort_values('timestamp')
+                new_rows = len(rows) - len(existing)
+            else:
+                new_rows = len(rows)
+            self._write_partition(month, rows.reset_index(drop=True))
+            added += new_rows
+
+        if added:
+            self._save_manifest()
+        return added
+
+    def commit_downloads(self, downloads: Sequence[Tuple[pd.Timestamp, pd.Timestamp, pd.DataFrame]],
+                         step: Optional[pd.Timedelta] = None) -> int:
+        """
+        Validar y guardar de una vez las velas descargadas para varios rangos
+
+        Las velas inválidas (NaN, OHLC incoherente, fuera de la rejilla del
+        timeframe) se descartan. Los huecos que quedan entre velas recibidas
+        del mismo rango los confirma el exchange (caídas, mercado cerrado) y se
+        anotan en el manifest para no volver a pedirlos; un rango que no
+        devolvió nada no se anota (puede ser un fallo de red).
+
+        Args:
+            downloads: (inicio, fin, velas) por rango descargado
+            step: Duración de una vela
+
+        Returns:
+            Número de velas nuevas guardadas
+        """
+        with self._writing():
+            self.migrate_legacy()
+            step_ns = pd.Timedelta(step).value if step is not None else None
+            min_cached, _ = self.coverage()
+            anchor_ns = min_cached.value if min_cached is not None else None
+
+            frames, confirmed_empty = [], []
+            for rng_start, rng_end, df in downloads:
+                if df is None or df.empty:
+                    continue
+                clean, problems = validate_bars(df, step_ns, anchor_ns)
+                if problems:
+                    print(f"[CACHE] Dropped invalid bars for {self.name} {rng_start} -> {rng_end}: {problems}")
+                if clean.empty:
+                    continue
+                if anchor_ns is None and step_ns:
+                    anchor_ns = clean['timestamp'].iloc[0].value
+                if step_ns:
+                    # Solo cuentan como vacíos los huecos sin ninguna vela recibida
+                    # (una vela descartada por inválida se vuelve a pedir)
+                    received = normalize_ohlcv(df)['timestamp'].array.asi8
+                    received = received[(received - anchor_ns) % step_ns == 0]
+                    confirmed_empty.extend(find_gaps(received, int(received[0]), int(received[-1]), step_ns))
+                frames.append(clean)
+
+            added = self._append(pd.concat(frames, ignore_index=True)) if frames else 0
+            if confirmed_empty:
+                self.manifest['empty'] = [list(rng) for rng in merge_ranges([tuple(rng) for rng in self.empty_ranges] + confirmed_empty)]
+                self._save_manifest()
+            return added
+
+    def _write_partition(self, month: str, df: pd.DataFrame) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        file_name = f"{month}.parquet"
+        _write_atomic(os.path.join(self.path, file_name), lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_atomic(self._arrow_path(month), lambda tmp_path: _write_arrow(tmp_path, table))
+        self.partitions[month] = self._partition_entry(file_name, df['timestamp'])
+
+    def migrate_legacy(self) -> None:
+        """Importar una vez el parquet único del formato anterior si el almacén está vacío"""
+        if self.partitions or not os.path.exists(self.legacy_path):
+            return
+        with self._writing():
+            if self.partitions:
+                return  # Otro escritor ya la importó
+            legacy = pd.read_parquet(self.legacy_path)
+            added = self._append(legacy)
+        print(f"[CACHE] Migrated {self.legacy_path} to {len(self.partitions)} partitions ({added} rows)")
@@ -7,6 +7,9 @@ Implementación completa de todas las funciones de detección
 para el bot de Smart Money Concepts Simplified by TJR
 """
 
+import bisect
+import hashlib
+import weakref
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Tuple, Optional
@@ -15,6 +18,194 @@ from enum import Enum
 
 # ==================== FUNCIONES AVANZADAS DE DETECCIÓN ====================
 
+def detect_swings_vectorized(df: pd.DataFrame, left_bars: int = 2, right_bars: int = 2) -> pd.DataFrame:
+    """
+    Detectar swing highs y swing lows con ventanas deslizantes de NumPy
+
+    Equivalente a ``SMCBot._detect_swings_loop``: una vela es swing high si su
+    high supera estrictamente a los ``left_bars`` anteriores y ``right_bars``
+    posteriores (análogo para swing low con el low).
+
+    Args:
+        df: DataFrame con datos OHLC
+        left_bars: Velas a la izquierda del swing
+        right_bars: Velas a la derecha del swing
+
+    Returns:
+        DataFrame con columnas swing_high, swing_low, swing_high_price, swing_low_price
+    """
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    n = len(df)
+    window = left_bars + right_bars + 1
+
+    swing_high = np.zeros(n, dtype=bool)
+    swing_low = np.zeros(n, dtype=bool)
+
+    if n >= window:
+        # Vista (n - window + 1, window) sin copiar; la columna left_bars es la vela central
+        high_windows = np.lib.stride_tricks.sliding_window_view(high, window)
+        low_windows = np.lib.stride_tricks.sliding_window_view(low, window)
+        neighbors = np.r_[0:left_bars, left_bars + 1:window]
+
+        center_high = high_windows[:, left_bars:left_bars + 1]
+        center_low = low_windows[:, left_bars:left_bars + 1]
+
+        # Negar la comparación inversa reproduce el bucle original también con NaN
+        swing_high[left_bars:n - right_bars] = ~(center_high <= high_windows[:, neighbors]).any(axis=1)
+        swing_low[left_bars:n - right_bars] = ~(center_low >= low_windows[:, neighbors]).any(axis=1)
+
+    return pd.DataFrame({
+        'swing_high': swing_high,
+        'swing_low': swing_low,
+        'swing_high_price': np.where(swing_high, high, np.nan),
+        'swing_low_price': np.where(swing_low, low, np.nan),
+    }, index=df.index)
+
+def is_equal_level(price1: float, price2: float, tolerance_pct: float) -> bool:
+    """Verificar si dos precios son "iguales" dentro de la tolerancia (decimal)"""
+    return abs(price1 - price2) / ((price1 + price2) / 2) <= tolerance_pct
+
+class EqualLevelClusters:
+    """
+    Agrupación de equal highs/lows con la regla greedy de detect_liquidity_zones
+
+    Cada swing nuevo se une al primer nivel base (en orden temporal) que esté
+    dentro de la tolerancia; si no hay ninguno, pasa a ser base. Las bases se
+    guardan ordenadas por precio, de modo que cada inserción solo compara las
+    bases de la ventana de tolerancia (búsqueda binaria).
+    """
+
+    def __init__(self, zone_type: str, tolerance: float):
+        """
+        Args:
+            zone_type: 'equal_highs' o 'equal_lows'
+            tolerance: Tolerancia en decimal (0.00075 = 0.075%)
+        """
+        self.zone_type = zone_type
+        self.tolerance = tolerance
+        self.members: List[List[Tuple]] = []   # (timestamp, precio) por base
+        self.zones: List[Optional[Dict]] = []  # zona por base (None con < 2 miembros)
+        self._base_prices: List[float] = []    # precios base ordenados
+        self._base_ids: List[int] = []         # id de base paralelo a _base_prices
+        self.last_base: Optional[int] = None   # base de la última zona devuelta por add()
+
+    def _candidate_range(self, price: float) -> Tuple[int, int]:
+        """Rango de bases ordenadas que pueden estar dentro de la tolerancia"""
+        half = self.tolerance / 2
+        if price <= 0 or half >= 1:
+            return 0, len(self._base_prices)
+        # |b - p| <= tol * (b + p) / 2  <=>  p(1-h)/(1+h) <= b <= p(1+h)/(1-h)
+        lower = price * (1 - half) / (1 + half) * (1 - 1e-9)
+        upper = price * (1 + half) / (1 - half) * (1 + 1e-9)
+        return (bisect.bisect_left(self._base_prices, lower),
+                bisect.bisect_right(self._base_prices, upper))
+
+    def add(self, timestamp, price: float) -> Optional[Dict]:
+        """
+        Añadir un swing en orden temporal
+
+        Returns:
+            La zona de liquidez creada o actualizada, o None si el swing abre una base nueva
+        """
+        best = None
+        if np.isfinite(price):
+            start, end = self._candidate_range(price)
+            for pos in range(start, end):
+                base_id = self._base_ids[pos]
+                if (best is None or base_id < best) and is_equal_level(self._base_prices[pos], price, self.tolerance):
+                    best = base_id
+
+        if best is None:
+            base_id = len(self.members)
+            self.members.append([(timestamp, price)])
+            self.zones.append(None)
+            # Precios no finitos nunca son "iguales" a otro nivel
+            if np.isfinite(price):
+                pos = bisect.bisect_right(self._base_prices, price)
+                self._base_prices.insert(pos, price)
+                self._base_ids.insert(pos, base_id)
+            return None
+
+        self.last_base = best
+        members = self.members[best]
+        members.append((timestamp, price))
+        zone = self.zones[best]
+        if zone is None:
+            zone = self.zones[best] = {'type': self.zone_type}
+        zone.update({
+            'price': sum(p for _, p in members) / len(members),
+            'count': len(members),
+            'timestamps': [ts for ts, _ in members],
+            'swept': False,
+            'strength': 'high' if len(members) >= 3 else 'medium'
+        })
+        return zone
+
+    def liquidity_zones(self) -> List[Dict]:
+        """Zonas con al menos 2 niveles iguales, en el orden de sus bases"""
+        return [zone for zone in self.zones if zone is not None]
+
+def classify_structure_change(prev_prev: Dict, previous: Dict, current: Dict) -> Optional[Dict]:
+    """
+    Clasificar el último punto de estructura como CHoCH, BOS o ninguno
+
+    Args:
+        prev_prev: Punto de estructura i-2
+        previous: Punto de estructura i-1
+        current: Punto de estructura i
+
+    Returns:
+        Evento CHoCH/BOS o None
+    """
+    # CHoCH: Cambio de carácter (de alcista a bajista o viceversa)
+    if (prev_prev['type'].value in ['higher_high', 'higher_low'] and
+        previous['type'].value in ['lower_low', 'lower_high']):
+
+        return {
+            'type': 'CHoCH',
+            'direction': 'bearish',
+            'price': current['price'],
+            'timestamp': current['timestamp'],
+            'strength': 'high'
+        }
+
+    elif (prev_prev['type'].value in ['lower_low', 'lower_high'] and
+          previous['type'].value in ['higher_high', 'higher_low']):
+
+        return {
+            'type': 'CHoCH',
+            'direction': 'bullish',
+            'price': current['price'],
+            'timestamp': current['timestamp'],
+            'strength': 'high'
+        }
+
+    # BOS: Ruptura de estructura (continuación de tendencia)
+    elif (prev_prev['type'].value in ['higher_high', 'higher_low'] and
+          current['type'].value in ['higher_high', 'higher_low']):
+
+        return {
+            'type': 'BOS',
+            'direction': 'bullish',
+            'price': current['price'],
+            'timestamp': current['timestamp'],
+            'strength': 'medium'
+        }
+
+    elif (prev_prev['type'].value in ['lower_low', 'lower_high'] and
+          current['type'].value in ['lower_low', 'lower_high']):
+
+        return {
+            'type': 'BOS',
+            'direction': 'bearish',
+            'price': current['price'],
+            'timestamp': current['timestamp'],
+            'strength': 'medium'
+        }
+
+    return None
+
 def detect_choch_bos_advanced(df: pd.DataFrame, swings: pd.DataFrame, structure: List[Dict]) -> List[Dict]:
     """
     Detectar cambios de estructura (CHoCH) y rupturas de estructura (BOS) avanzado
@@ -34,55 +225,9 @@ def detect_choch_bos_advanced(df: pd.DataFrame, swings: pd.DataFrame, structure:
 
     # Analizar cambios en la estructura
     for i in range(2, len(structure)):
-        current = structure[i]
-        previous = structure[i-1]
-        prev_prev = structure[i-2]
-
-        # CHoCH: Cambio de carácter (de alcista a bajista o viceversa)
-        if (prev_prev['type'].value in ['higher_high', 'higher_low'] and
-            previous['type'].value in ['lower_low', 'lower_high']):
-
-            choch_bos.append({
-                'type': 'CHoCH',
-                'direction': 'bearish',
-                'price': current['price'],
-                'timestamp': current['timestamp'],
-                'strength': 'high'
-            })
-
-        elif (prev_prev['type'].value in ['lower_low', 'lower_high'] and
-              previous['type'].value in ['higher_high', 'higher_low']):
-
-            choch_bos.append({
-                'type': 'CHoCH',
-                'direction': 'bullish',
-                'price': current['price'],
-                'timestamp': current['timestamp'],
-                'strength': 'high'
-            })
-
-        # BOS: Ruptura de estructura (continuación de tendencia)
-        elif (prev_prev['type'].value in ['higher_high', 'higher_low'] and
-              current['type'].value in ['higher_high', 'higher_low']):
-
-            choch_bos.append({
-                'type': 'BOS',
-                'direction': 'bullish',
-                'price': current['price'],
-                'timestamp': current['timestamp'],
-                'strength': 'medium'
-            })
-
-        elif (prev_prev['type'].value in ['lower_low', 'lower_high'] and
-              current['type'].value in ['lower_low', 'lower_high']):
-
-            choch_bos.append({
-                'type': 'BOS',
-                'direction': 'bearish',
-                'price': current['price'],
-                'timestamp': current['timestamp'],
-                'strength': 'medium'
-            })
+        event = classify_structure_change(structure[i-2], structure[i-1], structure[i])
+        if event is not None:
+            choch_bos.append(event)
 
     return choch_bos
 
@@ -245,136 +390,542 @@ def detect_fvg_advanced(df: pd.DataFrame, min_size_pct: float = 0.05) -> List[Di
 
     return fvg_zones
 
-def detect_confirmation_patterns(df: pd.DataFrame, index: int, config) -> Dict:
+def _sparse_table(values: np.ndarray, reducer) -> List[np.ndarray]:
     """
-    Detectar patrones de velas de confirmación mejorados
+    Tabla dispersa de extremos: el nivel k guarda reducer(values[p:p + 2**k])
 
     Args:
-        df: DataFrame con datos OHLC
-        index: Índice de la vela a analizar
-        config: Configuración SMC con parámetros
+        values: Array de precios
+        reducer: np.fmin o np.fmax (ignoran NaN como el bucle original)
 
     Returns:
-        Diccionario con información de confirmación
+        Lista de niveles, de longitud decreciente
     """
-    if index < 1 or index >= len(df):
-        return {'confirmed': False, 'type': None, 'strength': 0}
+    table = [values]
+    span = 1
+    while span * 2 <= len(values):
+        previous = table[-1]
+        table.append(reducer(previous[:-span], previous[span:]))
+        span *= 2
+    return table
+
+def _first_index_reaching(table: List[np.ndarray], start: np.ndarray,
+                          threshold: np.ndarray, below: bool) -> np.ndarray:
+    """
+    Primer índice >= start cuyo valor es <= threshold (below) o >= threshold
 
-    current = df.iloc[index]
-    previous = df.iloc[index-1]
+    Salto binario sobre la tabla dispersa, vectorizado para todas las consultas.
+    Devuelve len(values) cuando ningún índice cumple la condición.
+    """
+    n = len(table[0])
+    pos = start.astype(np.int64, copy=True)
+    for k in range(len(table) - 1, -1, -1):
+        span = 1 << k
+        active = np.flatnonzero(pos + span <= n)
+        if active.size == 0:
+            continue
+        extreme = table[k][pos[active]]
+        if below:
+            skip = ~(extreme <= threshold[active])
+        else:
+            skip = ~(extreme >= threshold[active])
+        pos[active[skip]] += span
+    return pos
 
-    # Calcular métricas básicas
-    body_size = abs(current['close'] - current['open'])
-    total_range = current['high'] - current['low']
-    body_pct = body_size / total_range if total_range > 0 else 0
+def resolve_first_touch(high: np.ndarray, low: np.ndarray, start: np.ndarray,
+                        top: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+    """
+    Primera vela (posición >= start) cuyo rango toca cada zona [bottom, top]
 
-    upper_wick = current['high'] - max(current['open'], current['close'])
-    lower_wick = min(current['open'], current['close']) - current['low']
+    Una vela toca la zona cuando low <= top y high >= bottom, igual que los
+    bucles de llenado/mitigación originales. Coste O(n log n + k log n).
 
-    # 1. BULLISH ENGULFING
-    if (hasattr(config, 'enable_engulfing') and config.enable_engulfing and
-        current['close'] > current['open'] and
-        previous['close'] < previous['open'] and
-        current['open'] <= previous['close'] and
-        current['close'] >= previous['open']):
+    Args:
+        high: Array de máximos
+        low: Array de mínimos
+        start: Posición desde la que buscar para cada zona
+        top: Límite superior de cada zona
+        bottom: Límite inferior de cada zona
 
-        strength = 0.9 if body_pct > 0.8 else 0.7
-        return {
-            'confirmed': True,
-            'type': 'bullish_engulfing',
-            'strength': strength,
-            'description': 'Engulfing alcista completo'
-        }
+    Returns:
+        Array con la posición del primer toque, o -1 si la zona sigue intacta
+    """
+    n = len(high)
+    touch = np.full(len(start), -1, dtype=np.int64)
+    if n == 0 or len(start) == 0:
+        return touch
+
+    min_table = _sparse_table(low, np.fmin)
+    max_table = _sparse_table(high, np.fmax)
+
+    pending = np.arange(len(start))
+    pos = np.asarray(start, dtype=np.int64)
+
+    while pending.size:
+        # Siguiente vela con low <= top; si además high >= bottom, la toca
+        pos = _first_index_reaching(min_table, pos, top[pending], below=True)
+        inside = pos < n
+        pending, pos = pending[inside], pos[inside]
+        hit = high[pos] >= bottom[pending]
+        touch[pending[hit]] = pos[hit]
+        pending, pos = pending[~hit], pos[~hit] + 1
+
+        # La vela quedó entera por debajo: siguiente vela con high >= bottom
+        pos = _first_index_reaching(max_table, pos, bottom[pending], below=False)
+        inside = pos < n
+        pending, pos = pending[inside], pos[inside]
+        hit = low[pos] <= top[pending]
+        touch[pending[hit]] = pos[hit]
+        pending, pos = pending[~hit], pos[~hit] + 1
+
+    return touch
+
+def _forward_extreme(values: np.ndarray, window: int, use_max: bool) -> np.ndarray:
+    """
+    Máximo/mínimo de values[j:j + window] para cada j en 0..n (NaN si vacío)
 
-    # 2. BEARISH ENGULFING
-    elif (hasattr(config, 'enable_engulfing') and config.enable_engulfing and
-          current['close'] < current['open'] and
-          previous['close'] > previous['open'] and
-          current['open'] >= previous['close'] and
-          current['close'] <= previous['open']):
+    La posición n (ventana vacía) permite indexar con "siguiente vela" sin
+    comprobar límites.
+    """
+    reversed_values = pd.Series(values[::-1])
+    rolling = reversed_values.rolling(window, min_periods=1)
+    extreme = (rolling.max() if use_max else rolling.min()).to_numpy()[::-1]
+    return np.append(extreme, np.nan)
 
-        strength = 0.9 if body_pct > 0.8 else 0.7
-        return {
-            'confirmed': True,
-            'type': 'bearish_engulfing',
-            'strength': strength,
-            'description': 'Engulfing bajista completo'
-        }
+def detect_order_blocks_vectorized(df: pd.DataFrame, swings: pd.DataFrame, choch_bos: List[Dict],
+                                   lookback: int = 20, impulse_bars: int = 10) -> List[Dict]:
+    """
+    Detectar Order Blocks y su mitigación trabajando sobre posiciones
 
-    # 3. HAMMER / PINBAR (Long Lower Wick)
-    elif (hasattr(config, 'enable_pinbar') and config.enable_pinbar and
-          lower_wick > body_size * getattr(config, 'min_wick_ratio', 2.0) and
-          upper_wick < body_size * 0.5 and
-          body_pct < 0.4):
+    Mismo resultado que ``detect_order_blocks_advanced`` para un índice
+    cronológico. Las ventanas ``tail(20)``/``head(10)`` por evento se sustituyen
+    por arrays precalculados (impulso posterior y última vela contraria
+    válida) y la mitigación de todos los OB se resuelve en bloque con
+    ``resolve_first_touch``.
 
-        return {
-            'confirmed': True,
-            'type': 'hammer',
-            'strength': 0.85,
-            'description': 'Hammer - Rechazo alcista'
-        }
+    Args:
+        df: DataFrame con datos OHLC (índice ordenado)
+        swings: DataFrame con swings detectados
+        choch_bos: Lista con CHoCH y BOS detectados
+        lookback: Velas previas al evento en las que buscar el OB
+        impulse_bars: Velas posteriores al OB que deben mostrar el impulso
+
+    Returns:
+        Lista con Order Blocks detectados
+    """
+    if not choch_bos or len(df) == 0:
+        return []
 
-    # 4. INVERTED HAMMER / SHOOTING STAR (Long Upper Wick)
-    elif (hasattr(config, 'enable_pinbar') and config.enable_pinbar and
-          upper_wick > body_size * getattr(config, 'min_wick_ratio', 2.0) and
-          lower_wick < body_size * 0.5 and
-          body_pct < 0.4):
+    open_ = df['open'].to_numpy(dtype=float)
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+    positions = np.arange(len(df))
 
-        return {
-            'confirmed': True,
-            'type': 'shooting_star',
-            'strength': 0.85,
-            'description': 'Shooting Star - Rechazo bajista'
-        }
+    # Primera vela estrictamente posterior a cada vela
+    next_pos = df.index.searchsorted(df.index, side='right')
+    future_high = _forward_extreme(high, impulse_bars, use_max=True)[next_pos]
+    future_low = _forward_extreme(low, impulse_bars, use_max=False)[next_pos]
 
-    # 5. STRONG BULLISH REJECTION (Large Green Body)
-    elif (hasattr(config, 'enable_rejection_wick') and config.enable_rejection_wick and
-          current['close'] > current['open'] and
-          body_pct > getattr(config, 'min_confirmation_body', 0.6) and
-          lower_wick > body_size * 0.5):
+    # Velas contrarias seguidas de un movimiento impulsivo del 0.5%
+    bullish_candidate = (close < open_) & (future_high > high * 1.005)
+    bearish_candidate = (close > open_) & (future_low < low * 0.995)
+    last_bullish = np.maximum.accumulate(np.where(bullish_candidate, positions, -1))
+    last_bearish = np.maximum.accumulate(np.where(bearish_candidate, positions, -1))
 
-        return {
-            'confirmed': True,
-            'type': 'strong_bullish_rejection',
-            'strength': 0.75,
-            'description': 'Rechazo alcista fuerte'
-        }
+    event_times = [event['timestamp'] for event in choch_bos]
+    event_ends = df.index.searchsorted(event_times, side='left')
+
+    order_blocks = []
+    ob_positions = []
+    for event, end in zip(choch_bos, event_ends):
+        begin = max(end - lookback, 0)
+        if end - begin < 5:
+            continue
 
-    # 6. STRONG BEARISH REJECTION (Large Red Body)
-    elif (hasattr(config, 'enable_rejection_wick') and config.enable_rejection_wick and
-          current['close'] < current['open'] and
-          body_pct > getattr(config, 'min_confirmation_body', 0.6) and
-          upper_wick > body_size * 0.5):
+        bullish = event['direction'] == 'bullish'
+        candidate = (last_bullish if bullish else last_bearish)[end - 1]
+        if candidate < begin:
+            continue
 
-        return {
-            'confirmed': True,
-            'type': 'strong_bearish_rejection',
-            'strength': 0.75,
-            'description': 'Rechazo bajista fuerte'
+        order_blocks.append({
+            'type': 'bullish_ob' if bullish else 'bearish_ob',
+            'top': high[candidate],
+            'bottom': low[candidate],
+            'timestamp': df.index[candidate],
+            'event_timestamp': event['timestamp'],
+            'mitigated': False,
+            'strength': 'high' if event['type'] == 'CHoCH' else 'medium'
+        })
+        ob_positions.append(candidate)
+
+    # Verificar mitigación de todos los Order Blocks de una vez
+    if order_blocks:
+        mitigations = resolve_first_touch(
+            high, low, next_pos[np.array(ob_positions, dtype=np.int64)],
+            np.array([ob['top'] for ob in order_blocks]),
+            np.array([ob['bottom'] for ob in order_blocks])
+        )
+        for ob, mitigation in zip(order_blocks, mitigations):
+            if mitigation >= 0:
+                ob['mitigated'] = True
+                ob['mitigation_timestamp'] = df.index[mitigation]
+
+    return order_blocks
+
+def detect_fvg_vectorized(df: pd.DataFrame, min_size_pct: float = 0.05) -> List[Dict]:
+    """
+    Detectar Fair Value Gaps y su llenado sin recorrer el DataFrame vela a vela
+
+    Mismo resultado que ``detect_fvg_advanced`` para un índice cronológico:
+    los gaps salen de arrays desplazados de high/low y el llenado se resuelve
+    en bloque con ``resolve_first_touch``.
+
+    Args:
+        df: DataFrame con datos OHLC (índice ordenado)
+        min_size_pct: Tamaño mínimo del FVG como porcentaje del precio
+
+    Returns:
+        Lista con FVG detectados
+    """
+    if len(df) < 3:
+        return []
+
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+
+    # Vela 1 = i-2, vela 2 = i-1, vela 3 = i
+    high1, low1 = high[:-2], low[:-2]
+    high3, low3 = high[2:], low[2:]
+    close2 = close[1:-1]
+
+    bullish = high1 < low3
+    bearish = ~bullish & (low1 > high3)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        size_pct = np.where(bullish, low3 - high1, low1 - high3) / close2 * 100
+
+    selected = (bullish | bearish) & (size_pct >= min_size_pct)
+    offsets = np.flatnonzero(selected)
+    if offsets.size == 0:
+        return []
+
+    positions = offsets + 2
+    is_bullish = bullish[offsets]
+    tops = np.where(is_bullish, low3[offsets], low1[offsets])
+    bottoms = np.where(is_bullish, high1[offsets], high3[offsets])
+    sizes = size_pct[offsets]
+
+    # Verificar llenado: primera vela posterior al timestamp del gap
+    starts = df.index.searchsorted(df.index[positions], side='right')
+    fills = resolve_first_touch(high, low, starts, tops, bottoms)
+
+    fvg_zones = []
+    for k, i in enumerate(positions):
+        fvg = {
+            'type': 'bullish_fvg' if is_bullish[k] else 'bearish_fvg',
+            'top': tops[k],
+            'bottom': bottoms[k],
+            'timestamp': df.index[i],
+            'size_pct': sizes[k],
+            'filled': False,
+            'strength': 'high' if sizes[k] > 0.2 else 'medium'
         }
+        if fills[k] >= 0:
+            fvg['filled'] = True
+            fvg['fill_timestamp'] = df.index[fills[k]]
+        fvg_zones.append(fvg)
+
+    return fvg_zones
+
+def cluster_liquidity_zones(swings: pd.DataFrame, tolerance: float) -> List[Dict]:
+    """
+    Agrupar swings en zonas de liquidez (equal highs/lows) con un índice de precios ordenado
+
+    Misma regla greedy que la comparación par a par original, pero cada swing
+    solo se compara con las bases de su ventana de tolerancia.
+
+    Args:
+        swings: DataFrame de swings (detect_swings)
+        tolerance: Tolerancia en decimal (0.00075 = 0.075%)
+
+    Returns:
+        Lista con zonas de liquidez (primero equal highs, luego equal lows)
+    """
+    liquidity_zones = []
+    for zone_type, flag, price_col in (('equal_highs', 'swing_high', 'swing_high_price'),
+                                       ('equal_lows', 'swing_low', 'swing_low_price')):
+        clusters = EqualLevelClusters(zone_type, tolerance)
+        points = swings.loc[swings[flag], price_col]
+        for timestamp, price in zip(points.index, points.to_numpy()):
+            clusters.add(timestamp, price)
+        liquidity_zones.extend(clusters.liquidity_zones())
+    return liquidity_zones
+
+def resolve_first_sweep(extreme: np.ndarray, close: np.ndarray, start: np.ndarray,
+                        levels: np.ndarray, above: bool) -> np.ndarray:
+    """
+    Primera vela (posición >= start) que barre cada nivel y cierra de vuelta
+
+    Con ``above`` el barrido es high > nivel y close < nivel (equal highs);
+    si no, low < nivel y close > nivel (equal lows). Se alterna la búsqueda
+    de la siguiente mecha que alcanza el nivel y del siguiente cierre al otro
+    lado, ambas con tabla dispersa, para todas las zonas a la vez.
+
+    Args:
+        extreme: Array de máximos (above) o mínimos
+        close: Array de cierres
+        start: Posición desde la que buscar para cada nivel
+        levels: Precio de cada zona
+        above: True para equal highs, False para equal lows
+
+    Returns:
+        Array con la posición del barrido, o -1 si el nivel sigue sin barrer
+    """
+    n = len(close)
+    sweep = np.full(len(start), -1, dtype=np.int64)
+    if n == 0 or len(start) == 0:
+        return sweep
+
+    extreme_table = _sparse_table(extreme, np.fmax if above else np.fmin)
+    close_table = _sparse_table(close, np.fmin if above else np.fmax)
+
+    pending = np.arange(len(start))
+    pos = np.asarray(start, dtype=np.int64)
+
+    def step(table, below):
+        # Saltar hasta la siguiente vela candidata y registrar los barridos
+        nonlocal pending, pos
+        pos = _first_index_reaching(table, pos, levels[pending], below=below)
+        inside = pos < n
+        pending, pos = pending[inside], pos[inside]
+        level = levels[pending]
+        if above:
+            hit = (extreme[pos] > level) & (close[pos] < level)
+        else:
+            hit = (extreme[pos] < level) & (close[pos] > level)
+        sweep[pending[hit]] = pos[hit]
+        pending, pos = pending[~hit], pos[~hit] + 1
+
+    while pending.size:
+        # Siguiente mecha que alcanza el nivel
+        step(extreme_table, below=not above)
+        # La vela cerró al otro lado: siguiente cierre que vuelve al nivel
+        step(close_table, below=above)
+
+    return sweep
+
+def detect_sweeps_vectorized(df: pd.DataFrame, liquidity_zones: List[Dict]) -> List[Dict]:
+    """
+    Detectar barridos de liquidez de todas las zonas en una sola pasada
+
+    Mismo resultado que ``SMCBot._detect_sweeps_loop`` para un índice
+    cronológico; marca ``swept`` en las zonas barridas.
+
+    Args:
+        df: DataFrame con datos OHLC (índice ordenado)
+        liquidity_zones: Zonas de liquidez (cluster_liquidity_zones)
 
-    # 7. STRONG DIRECTIONAL MOVE (Simple but effective)
-    elif body_pct > getattr(config, 'min_confirmation_body', 0.6):
-        if current['close'] > current['open']:
-            return {
-                'confirmed': True,
-                'type': 'strong_bullish',
-                'strength': 0.65,
-                'description': 'Movimiento alcista fuerte'
-            }
+    Returns:
+        Lista con barridos detectados
+    """
+    if not liquidity_zones:
+        return []
+
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+
+    # Buscar barridos después de la última aparición de cada zona
+    levels = np.array([zone['price'] for zone in liquidity_zones], dtype=float)
+    starts = df.index.searchsorted([max(zone['timestamps']) for zone in liquidity_zones], side='right')
+    is_high = np.array([zone['type'] == 'equal_highs' for zone in liquidity_zones])
+    is_low = np.array([zone['type'] == 'equal_lows' for zone in liquidity_zones])
+
+    positions = np.full(len(liquidity_zones), -1, dtype=np.int64)
+    for mask, extreme, above in ((is_high, high, True), (is_low, low, False)):
+        if mask.any():
+            positions[mask] = resolve_first_sweep(extreme, close, starts[mask], levels[mask], above)
+
+    sweeps = []
+    for zone, i in zip(liquidity_zones, positions):
+        if i < 0:
+            continue
+        if zone['type'] == 'equal_highs':
+            # Barrido alcista: precio rompe por encima y cierra por debajo
+            sweeps.append({
+                'type': 'bullish_sweep',
+                'zone_price': zone['price'],
+                'sweep_high': high[i],
+                'close_price': close[i],
+                'timestamp': df.index[i],
+                'zone': zone
+            })
         else:
-            return {
-                'confirmed': True,
-                'type': 'strong_bearish',
-                'strength': 0.65,
-                'description': 'Movimiento bajista fuerte'
-            }
+            # Barrido bajista: precio rompe por debajo y cierra por encima
+            sweeps.append({
+                'type': 'bearish_sweep',
+                'zone_price': zone['price'],
+                'sweep_low': low[i],
+                'close_price': close[i],
+                'timestamp': df.index[i],
+                'zone': zone
+            })
+        zone['swept'] = True
+
+    return sweeps
+
+def candle_pattern_table(df: pd.DataFrame, min_wick_ratio: float = 2.0) -> pd.DataFrame:
+    """
+    Calcular la geometría y los patrones de confirmación de todas las velas a la vez
+
+    Args:
+        df: DataFrame con datos OHLC
+        min_wick_ratio: Ratio mínimo mecha/cuerpo para hammer/shooting star
+
+    Returns:
+        DataFrame (mismo índice) con cuerpo, mechas, body_pct, fuerza de engulfing
+        y máscaras de engulfing, pinbar y mechas de rechazo
+    """
+    open_ = df['open'].to_numpy(dtype=float)
+    high = df['high'].to_numpy(dtype=float)
+    low = df['low'].to_numpy(dtype=float)
+    close = df['close'].to_numpy(dtype=float)
+
+    # Vela anterior (la primera vela no tiene)
+    prev_open = np.r_[np.nan, open_[:-1]]
+    prev_close = np.r_[np.nan, close[:-1]]
+
+    body_size = np.abs(close - open_)
+    prev_body = np.abs(prev_close - prev_open)
+    total_range = high - low
+    upper_wick = high - np.maximum(open_, close)
+    lower_wick = np.minimum(open_, close) - low
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        body_pct = np.where(total_range > 0, body_size / total_range, 0.0)
+        engulfing_strength = np.where(prev_body > 0, body_size / prev_body, 1.0)
+
+    is_bullish = close > open_
+    is_bearish = close < open_
+    prev_bullish = prev_close > prev_open
+    prev_bearish = prev_close < prev_open
+
+    return pd.DataFrame({
+        'body_size': body_size,
+        'total_range': total_range,
+        'body_pct': body_pct,
+        'upper_wick': upper_wick,
+        'lower_wick': lower_wick,
+        'is_bullish': is_bullish,
+        'is_bearish': is_bearish,
+        'engulfing_strength': engulfing_strength,
+        # Engulfing completo (admite igualdad con la vela anterior)
+        'bullish_engulfing': is_bullish & prev_bearish & (open_ <= prev_close) & (close >= prev_open),
+        'bearish_engulfing': is_bearish & prev_bullish & (open_ >= prev_close) & (close <= prev_open),
+        # Engulfing estricto (motor TJR)
+        'bullish_engulfing_strict': is_bullish & prev_bearish & (open_ < prev_close) & (close > prev_open),
+        'bearish_engulfing_strict': is_bearish & prev_bullish & (open_ > prev_close) & (close < prev_open),
+        # Pinbar: mecha larga, mecha opuesta corta y cuerpo pequeño
+        'hammer': (lower_wick > body_size * min_wick_ratio) & (upper_wick < body_size * 0.5) & (body_pct < 0.4),
+        'shooting_star': (upper_wick > body_size * min_wick_ratio) & (lower_wick < body_size * 0.5) & (body_pct < 0.4),
+        # Mecha de rechazo dominante (2x cuerpo y 2x la mecha opuesta)
+        'upper_rejection': (upper_wick > body_size * 2) & (upper_wick > lower_wick * 2),
+        'lower_rejection': (lower_wick > body_size * 2) & (lower_wick > upper_wick * 2),
+    }, index=df.index)
+
+def classify_confirmation_patterns(patterns: pd.DataFrame, config) -> pd.DataFrame:
+    """
+    Clasificar cada vela con la prioridad de detect_confirmation_patterns
+
+    Args:
+        patterns: Tabla de candle_pattern_table
+        config: Configuración SMC con parámetros
+
+    Returns:
+        DataFrame con confirmed, type, strength y description por vela
+    """
+    min_body = getattr(config, 'min_confirmation_body', 0.6)
+    engulfing_on = bool(getattr(config, 'enable_engulfing', False))
+    pinbar_on = bool(getattr(config, 'enable_pinbar', False))
+    rejection_on = bool(getattr(config, 'enable_rejection_wick', False))
+
+    body_size = patterns['body_size'].to_numpy()
+    body_pct = patterns['body_pct'].to_numpy()
+    is_bullish = patterns['is_bullish'].to_numpy()
+    strong_body = body_pct > min_body
+    engulfing_strength = np.where(body_pct > 0.8, 0.9, 0.7)
+
+    # (condición, tipo, fuerza, descripción) en orden de prioridad
+    rules = [
+        (engulfing_on & patterns['bullish_engulfing'].to_numpy(),
+         'bullish_engulfing', engulfing_strength, 'Engulfing alcista completo'),
+        (engulfing_on & patterns['bearish_engulfing'].to_numpy(),
+         'bearish_engulfing', engulfing_strength, 'Engulfing bajista completo'),
+        (pinbar_on & patterns['hammer'].to_numpy(),
+         'hammer', 0.85, 'Hammer - Rechazo alcista'),
+        (pinbar_on & patterns['shooting_star'].to_numpy(),
+         'shooting_star', 0.85, 'Shooting Star - Rechazo bajista'),
+        (rejection_on & is_bullish & strong_body & (patterns['lower_wick'].to_numpy() > body_size * 0.5),
+         'strong_bullish_rejection', 0.75, 'Rechazo alcista fuerte'),
+        (rejection_on & patterns['is_bearish'].to_numpy() & strong_body & (patterns['upper_wick'].to_numpy() > body_size * 0.5),
+         'strong_bearish_rejection', 0.75, 'Rechazo bajista fuerte'),
+        (strong_body & is_bullish, 'strong_bullish', 0.65, 'Movimiento alcista fuerte'),
+        (strong_body & ~is_bullish, 'strong_bearish', 0.65, 'Movimiento bajista fuerte'),
+    ]
+    conditions = [condition for condition, _, _, _ in rules]
+
+    # Índice de la primera regla que se cumple; -1 (última posición) = sin confirmación
+    rule = np.select(conditions, np.arange(len(rules)), default=-1)
+    types = np.array([r[1] for r in rules] + [None], dtype=object)
+    descriptions = np.array([r[3] for r in rules] + ['Sin confirmación clara'], dtype=object)
+
+    return pd.DataFrame({
+        'confirmed': rule >= 0,
+        'type': types[rule],
+        'strength': np.select(conditions, [r[2] for r in rules], default=0.0),
+        'description': descriptions[rule],
+    }, index=patterns.index)
+
+def detect_confirmation_patterns(df: pd.DataFrame, index: int, config,
+                                 confirmations: Optional[pd.DataFrame] = None) -> Dict:
+    """
+    Detectar patrones de velas de confirmación mejorados
+
+    Args:
+        df: DataFrame con datos OHLC
+        index: Índice de la vela a analizar
+        config: Configuración SMC con parámetros
+        confirmations: Tabla precalculada de classify_confirmation_patterns
+            (si no se pasa, se calcula solo para la vela y su anterior)
+
+    Returns:
+        Diccionario con información de confirmación
+    """
+    if index < 1 or index >= len(df):
+        return {'confirmed': False, 'type': None, 'strength': 0}
+
+    if confirmations is None:
+        window = df.iloc[index - 1:index + 1]
+        patterns = candle_pattern_table(window, getattr(config, 'min_wick_ratio', 2.0))
+        row = classify_confirmation_patterns(patterns, config).iloc[-1]
+    else:
+        row = confirmations.iloc[index]
+
+    if not row['confirmed']:
+        return {
+            'confirmed': False,
+            'type': None,
+            'strength': 0,
+            'description': 'Sin confirmación clara'
+        }
 
     return {
-        'confirmed': False,
-        'type': None,
-        'strength': 0,
-        'description': 'Sin confirmación clara'
+        'confirmed': True,
+        'type': row['type'],
+        'strength': float(row['strength']),
+        'description': row['description']
     }
 
 def calculate_sl_tp_advanced(entry_price: float, signal_type: str, atr: float,
@@ -520,6 +1071,173 @@ def calculate_sl_tp_tjr(entry_price: float, signal_type: str,
 
     return stop_loss, take_profit, risk_reward
 
+SIGNAL_WINDOW = 10        # Velas finales que mira generate_trading_signals
+SIGNAL_CANDIDATE_BARS = 3 # De ellas, las que pueden dar señal
+
+def generate_trading_signals(df: pd.DataFrame, liquidity_zones: List, sweeps: List,
+                             choch_bos: List, order_blocks: List, fvg_zones: List,
+                             atr: float, config) -> List:
+    """
+    Generar señales de trading basadas en la estrategia SMC completa
+
+    Lógica: Barrida de liquidez + CHoCH + (OB o FVG disponible) + vela de
+    confirmación en una de las últimas velas. Solo se comprueba que existan
+    zonas, barridos y CHoCH, así que basta con pasar los más recientes, y del
+    DataFrame solo se usan las últimas SIGNAL_WINDOW velas.
+
+    Args:
+        df: DataFrame con datos OHLC (índice de timestamps)
+        liquidity_zones: Zonas de liquidez detectadas
+        sweeps: Barridos de liquidez
+        choch_bos: Eventos CHoCH/BOS
+        order_blocks: Order Blocks
+        fvg_zones: Fair Value Gaps
+        atr: ATR actual (distancia del SL)
+        config: Configuración SMC (min_rr y filtros de confirmación)
+
+    Returns:
+        Lista de TradingSignal
+    """
+    from smc_bot import SignalType, TradingSignal
+
+    signals = []
+    if len(df) < SIGNAL_WINDOW:
+        return signals
+
+    # Condiciones del setup (iguales para todas las velas candidatas)
+    has_liquidity = len(liquidity_zones) > 0
+    has_sweep = len(sweeps) > 0
+    has_choch = any(event['type'] == 'CHoCH' for event in choch_bos)
+    has_ob_or_fvg = len(order_blocks) > 0 or len(fvg_zones) > 0
+    if not (has_liquidity and has_sweep and has_choch and has_ob_or_fvg):
+        return signals
+
+    recent_data = df.tail(SIGNAL_WINDOW)
+    confirmations = classify_confirmation_patterns(
+        candle_pattern_table(recent_data, getattr(config, 'min_wick_ratio', 2.0)), config)
+    trend_up = recent_data['close'].iloc[-1] > recent_data['close'].iloc[-5]
+
+    for i in range(SIGNAL_WINDOW - SIGNAL_CANDIDATE_BARS, SIGNAL_WINDOW):
+        confirmation = detect_confirmation_patterns(recent_data, i, config, confirmations)
+        if not confirmation['confirmed']:
+            continue
+
+        # Tipo de señal según la tendencia de las últimas velas
+        if trend_up and confirmation['type'] in ['bullish_engulfing', 'hammer', 'strong_bullish']:
+            signal_type = SignalType.BUY
+        elif not trend_up and confirmation['type'] in ['bearish_engulfing', 'shooting_star', 'strong_bearish']:
+            signal_type = SignalType.SELL
+        else:
+            continue
+
+        # Entrada al cierre, SL/TP por ATR
+        entry_price = recent_data['close'].iloc[i]
+        sl, tp, rr = calculate_sl_tp_advanced(entry_price, signal_type.value, atr, config.min_rr)
+        if not np.isfinite([sl, tp]).all() or rr < config.min_rr - 1e-9:
+            continue
+
+        reason_parts = ["Barrido de liquidez", "CHoCH detectado", "OB/FVG disponible",
+                        f"Confirmación: {confirmation['type']}"]
+        signals.append(TradingSignal(
+            signal_type=signal_type,
+            entry_price=entry_price,
+            stop_loss=sl,
+            take_profit=tp,
+            risk_reward=rr,
+            confidence=0.7,
+            reason=" + ".join(reason_parts),
+            timestamp=recent_data.index[i]
+        ))
+
+    return signals
+
+def frame_version(df: pd.DataFrame) -> Tuple[int, int]:
+    """Huella del contenido de un DataFrame (longitud + hash de filas e índice, en orden)"""
+    row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+    # Hashear la secuencia de hashes (no su suma) para que el orden de las filas cuente
+    digest = hashlib.blake2b(np.ascontiguousarray(row_hashes).tobytes(), digest_size=8).digest()
+    return len(df), int.from_bytes(digest, 'little')
+
+def _read_only(series: pd.Series) -> pd.Series:
+    """Copia de la serie sobre un array de solo lectura (las escrituras in situ fallan)"""
+    values = series.to_numpy(copy=True)
+    values.flags.writeable = False
+    return pd.Series(values, index=series.index, name=series.name, copy=False)
+
+def _addresses(columns: Tuple[pd.Series, ...]) -> Tuple[int, ...]:
+    """Dirección de memoria de los datos de cada columna"""
+    return tuple(column.to_numpy().__array_interface__['data'][0] for column in columns)
+
+class IndicatorCache:
+    """
+    Caché de true range y ATR por DataFrame
+
+    Cada DataFrame se identifica por su identidad (referencia débil: la entrada
+    desaparece cuando se libera el frame), por su índice y por la dirección de
+    memoria de sus columnas high/low/close. La entrada guarda vistas de esas
+    columnas, así que con copy-on-write cualquier escritura in situ posterior
+    obliga a pandas a copiar el bloque y la dirección cambia: añadir velas o
+    modificar cualquiera de ellas invalida la entrada sin recorrer las velas
+    en cada acceso.
+
+    Las series devueltas se comparten entre llamadas y son de solo lectura.
+    """
+
+    COLUMNS = ('high', 'low', 'close')
+
+    def __init__(self):
+        self._entries: Dict[int, Dict] = {}
+
+    def _values(self, df: pd.DataFrame) -> Dict:
+        """Indicadores en caché del frame (vacíos si el índice o las columnas han cambiado)"""
+        key = id(df)
+        entry = self._entries.get(key)
+        if entry is None or entry['ref']() is not df:
+            ref = weakref.ref(df, lambda _, key=key: self._entries.pop(key, None))
+            entry = self._entries[key] = {'ref': ref, 'index': None, 'values': {}}
+        columns = tuple(df[name] for name in self.COLUMNS)
+        addresses = _addresses(columns)
+        if entry['index'] is not df.index or entry['addresses'] != addresses:
+            entry.update(index=df.index, columns=columns, addresses=addresses, values={})
+        return entry['values']
+
+    def _get(self, df: pd.DataFrame, key: Tuple, compute):
+        """Valor en caché o compute() la primera vez"""
+        values = self._values(df)
+        if key not in values:
+            values[key] = _read_only(compute())
+        return values[key]
+
+    def true_range(self, df: pd.DataFrame, first_bar: bool = True) -> pd.Series:
+        """
+        True range: max(high - low, |high - cierre previo|, |low - cierre previo|)
+
+        Args:
+            df: DataFrame con datos OHLC
+            first_bar: True = la primera vela usa high - low; False = NaN (sin cierre previo)
+        """
+        def compute():
+            high_low = df['high'] - df['low']
+            prev_close = df['close'].shift()
+            true_range = pd.concat([high_low, np.abs(df['high'] - prev_close),
+                                    np.abs(df['low'] - prev_close)], axis=1).max(axis=1)
+            if not first_bar and len(true_range):
+                true_range.iloc[0] = np.nan
+            return true_range
+        return self._get(df, ('true_range', first_bar), compute)
+
+    def atr(self, df: pd.DataFrame, period: int = 14, first_bar: bool = True) -> pd.Series:
+        """ATR como media móvil simple del true range"""
+        return self._get(df, ('atr', period, first_bar),
+                         lambda: self.true_range(df, first_bar).rolling(window=period).mean())
+
+    def clear(self):
+        """Vaciar la caché"""
+        self._entries.clear()
+
+# Caché compartida por todos los módulos
+INDICATOR_CACHE = IndicatorCache()
+
 def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
     """
     Calcular Average True Range
@@ -529,13 +1247,6 @@ def calculate_atr(df: pd.DataFrame, period: int = 14) -> pd.Series:
         period: Período para el cálculo
 
     Returns:
-        Serie con valores ATR
+        Serie con valores ATR (compartida por INDICATOR_CACHE, de solo lectura)
     """
-    high_low = df['high'] - df['low']
-    high_close_prev = np.abs(df['high'] - df['close'].shift(1))
-    low_close_prev = np.abs(df['low'] - df['close'].shift(1))
-
-    true_range = np.maximum(high_low, np.maximum(high_close_prev, low_close_prev))
-    atr = true_range.rolling(window=period).mean()
-
-    return atr
+    return INDICATOR_CACHE.atr(df, period, first_bar=False)
@@ -95,12 +95,9 @@ def has_extreme_gap(df, window=14):
     high = df['high'].iloc[-1]
     low = df['low'].iloc[-1]
     high_low_gap = high - low
-    # ATR móvil
-    high_low = df['high'] - df['low']
-    high_close = np.abs(df['high'] - df['close'].shift())
-    low_close = np.abs(df['low'] - df['close'].shift())
-    true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    atr = true_range.rolling(window=window).mean().iloc[-1]
+    # ATR móvil (compartido con el resto de módulos)
+    from smc_advanced import INDICATOR_CACHE
+    atr = INDICATOR_CACHE.atr(df, window).iloc[-1]
     gap_threshold = atr * 3
     return high_low_gap > gap_threshold
 
@@ -17,6 +17,8 @@ import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 
+from ohlcv_store import timeframe_to_minutes  # Reexportado: antes vivía aquí
+
 class TradeResult(Enum):
     WIN = "WIN"
     LOSS = "LOSS"
@@ -40,10 +42,140 @@ class BacktestTrade:
     max_adverse_excursion: float = 0.0  # MAE
     max_favorable_excursion: float = 0.0  # MFE
 
+# Códigos de TradeResult en el ledger (0 = sin resultado)
+TRADE_RESULTS = (None, TradeResult.WIN, TradeResult.LOSS, TradeResult.BREAKEVEN)
+
+TRADE_DTYPE = np.dtype([
+    ('entry_time', 'i8'),   # ns desde epoch (UTC si el timestamp tiene zona horaria)
+    ('exit_time', 'i8'),
+    ('signal_type', 'U8'),
+    ('entry_price', 'f8'),
+    ('exit_price', 'f8'),
+    ('stop_loss', 'f8'),
+    ('take_profit', 'f8'),
+    ('result', 'i1'),
+    ('pnl_points', 'f8'),
+    ('pnl_percent', 'f8'),
+    ('risk_reward_achieved', 'f8'),
+    ('duration_hours', 'f8'),
+    ('max_adverse_excursion', 'f8'),
+    ('max_favorable_excursion', 'f8'),
+])
+
+def _to_epoch_ns(values) -> Tuple[np.ndarray, Optional[str]]:
+    """Timestamps a enteros ns (NaT = iNaT) y su zona horaria"""
+    index = pd.DatetimeIndex(pd.to_datetime(list(values)))
+    return index.as_unit('ns').asi8, (str(index.tz) if index.tz else None)
+
+def _from_epoch_ns(values: np.ndarray, tz: Optional[str]) -> pd.DatetimeIndex:
+    """Inverso de _to_epoch_ns"""
+    index = pd.DatetimeIndex(np.asarray(values, dtype=np.int64).view('M8[ns]'))
+    return index.tz_localize('UTC').tz_convert(tz) if tz else index
+
+class TradeLedger:
+    """
+    Registro columnar de trades (array estructurado de NumPy)
+
+    Las métricas se calculan sobre columnas; los BacktestTrade solo se crean
+    al acceder a un trade concreto o al iterar (para la UI y los informes).
+    """
+
+    def __init__(self, data: Optional[np.ndarray] = None, entry_tz: Optional[str] = None,
+                 exit_tz: Optional[str] = None):
+        self.data = np.zeros(0, dtype=TRADE_DTYPE) if data is None else data
+        self.entry_tz = entry_tz
+        self.exit_tz = exit_tz
+
+    @classmethod
+    def from_trades(cls, trades: List[BacktestTrade]) -> 'TradeLedger':
+        """Construir el ledger a partir de BacktestTrade"""
+        data = np.zeros(len(trades), dtype=TRADE_DTYPE)
+        if not trades:
+            return cls(data)
+        data['entry_time'], entry_tz = _to_epoch_ns([t.entry_time for t in trades])
+        data['exit_time'], exit_tz = _to_epoch_ns([t.exit_time for t in trades])
+        data['result'] = [TRADE_RESULTS.index(t.result) for t in trades]
+        for name in TRADE_DTYPE.names:
+            if name not in ('entry_time', 'exit_time', 'result'):
+                data[name] = [getattr(t, name) for t in trades]
+        return cls(data, entry_tz, exit_tz)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return TradeLedger(self.data[item], self.entry_tz, self.exit_tz)
+        row = self.data[item]
+        entry_time = _from_epoch_ns([row['entry_time']], self.entry_tz)[0]
+        exit_time = _from_epoch_ns([row['exit_time']], self.exit_tz)[0]
+        return BacktestTrade(
+            entry_time=entry_time,
+            exit_time=None if pd.isna(exit_time) else exit_time,
+            signal_type=str(row['signal_type']),
+            entry_price=float(row['entry_price']),
+            exit_price=None if np.isnan(row['exit_price']) else float(row['exit_price']),
+            stop_loss=float(row['stop_loss']),
+            take_profit=float(row['take_profit']),
+            result=TRADE_RESULTS[row['result']],
+            pnl_points=float(row['pnl_points']),
+            pnl_percent=float(row['pnl_percent']),
+            risk_reward_achieved=float(row['risk_reward_achieved']),
+            duration_hours=float(row['duration_hours']),
+            max_adverse_excursion=float(row['max_adverse_excursion']),
+            max_favorable_excursion=float(row['max_favorable_excursion'])
+        )
+
+    def __iter__(self):
+        for i in range(len(self.data)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, list):
+            other = TradeLedger.from_trades(other)
+        if not isinstance(other, TradeLedger):
+            return NotImplemented
+        if (self.entry_tz, self.exit_tz) != (other.entry_tz, other.exit_tz) or len(self) != len(other):
+            return False
+        return all(np.array_equal(self.data[name], other.data[name], equal_nan=self.data[name].dtype.kind == 'f')
+                   for name in TRADE_DTYPE.names)
+
+    def __repr__(self) -> str:
+        return f"TradeLedger({len(self)} trades)"
+
+    @property
+    def entry_times(self) -> pd.DatetimeIndex:
+        return _from_epoch_ns(self.data['entry_time'], self.entry_tz)
+
+    @property
+    def exit_times(self) -> pd.DatetimeIndex:
+        return _from_epoch_ns(self.data['exit_time'], self.exit_tz)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Ledger como DataFrame (una fila por trade)"""
+        df = pd.DataFrame({name: self.data[name] for name in TRADE_DTYPE.names})
+        df['entry_time'] = self.entry_times
+        df['exit_time'] = self.exit_times
+        df['result'] = [result.value if result else None for result in np.array(TRADE_RESULTS)[df['result']]]
+        return df
+
+    def equity_curve(self, initial_capital: float, risk_per_trade: float) -> np.ndarray:
+        """
+        Capital tras cada trade arriesgando risk_per_trade % del capital vigente
+
+        Returns:
+            Array de len(self) + 1 valores, empezando por initial_capital
+        """
+        risk_points = np.abs(self.data['entry_price'] - self.data['stop_loss'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth = np.where(risk_points > 0,
+                              1 + (risk_per_trade / 100) * self.data['pnl_points'] / risk_points, 1.0)
+        return initial_capital * np.concatenate(([1.0], np.cumprod(growth)))
+
 @dataclass
 class BacktestResults:
     """Resultados completos del backtesting"""
-    trades: List[BacktestTrade] = field(default_factory=list)
+    trades: TradeLedger = field(default_factory=TradeLedger)
     total_trades: int = 0
     winning_trades: int = 0
     losing_trades: int = 0
@@ -65,6 +197,181 @@ class BacktestResults:
     final_capital: float = 0.0
     total_return: float = 0.0
     annualized_return: float = 0.0
+    equity_curve: Optional[pd.Series] = None  # Equity mark-to-market por vela
+
+def trade_excursions(is_long, entry_price, stop_loss, take_profit, max_high, min_low, searchable):
+    """
+    MAE/MFE en puntos a partir del máximo y mínimo de las velas del trade
+
+    En trades con SL/TP la excursión no puede pasar del nivel de salida: si el
+    precio lo hubiera cruzado, el trade se habría cerrado allí.
+
+    Returns:
+        (MAE, MFE); escalares o arrays según la entrada
+    """
+    adverse = np.where(is_long, entry_price - min_low, max_high - entry_price)
+    favorable = np.where(is_long, max_high - entry_price, entry_price - min_low)
+    adverse = np.where(searchable, np.minimum(adverse, np.abs(entry_price - stop_loss)), adverse)
+    favorable = np.where(searchable, np.minimum(favorable, np.abs(take_profit - entry_price)), favorable)
+    return np.maximum(adverse, 0.0), np.maximum(favorable, 0.0)
+
+# Memoria objetivo de cada array temporal (trades x velas) al resolver salidas por bloques
+WINDOW_CHUNK_BYTES = 16 * 1024 * 1024
+
+def window_chunk_rows(width: int, chunk_size: Optional[int] = None) -> int:
+    """Trades por bloque para ventanas de width velas (chunk_size fuerza un valor)"""
+    if chunk_size:
+        return chunk_size
+    return max(1, WINDOW_CHUNK_BYTES // (max(width, 1) * np.dtype(float).itemsize))
+
+@dataclass
+class MarketArrays:
+    """Columnas OHLC y timestamps como arrays NumPy, preparadas una vez por backtest"""
+    timestamps: pd.DatetimeIndex
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'MarketArrays':
+        """Convertir un DataFrame con columna timestamp"""
+        return cls(
+            timestamps=pd.DatetimeIndex(pd.to_datetime(df['timestamp'])),
+            high=df['high'].to_numpy(dtype=float),
+            low=df['low'].to_numpy(dtype=float),
+            close=df['close'].to_numpy(dtype=float)
+        )
+
+    def entry_index(self, signal_time) -> Optional[int]:
+        """Primera vela con timestamp >= signal_time, o None"""
+        signal_time = pd.to_datetime(signal_time)
+        if self.timestamps.is_monotonic_increasing:
+            idx = int(self.timestamps.searchsorted(signal_time, side='left'))
+            return idx if idx < len(self.timestamps) else None
+        # Timestamps desordenados: primera coincidencia en orden de filas
+        reached = np.asarray(self.timestamps >= signal_time)
+        return int(reached.argmax()) if reached.any() else None
+
+    def bars_per_hour(self, timeframe: Optional[str] = None) -> float:
+        """
+        Velas por hora según el timeframe, o inferidas del espaciado de los timestamps
+
+        Sin timeframe ni timestamps suficientes se asumen velas de 15m.
+        """
+        minutes = timeframe_to_minutes(timeframe) if timeframe else None
+        if not minutes:
+            steps = np.diff(self.timestamps.dropna().values) / np.timedelta64(1, 'm')
+            steps = steps[steps > 0]
+            minutes = float(np.median(steps)) if steps.size else 15
+        return 60 / minutes
+
+    def resolve_exits(self, entry_idx: np.ndarray, is_long: np.ndarray,
+                      stop_loss: np.ndarray, take_profit: np.ndarray,
+                      horizon: np.ndarray, chunk_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Resolver la salida por SL/TP de muchos trades a la vez
+
+        Cada trade mira las velas entry_idx + 1 .. entry_idx + horizon sobre una
+        vista 2-D (trades x velas) de high/low, procesada por bloques de trades
+        (por defecto, tantos como quepan en WINDOW_CHUNK_BYTES por array temporal).
+        Misma regla que first_exit: primera vela que toca, con prioridad al SL.
+
+        Returns:
+            (índice de salida o -1, True si la salida fue por stop loss)
+        """
+        count = len(entry_idx)
+        exit_idx = np.full(count, -1, dtype=np.int64)
+        stop_exit = np.zeros(count, dtype=bool)
+        width = int(horizon.max()) if count else 0
+        if width <= 0:
+            return exit_idx, stop_exit
+
+        # Relleno con NaN para que todas las ventanas tengan el mismo ancho
+        padding = np.full(width, np.nan)
+        high_windows = np.lib.stride_tricks.sliding_window_view(np.r_[self.high, padding], width)
+        low_windows = np.lib.stride_tricks.sliding_window_view(np.r_[self.low, padding], width)
+        columns = np.arange(width)
+        chunk_size = window_chunk_rows(width, chunk_size)
+
+        for begin in range(0, count, chunk_size):
+            chunk = slice(begin, begin + chunk_size)
+            rows = entry_idx[chunk] + 1
+            high = high_windows[rows]
+            low = low_windows[rows]
+            long_side = is_long[chunk, None]
+            sl = stop_loss[chunk, None]
+            tp = take_profit[chunk, None]
+
+            stop_hit = np.where(long_side, low <= sl, high >= sl)
+            target_hit = np.where(long_side, high >= tp, low <= tp)
+            hit = (stop_hit | target_hit) & (columns < horizon[chunk, None])
+
+            first = hit.argmax(axis=1)
+            found = hit[np.arange(len(first)), first]
+            exit_idx[chunk] = np.where(found, rows + first, -1)
+            stop_exit[chunk] = found & stop_hit[np.arange(len(first)), first]
+
+        return exit_idx, stop_exit
+
+    def window_extremes(self, entry_idx: np.ndarray, exit_idx: np.ndarray,
+                        chunk_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Máximo high y mínimo low de las velas entry_idx + 1 .. exit_idx de cada trade
+
+        Misma vista 2-D por bloques que resolve_exits.
+
+        Returns:
+            (máximos, mínimos); NaN si la ventana está vacía
+        """
+        count = len(entry_idx)
+        max_high = np.full(count, np.nan)
+        min_low = np.full(count, np.nan)
+        lengths = exit_idx - entry_idx
+        width = int(lengths.max()) if count else 0
+        if width <= 0:
+            return max_high, min_low
+
+        padding = np.full(width, np.nan)
+        high_windows = np.lib.stride_tricks.sliding_window_view(np.r_[self.high, padding], width)
+        low_windows = np.lib.stride_tricks.sliding_window_view(np.r_[self.low, padding], width)
+        columns = np.arange(width)
+        chunk_size = window_chunk_rows(width, chunk_size)
+
+        for begin in range(0, count, chunk_size):
+            chunk = slice(begin, begin + chunk_size)
+            rows = entry_idx[chunk] + 1
+            inside = columns < lengths[chunk, None]
+            with np.errstate(invalid='ignore'):
+                high = np.where(inside, high_windows[rows], -np.inf).max(axis=1)
+                low = np.where(inside, low_windows[rows], np.inf).min(axis=1)
+            max_high[chunk] = np.where(lengths[chunk] > 0, high, np.nan)
+            min_low[chunk] = np.where(lengths[chunk] > 0, low, np.nan)
+
+        return max_high, min_low
+
+    def first_exit(self, start: int, stop: int, stop_loss: float,
+                   take_profit: float, is_long: bool) -> Optional[Tuple[int, bool]]:
+        """
+        Primera vela de [start, stop) que toca el SL o el TP
+
+        Returns:
+            (índice, True si fue el stop loss) o None si no se toca ninguno
+        """
+        high = self.high[start:stop]
+        low = self.low[start:stop]
+        if is_long:
+            stop_hit = low <= stop_loss
+            target_hit = high >= take_profit
+        else:
+            stop_hit = high >= stop_loss
+            target_hit = low <= take_profit
+
+        # Si ambos se tocan en la misma vela, el stop loss tiene prioridad
+        hit = stop_hit | target_hit
+        if not hit.any():
+            return None
+        k = int(hit.argmax())
+        return start + k, bool(stop_hit[k])
 
 class SMCBacktester:
     """Simulador de backtesting para estrategias SMC"""
@@ -75,7 +382,9 @@ class SMCBacktester:
         self.results = BacktestResults()
 
     def run_backtest(self, df: pd.DataFrame, signals: List[Any],
-                    max_trade_duration: int = 48) -> BacktestResults:
+                    max_trade_duration: int = 48, timeframe: Optional[str] = None,
+                    batch: bool = True,
+                    validation_context: Optional['ValidationContext'] = None) -> BacktestResults:
         """
         Ejecutar backtesting completo
 
@@ -83,6 +392,11 @@ class SMCBacktester:
             df: DataFrame con datos OHLC
             signals: Lista de señales generadas por el motor de trading
             max_trade_duration: Máximo de horas por trade
+            timeframe: Timeframe de df ('15m', '1h'...); si no se indica se infiere de los timestamps
+            batch: Resolver las salidas de todas las señales en una sola pasada
+            validation_context: Rango y ATR con los que se validan los SL/TP (por
+                defecto los de df; walk-forward pasa los del histórico previo a
+                la prueba para no validar con velas futuras)
 
         Returns:
             Resultados completos del backtesting
@@ -97,11 +411,25 @@ class SMCBacktester:
             # Reset de resultados
             self.results = BacktestResults()
 
-            # Procesar cada señal
-            for i, signal in enumerate(signals):
-                trade = self._simulate_trade(df, signal, max_trade_duration)
-                if trade:
-                    self.results.trades.append(trade)
+            # Arrays OHLC/timestamps compartidos por todas las señales
+            market = MarketArrays.from_dataframe(df)
+
+            max_duration_candles = int(round(max_trade_duration * market.bars_per_hour(timeframe)))
+
+            if batch:
+                self.results.trades = self._simulate_trades_batch(df, signals, max_duration_candles, market,
+                                                                  validation_context)
+            else:
+                # Procesar cada señal
+                trades = []
+                for i, signal in enumerate(signals):
+                    trade = self._simulate_trade(df, signal, max_duration_candles, market, validation_context)
+                    if trade:
+                        trades.append(trade)
+                self.results.trades = TradeLedger.from_trades(trades)
+
+            # Equity vela a vela (incluye el PnL latente de los trades abiertos)
+            self.results.equity_curve = self._mark_to_market(market)
 
             # Calcular métricas
             self._calculate_metrics()
@@ -113,127 +441,310 @@ class SMCBacktester:
             print(f"❌ Error en backtesting: {e}")
             return BacktestResults()
 
-    def _simulate_trade(self, df: pd.DataFrame, signal: Any,
-                       max_duration: int) -> Optional[BacktestTrade]:
-        """Simular ejecución de un trade individual"""
-        try:
-            # Encontrar índice de entrada
-            signal_time = signal.timestamp
-            entry_idx = None
+    def _simulate_trade(self, df: pd.DataFrame, signal: Any, max_duration_candles: int,
+                       market: Optional[MarketArrays] = None,
+                       validation_context: Optional['ValidationContext'] = None) -> Optional[BacktestTrade]:
+        """
+        Simular ejecución de un trade individual
 
-            # Buscar la vela correspondiente al timestamp de la señal usando la columna timestamp
-            for idx, timestamp in enumerate(df['timestamp']):
-                if pd.to_datetime(timestamp) >= pd.to_datetime(signal_time):
-                    entry_idx = idx
-                    break
+        Args:
+            df: DataFrame con datos OHLC y columna timestamp
+            signal: Señal de trading
+            max_duration_candles: Máximo de velas por trade
+            market: Arrays de df ya preparados (run_backtest los reutiliza entre señales)
+            validation_context: Rango y ATR para validar SL/TP (por defecto los de df)
 
-            if entry_idx is None or entry_idx >= len(df) - 1:
+        Returns:
+            Trade simulado o None
+        """
+        try:
+            if market is None:
+                market = MarketArrays.from_dataframe(df)
+
+            opened = self._open_trade(df, signal, market, context=validation_context)
+            if opened is None:
                 return None
+            trade, entry_idx = opened
+
+            # Simular evolución del trade
+            horizon = min(max_duration_candles, len(df) - entry_idx - 1)
+
+            # Verificar SL/TP según tipo de trade sobre toda la ventana a la vez
+            exit_hit = None
+            if trade.signal_type in ("LONG", "SHORT"):
+                exit_hit = market.first_exit(entry_idx + 1, entry_idx + horizon + 1,
+                                             trade.stop_loss, trade.take_profit,
+                                             trade.signal_type == "LONG")
+
+            return self._close_trade(df, trade, market, entry_idx, horizon, exit_hit)
+
+        except Exception as e:
+            print(f"Error simulando trade: {e}")
+            return None
+
+    def _simulate_trades_batch(self, df: pd.DataFrame, signals: List[Any],
+                               max_duration_candles: int, market: MarketArrays,
+                               validation_context: Optional['ValidationContext'] = None) -> TradeLedger:
+        """
+        Simular todas las señales a la vez (mismo resultado que _simulate_trade una a una)
+
+        Las salidas, resultados y métricas por trade se calculan por columnas y se
+        escriben directamente en el ledger, sin crear un BacktestTrade por trade.
+
+        Args:
+            df: DataFrame con datos OHLC y columna timestamp
+            signals: Lista de señales
+            max_duration_candles: Máximo de velas por trade
+            market: Arrays de df
+            validation_context: Rango y ATR para validar SL/TP (por defecto los de df)
+
+        Returns:
+            Ledger con los trades simulados, en el orden de las señales
+        """
+        # Validar SL/TP de todas las señales con vela de entrada en una sola pasada
+        candidates = []
+        for signal in signals:
+            try:
+                entry_idx = market.entry_index(signal.timestamp)
+                if entry_idx is None or entry_idx >= len(df) - 1:
+                    continue
+                levels = (float(signal.entry_price), float(signal.stop_loss),
+                          float(signal.take_profit), signal.signal_type.value)
+                candidates.append((signal, levels))
+            except Exception as e:
+                print(f"Error simulando trade: {e}")
+
+        if not candidates:
+            return TradeLedger()
+
+        entry_price, stop_loss, take_profit, sides = zip(*(levels for _, levels in candidates))
+        context = validation_context or ValidationContext.from_dataframe(df)
+        validation = validate_sl_tp_levels_batch(context, entry_price, stop_loss, take_profit, sides)
+
+        opened = []
+        for k, (signal, _) in enumerate(candidates):
+            try:
+                trade_entry = self._open_trade(df, signal, market, validation.report(k))
+                if trade_entry is not None:
+                    trade, _ = trade_entry
+                    levels = np.asarray([trade.stop_loss, trade.take_profit], dtype=float)
+                    if not np.isfinite(levels).all():
+                        raise ValueError(f"Niveles SL/TP no numéricos: {trade.stop_loss}, {trade.take_profit}")
+                    opened.append(trade_entry)
+            except Exception as e:
+                print(f"Error simulando trade: {e}")
+
+        if not opened:
+            return TradeLedger()
+
+        ledger = TradeLedger(np.zeros(len(opened), dtype=TRADE_DTYPE))
+        data = ledger.data
+        data['entry_time'], ledger.entry_tz = _to_epoch_ns([trade.entry_time for trade, _ in opened])
+        data['signal_type'] = [trade.signal_type for trade, _ in opened]
+        data['entry_price'] = [trade.entry_price for trade, _ in opened]
+        data['stop_loss'] = [trade.stop_loss for trade, _ in opened]
+        data['take_profit'] = [trade.take_profit for trade, _ in opened]
+        entry_idx = np.array([entry for _, entry in opened], dtype=np.int64)
+        del opened
+
+        # Señales como arrays: vela de entrada, lado, SL, TP y horizonte
+        sides = data['signal_type']
+        is_long = sides == "LONG"
+        horizon = np.minimum(max_duration_candles, len(df) - entry_idx - 1)
+
+        # Solo LONG/SHORT buscan SL/TP; el resto cierra a mercado
+        searchable = is_long | (sides == "SHORT")
+        exit_idx, stop_exit = market.resolve_exits(entry_idx, is_long, data['stop_loss'], data['take_profit'],
+                                                   np.where(searchable, horizon, 0))
+
+        # Sin SL/TP: cierre a mercado al final del horizonte (al menos 1 vela después del entry)
+        hit = exit_idx >= 0
+        final_idx = np.minimum(entry_idx + horizon, len(df) - 1)
+        final_idx = np.where(final_idx <= entry_idx, np.minimum(entry_idx + 1, len(df) - 1), final_idx)
+        final_idx = np.where(hit, exit_idx, final_idx)
+
+        data['exit_time'], ledger.exit_tz = _to_epoch_ns(market.timestamps[final_idx])
+        data['exit_price'] = np.where(hit, np.where(stop_exit, data['stop_loss'], data['take_profit']),
+                                      market.close[final_idx])
+
+        # Resultado: SL/TP tocado, o según el PnL del cierre a mercado
+        entry_price, exit_price = data['entry_price'], data['exit_price']
+        pnl_points = np.where(is_long, exit_price - entry_price, entry_price - exit_price)
+        data['result'] = np.select(
+            [hit & stop_exit, hit, pnl_points > 0, pnl_points < 0],
+            [TRADE_RESULTS.index(TradeResult.LOSS), TRADE_RESULTS.index(TradeResult.WIN),
+             TRADE_RESULTS.index(TradeResult.WIN), TRADE_RESULTS.index(TradeResult.LOSS)],
+            TRADE_RESULTS.index(TradeResult.BREAKEVEN)
+        )
+
+        # Métricas por trade (igual que _calculate_trade_metrics)
+        data['pnl_points'] = pnl_points
+        data['pnl_percent'] = (pnl_points / entry_price) * 100
+        risk_points = np.abs(entry_price - data['stop_loss'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            data['risk_reward_achieved'] = np.where(risk_points > 0, np.abs(pnl_points) / risk_points, 0.0)
+        duration_ns = data['exit_time'] - data['entry_time']
+        data['duration_hours'] = np.where(duration_ns > 0, duration_ns / 3.6e12, 0.0)
+
+        # MAE/MFE sobre las velas entre la entrada y la salida
+        max_high, min_low = market.window_extremes(entry_idx, final_idx)
+        data['max_adverse_excursion'], data['max_favorable_excursion'] = trade_excursions(
+            is_long, entry_price, data['stop_loss'], data['take_profit'], max_high, min_low, searchable)
+
+        return ledger
+
+    def _open_trade(self, df: pd.DataFrame, signal: Any, market: MarketArrays,
+                    validation: Optional['ValidationReport'] = None,
+                    context: Optional['ValidationContext'] = None) -> Optional[Tuple[BacktestTrade, int]]:
+        """
+        Localizar la vela de entrada, validar SL/TP y crear el trade
+
+        Args:
+            validation: Validación ya calculada en lote (si no, se valida la señal sola)
+            context: Rango y ATR para validar la señal sola (por defecto los de df)
+
+        Returns:
+            (trade abierto, índice de la vela de entrada) o None si no hay vela posterior
+        """
+        # Buscar la vela correspondiente al timestamp de la señal usando la columna timestamp
+        signal_time = signal.timestamp
+        entry_idx = market.entry_index(signal_time)
 
-            # Validar niveles de SL/TP antes de ejecutar el trade
+        if entry_idx is None or entry_idx >= len(df) - 1:
+            return None
+
+        # Validar niveles de SL/TP antes de ejecutar el trade
+        if validation is None:
             validation = validate_sl_tp_levels(
                 df, signal.entry_price, signal.stop_loss,
-                signal.take_profit, signal.signal_type.value
+                signal.take_profit, signal.signal_type.value, context=context
             )
 
-            if validation.result != LevelValidationResult.VALID:
-                print(f"⚠️ Validación SL/TP: {validation.message}")
-                for suggestion in validation.suggestions:
-                    print(f"   💡 {suggestion}")
-
-                # Opcional: usar niveles recomendados si están disponibles
-                if validation.recommended_sl and validation.recommended_tp:
-                    print(f"   🔧 Usando niveles recomendados: SL=${validation.recommended_sl:.2f}, TP=${validation.recommended_tp:.2f}")
-                    signal.stop_loss = validation.recommended_sl
-                    signal.take_profit = validation.recommended_tp
-
-            # Crear trade inicial
-            trade = BacktestTrade(
-                entry_time=signal_time,
-                exit_time=None,
-                signal_type=signal.signal_type.value,
-                entry_price=signal.entry_price,
-                exit_price=None,
-                stop_loss=signal.stop_loss,
-                take_profit=signal.take_profit,
-                result=None
-            )
+        if validation.result != LevelValidationResult.VALID:
+            print(f"⚠️ Validación SL/TP: {validation.message}")
+            for suggestion in validation.suggestions:
+                print(f"   💡 {suggestion}")
+
+            # Opcional: usar niveles recomendados si están disponibles
+            if validation.recommended_sl and validation.recommended_tp:
+                print(f"   🔧 Usando niveles recomendados: SL=${validation.recommended_sl:.2f}, TP=${validation.recommended_tp:.2f}")
+                signal.stop_loss = validation.recommended_sl
+                signal.take_profit = validation.recommended_tp
+
+        # Crear trade inicial
+        trade = BacktestTrade(
+            entry_time=signal_time,
+            exit_time=None,
+            signal_type=signal.signal_type.value,
+            entry_price=signal.entry_price,
+            exit_price=None,
+            stop_loss=signal.stop_loss,
+            take_profit=signal.take_profit,
+            result=None
+        )
+        return trade, entry_idx
 
-            # Simular evolución del trade
-            max_duration_candles = min(max_duration * 4, len(df) - entry_idx - 1)  # 4 velas por hora para 15m
-
-            for i in range(1, max_duration_candles + 1):
-                if entry_idx + i >= len(df):
-                    break
-
-                current_candle = df.iloc[entry_idx + i]
-                current_time = df['timestamp'].iloc[entry_idx + i]  # Usar columna timestamp
-
-                # Verificar SL/TP según tipo de trade
-                if signal.signal_type.value == "LONG":
-                    # Trade LONG
-                    if current_candle['low'] <= trade.stop_loss:
-                        # Hit Stop Loss
-                        trade.exit_time = current_time
-                        trade.exit_price = trade.stop_loss
-                        trade.result = TradeResult.LOSS
-                        break
-                    elif current_candle['high'] >= trade.take_profit:
-                        # Hit Take Profit
-                        trade.exit_time = current_time
-                        trade.exit_price = trade.take_profit
-                        trade.result = TradeResult.WIN
-                        break
-
-                elif signal.signal_type.value == "SHORT":
-                    # Trade SHORT
-                    if current_candle['high'] >= trade.stop_loss:
-                        # Hit Stop Loss
-                        trade.exit_time = current_time
-                        trade.exit_price = trade.stop_loss
-                        trade.result = TradeResult.LOSS
-                        break
-                    elif current_candle['low'] <= trade.take_profit:
-                        # Hit Take Profit
-                        trade.exit_time = current_time
-                        trade.exit_price = trade.take_profit
-                        trade.result = TradeResult.WIN
-                        break
-
-            # Si no se cerró el trade, cerrarlo al precio de mercado
-            if trade.exit_time is None:
-                final_idx = min(entry_idx + max_duration_candles, len(df) - 1)
-                # Asegurar que final_idx sea al menos 1 vela después del entry
-                if final_idx <= entry_idx:
-                    final_idx = min(entry_idx + 1, len(df) - 1)
-
-                trade.exit_time = df['timestamp'].iloc[final_idx]
-                trade.exit_price = df.iloc[final_idx]['close']
-
-                # Determinar resultado basado en PnL
-                if signal.signal_type.value == "LONG":
-                    if trade.exit_price > trade.entry_price:
-                        trade.result = TradeResult.WIN
-                    elif trade.exit_price < trade.entry_price:
-                        trade.result = TradeResult.LOSS
-                    else:
-                        trade.result = TradeResult.BREAKEVEN
-                else:  # SHORT
-                    if trade.exit_price < trade.entry_price:
-                        trade.result = TradeResult.WIN
-                    elif trade.exit_price > trade.entry_price:
-                        trade.result = TradeResult.LOSS
-                    else:
-                        trade.result = TradeResult.BREAKEVEN
+    def _close_trade(self, df: pd.DataFrame, trade: BacktestTrade, market: MarketArrays,
+                     entry_idx: int, horizon: int,
+                     exit_hit: Optional[Tuple[int, bool]]) -> BacktestTrade:
+        """
+        Cerrar el trade en la vela de SL/TP o, si no se tocó, a mercado al final del horizonte
 
-            # Calcular métricas del trade
-            self._calculate_trade_metrics(trade)
+        Args:
+            exit_hit: (índice de salida, True si fue el stop loss) o None
+        """
+        if exit_hit is not None:
+            exit_idx, stop_hit = exit_hit
+            trade.exit_time = df['timestamp'].iloc[exit_idx]  # Usar columna timestamp
+            if stop_hit:
+                # Hit Stop Loss
+                trade.exit_price = trade.stop_loss
+                trade.result = TradeResult.LOSS
+            else:
+                # Hit Take Profit
+                trade.exit_price = trade.take_profit
+                trade.result = TradeResult.WIN
 
-            return trade
+        # Si no se cerró el trade, cerrarlo al precio de mercado
+        if trade.exit_time is None:
+            final_idx = min(entry_idx + horizon, len(df) - 1)
+            # Asegurar que final_idx sea al menos 1 vela después del entry
+            if final_idx <= entry_idx:
+                final_idx = min(entry_idx + 1, len(df) - 1)
 
-        except Exception as e:
-            print(f"Error simulando trade: {e}")
+            trade.exit_time = df['timestamp'].iloc[final_idx]
+            trade.exit_price = market.close[final_idx]
+
+            # Determinar resultado basado en PnL
+            if trade.signal_type == "LONG":
+                if trade.exit_price > trade.entry_price:
+                    trade.result = TradeResult.WIN
+                elif trade.exit_price < trade.entry_price:
+                    trade.result = TradeResult.LOSS
+                else:
+                    trade.result = TradeResult.BREAKEVEN
+            else:  # SHORT
+                if trade.exit_price < trade.entry_price:
+                    trade.result = TradeResult.WIN
+                elif trade.exit_price > trade.entry_price:
+                    trade.result = TradeResult.LOSS
+                else:
+                    trade.result = TradeResult.BREAKEVEN
+
+        # MAE/MFE sobre las velas entre la entrada y la salida
+        last_idx = exit_hit[0] if exit_hit is not None else final_idx
+        mae, mfe = trade_excursions(
+            trade.signal_type == "LONG", trade.entry_price, trade.stop_loss, trade.take_profit,
+            market.high[entry_idx + 1:last_idx + 1].max(), market.low[entry_idx + 1:last_idx + 1].min(),
+            trade.signal_type in ("LONG", "SHORT"))
+        trade.max_adverse_excursion, trade.max_favorable_excursion = float(mae), float(mfe)
+
+        # Calcular métricas del trade
+        self._calculate_trade_metrics(trade)
+
+        return trade
+
+    def _mark_to_market(self, market: MarketArrays) -> Optional[pd.Series]:
+        """
+        Equity a resolución de vela: capital inicial + PnL realizado + PnL latente
+
+        Cada trade abre una posición de (capital antes del trade * riesgo / distancia
+        al SL) unidades, igual que la curva de capital por trades. Posición,
+        coste de entrada y PnL realizado se acumulan con sumas acumuladas sobre
+        las velas de entrada/salida, sin recorrer vela a vela.
+
+        Returns:
+            Serie de equity indexada por timestamp, o None si los timestamps no están ordenados
+        """
+        n = len(market.close)
+        if not market.timestamps.is_monotonic_increasing:
             return None
+        equity = np.full(n, float(self.initial_capital))
+        trades = self.results.trades
+        if not trades or n == 0:
+            return pd.Series(equity, index=market.timestamps, name='equity')
+
+        data = trades.data
+        entry_idx = market.timestamps.searchsorted(trades.entry_times, side='left')
+        exit_idx = market.timestamps.searchsorted(trades.exit_times, side='left')
+
+        # Unidades con signo de cada trade según el capital antes de abrirlo
+        capital_before = trades.equity_curve(self.initial_capital, self.risk_per_trade)[:-1]
+        risk_points = np.abs(data['entry_price'] - data['stop_loss'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            size = np.where(risk_points > 0, capital_before * (self.risk_per_trade / 100) / risk_points, 0.0)
+        units = np.where(data['signal_type'] == "LONG", size, -size)
+
+        def running_sum(index: np.ndarray, weights: np.ndarray) -> np.ndarray:
+            return np.cumsum(np.bincount(index, weights, minlength=n + 1)[:n])
+
+        # Posición abierta en [entrada, salida) y PnL realizado desde la salida
+        position = running_sum(entry_idx, units) - running_sum(exit_idx, units)
+        cost = running_sum(entry_idx, units * data['entry_price']) - running_sum(exit_idx, units * data['entry_price'])
+        realized = running_sum(exit_idx, data['pnl_points'] * size)
+
+        equity += realized + position * market.close - cost
+        return pd.Series(equity, index=market.timestamps, name='equity')
 
     def _calculate_trade_metrics(self, trade: BacktestTrade):
         """Calcular métricas individuales del trade"""
@@ -275,113 +786,95 @@ class SMCBacktester:
             print(f"Error calculando métricas de trade: {e}")
 
     def _calculate_metrics(self):
-        """Calcular métricas generales del backtesting"""
+        """Calcular métricas generales del backtesting sobre las columnas del ledger"""
         try:
             trades = self.results.trades
             if not trades:
                 return
 
+            data = trades.data
+            pnl = data['pnl_points']
+            wins = data['result'] == TRADE_RESULTS.index(TradeResult.WIN)
+            losses = data['result'] == TRADE_RESULTS.index(TradeResult.LOSS)
+            breakevens = data['result'] == TRADE_RESULTS.index(TradeResult.BREAKEVEN)
+
             # Contadores básicos
             self.results.total_trades = len(trades)
-            self.results.winning_trades = sum(1 for t in trades if t.result == TradeResult.WIN)
-            self.results.losing_trades = sum(1 for t in trades if t.result == TradeResult.LOSS)
-            self.results.breakeven_trades = sum(1 for t in trades if t.result == TradeResult.BREAKEVEN)
+            self.results.winning_trades = int(wins.sum())
+            self.results.losing_trades = int(losses.sum())
+            self.results.breakeven_trades = int(breakevens.sum())
 
             # Win rate
-            if self.results.total_trades > 0:
-                self.results.win_rate = (self.results.winning_trades / self.results.total_trades) * 100
+            self.results.win_rate = (self.results.winning_trades / self.results.total_trades) * 100
 
             # PnL total
-            total_pnl_points = sum(t.pnl_points for t in trades)
-            self.results.total_pnl = total_pnl_points
-            self.results.total_pnl_percent = sum(t.pnl_percent for t in trades)
+            self.results.total_pnl = float(pnl.sum())
+            self.results.total_pnl_percent = float(data['pnl_percent'].sum())
 
             # Ganancias y pérdidas promedio
-            winning_trades = [t for t in trades if t.result == TradeResult.WIN]
-            losing_trades = [t for t in trades if t.result == TradeResult.LOSS]
-
-            if winning_trades:
-                self.results.average_win = np.mean([t.pnl_points for t in winning_trades])
-                self.results.largest_win = max(t.pnl_points for t in winning_trades)
+            if wins.any():
+                self.results.average_win = float(pnl[wins].mean())
+                self.results.largest_win = float(pnl[wins].max())
 
-            if losing_trades:
-                self.results.average_loss = np.mean([t.pnl_points for t in losing_trades])
-                self.results.largest_loss = min(t.pnl_points for t in losing_trades)
+            if losses.any():
+                self.results.average_loss = float(pnl[losses].mean())
+                self.results.largest_loss = float(pnl[losses].min())
 
             # Profit Factor
-            total_wins = sum(t.pnl_points for t in winning_trades) if winning_trades else 0
-            total_losses = abs(sum(t.pnl_points for t in losing_trades)) if losing_trades else 0
+            total_wins = float(pnl[wins].sum())
+            total_losses = abs(float(pnl[losses].sum()))
 
             if total_losses > 0:
                 self.results.profit_factor = total_wins / total_losses
 
             # Expectancy
-            if self.results.total_trades > 0:
-                self.results.expectancy = sum(t.pnl_points for t in trades) / self.results.total_trades
+            self.results.expectancy = self.results.total_pnl / self.results.total_trades
 
             # Duración promedio
-            durations = [t.duration_hours for t in trades if t.duration_hours > 0]
-            if durations:
-                self.results.average_trade_duration = np.mean(durations)
+            durations = data['duration_hours'][data['duration_hours'] > 0]
+            if durations.size:
+                self.results.average_trade_duration = float(durations.mean())
+
+            # Curva de capital compartida por drawdown y retornos
+            capital_curve = trades.equity_curve(self.initial_capital, self.risk_per_trade)
 
             # Drawdown máximo
-            self._calculate_drawdown()
+            self._calculate_drawdown(capital_curve)
 
-            # Calcular capital final y retornos
-            self._calculate_capital_metrics()
+            # Calcular capital final, retornos, Sharpe y Calmar
+            self._calculate_capital_metrics(capital_curve)
 
         except Exception as e:
             print(f"Error calculando métricas: {e}")
 
-    def _calculate_drawdown(self):
-        """Calcular drawdown máximo"""
+    def _calculate_drawdown(self, capital_curve: Optional[np.ndarray] = None):
+        """Calcular drawdown máximo sobre la equity por vela (o la curva de capital por trades)"""
         try:
             trades = self.results.trades
             if not trades:
                 return
 
-            # Crear curva de capital
-            capital_curve = [self.initial_capital]
-            current_capital = self.initial_capital
-
-            for trade in trades:
-                # Calcular tamaño de posición basado en riesgo
-                risk_amount = current_capital * (self.risk_per_trade / 100)
-                risk_points = abs(trade.entry_price - trade.stop_loss)
-
-                if risk_points > 0:
-                    position_size = risk_amount / risk_points
-                    trade_pnl = trade.pnl_points * position_size
-                    current_capital += trade_pnl
-
-                capital_curve.append(current_capital)
-
-            # Calcular drawdown
-            peak = capital_curve[0]
-            max_dd = 0
-            max_dd_percent = 0
+            if capital_curve is None:
+                capital_curve = trades.equity_curve(self.initial_capital, self.risk_per_trade)
 
-            for capital in capital_curve:
-                if capital > peak:
-                    peak = capital
+            # Con equity por vela se incluye el drawdown dentro de los trades
+            if self.results.equity_curve is not None:
+                capital_curve = np.r_[self.initial_capital, self.results.equity_curve.to_numpy()]
 
-                drawdown = peak - capital
-                drawdown_percent = (drawdown / peak) * 100 if peak > 0 else 0
+            # Drawdown respecto al máximo acumulado
+            peak = np.maximum.accumulate(capital_curve)
+            drawdown = peak - capital_curve
+            with np.errstate(divide='ignore', invalid='ignore'):
+                drawdown_percent = np.where(peak > 0, drawdown / peak * 100, 0.0)
 
-                if drawdown > max_dd:
-                    max_dd = drawdown
-
-                if drawdown_percent > max_dd_percent:
-                    max_dd_percent = drawdown_percent
-
-            self.results.max_drawdown = max_dd
-            self.results.max_drawdown_percent = max_dd_percent
+            self.results.max_drawdown = float(drawdown.max())
+            self.results.max_drawdown_percent = float(drawdown_percent.max())
 
         except Exception as e:
             print(f"Error calculando drawdown: {e}")
 
-    def _calculate_capital_metrics(self):
-        """Calcular métricas de capital final y retornos"""
+    def _calculate_capital_metrics(self, capital_curve: Optional[np.ndarray] = None):
+        """Calcular capital final, retornos, Sharpe y Calmar"""
         try:
             trades = self.results.trades
             if not trades:
@@ -390,65 +883,35 @@ class SMCBacktester:
                 self.results.annualized_return = 0.0
                 return
 
-            # Calcular capital final
-            current_capital = self.initial_capital
+            if capital_curve is None:
+                capital_curve = trades.equity_curve(self.initial_capital, self.risk_per_trade)
 
-            for trade in trades:
-                # Calcular tamaño de posición basado en riesgo
-                risk_amount = current_capital * (self.risk_per_trade / 100)
-                risk_points = abs(trade.entry_price - trade.stop_loss)
+            # Capital final y retorno total
+            current_capital = float(capital_curve[-1])
+            self.results.final_capital = current_capital
+            self.results.total_return = ((current_capital - self.initial_capital) / self.initial_capital) * 100
 
-                if risk_points > 0:
-                    position_size = risk_amount / risk_points
-                    trade_pnl = trade.pnl_points * position_size
-                    current_capital += trade_pnl
+            # Duración total del backtest: primera entrada -> última salida (en días completos)
+            exit_times = trades.data['exit_time'][trades.data['exit_time'] != pd.NaT.value]
+            years = 0.0
+            if exit_times.size:
+                total_days = (int(exit_times.max()) - int(trades.data['entry_time'].min())) // (86400 * 10**9)
+                years = total_days / 365.25 if total_days > 0 else 0.0
 
-            self.results.final_capital = current_capital
+            if years > 0:
+                self.results.annualized_return = (((current_capital / self.initial_capital) ** (1/years)) - 1) * 100
 
-            # Calcular retorno total
-            self.results.total_return = ((current_capital - self.initial_capital) / self.initial_capital) * 100
+            # Sharpe sobre el retorno de cada trade (anualizado con los trades por año)
+            returns = np.diff(capital_curve) / capital_curve[:-1]
+            if returns.size > 1 and returns.std(ddof=1) > 0:
+                sharpe = returns.mean() / returns.std(ddof=1)
+                if years > 0:
+                    sharpe *= np.sqrt(len(returns) / years)
+                self.results.sharpe_ratio = float(sharpe)
 
-            # Calcular retorno anualizado
-            if trades:
-                # Calcular duración total del backtest
-                entry_times = []
-                exit_times = []
-
-                for trade in trades:
-                    # Convertir entry_time
-                    if isinstance(trade.entry_time, str):
-                        entry_time = pd.to_datetime(trade.entry_time)
-                    elif hasattr(trade.entry_time, 'to_pydatetime'):
-                        entry_time = trade.entry_time.to_pydatetime()
-                    else:
-                        entry_time = pd.to_datetime(trade.entry_time)
-                    entry_times.append(entry_time)
-
-                    # Convertir exit_time si existe
-                    if trade.exit_time:
-                        if isinstance(trade.exit_time, str):
-                            exit_time = pd.to_datetime(trade.exit_time)
-                        elif hasattr(trade.exit_time, 'to_pydatetime'):
-                            exit_time = trade.exit_time.to_pydatetime()
-                        else:
-                            exit_time = pd.to_datetime(trade.exit_time)
-                        exit_times.append(exit_time)
-
-                if entry_times and exit_times:
-                    start_date = min(entry_times)
-                    end_date = max(exit_times)
-
-                    # Asegurar que ambas fechas son datetime
-                    if hasattr(start_date, 'to_pydatetime'):
-                        start_date = start_date.to_pydatetime()
-                    if hasattr(end_date, 'to_pydatetime'):
-                        end_date = end_date.to_pydatetime()
-
-                    total_days = (end_date - start_date).days
-                    if total_days > 0:
-                        years = total_days / 365.25
-                        if years > 0:
-                            self.results.annualized_return = (((current_capital / self.initial_capital) ** (1/years)) - 1) * 100
+            # Calmar: retorno anualizado / drawdown máximo
+            if self.results.max_drawdown_percent > 0:
+                self.results.calmar_ratio = self.results.annualized_return / self.results.max_drawdown_percent
 
         except Exception as e:
             print(f"Error calculando métricas de capital: {e}")
@@ -463,14 +926,10 @@ class SMCBacktester:
                 return go.Figure()
 
             # Preparar datos para el gráfico
-            dates = []
-            cumulative_pnl = []
-            cumulative = 0
-
-            for trade in self.results.trades:
-                dates.append(trade.exit_time)
-                cumulative += trade.pnl_points
-                cumulative_pnl.append(cumulative)
+            trades = self.results.trades
+            dates = trades.exit_times
+            pnl_values = trades.data['pnl_points']
+            cumulative_pnl = np.cumsum(pnl_values)
 
             # Crear subplot con múltiples métricas
             fig = make_subplots(
@@ -489,7 +948,6 @@ class SMCBacktester:
             )
 
             # 2. Histograma de resultados
-            pnl_values = [t.pnl_points for t in self.results.trades]
             fig.add_trace(
                 go.Histogram(x=pnl_values, name='Distribución PnL',
                            marker_color='lightblue'),
@@ -497,8 +955,8 @@ class SMCBacktester:
             )
 
             # 3. Duración vs PnL
-            durations = [t.duration_hours for t in self.results.trades]
-            colors = ['green' if p > 0 else 'red' for p in pnl_values]
+            durations = trades.data['duration_hours']
+            colors = np.where(pnl_values > 0, 'green', 'red')
 
             fig.add_trace(
                 go.Scatter(x=durations, y=pnl_values, mode='markers',
@@ -506,23 +964,16 @@ class SMCBacktester:
                 row=2, col=1
             )
 
-            # 4. Curva de capital (para drawdown)
-            capital_curve = [self.initial_capital]
-            current_capital = self.initial_capital
-
-            for trade in self.results.trades:
-                risk_amount = current_capital * (self.risk_per_trade / 100)
-                risk_points = abs(trade.entry_price - trade.stop_loss)
-
-                if risk_points > 0:
-                    position_size = risk_amount / risk_points
-                    trade_pnl = trade.pnl_points * position_size
-                    current_capital += trade_pnl
-
-                capital_curve.append(current_capital)
+            # 4. Curva de capital (para drawdown): por vela si está disponible
+            if self.results.equity_curve is not None:
+                capital_x = self.results.equity_curve.index
+                capital_curve = self.results.equity_curve.to_numpy()
+            else:
+                capital_curve = trades.equity_curve(self.initial_capital, self.risk_per_trade)
+                capital_x = list(range(len(capital_curve)))
 
             fig.add_trace(
-                go.Scatter(x=list(range(len(capital_curve))), y=capital_curve,
+                go.Scatter(x=capital_x, y=capital_curve,
                           mode='lines', name='Capital', line=dict(color='blue')),
                 row=2, col=2
             )
@@ -566,6 +1017,8 @@ class SMCBacktester:
 - **Profit Factor:** {results.profit_factor:.2f}
 - **Expectancy:** {results.expectancy:.2f} puntos por trade
 - **Drawdown Máximo:** {results.max_drawdown:.2f} ({results.max_drawdown_percent:.1f}%)
+- **Sharpe Ratio:** {results.sharpe_ratio:.2f}
+- **Calmar Ratio:** {results.calmar_ratio:.2f}
 - **Duración Promedio:** {results.average_trade_duration:.1f} horas
 
 ## 🎯 Evaluación de Estrategia
@@ -601,7 +1054,8 @@ class SMCBacktester:
 # Función de utilidad para integración
 def run_backtest_analysis(df: pd.DataFrame, signals: List[Any],
                          initial_capital: float = 10000,
-                         risk_per_trade: float = 1.0) -> Dict[str, Any]:
+                         risk_per_trade: float = 1.0,
+                         timeframe: Optional[str] = None) -> Dict[str, Any]:
     """
     Función principal para ejecutar análisis de backtesting
 
@@ -610,13 +1064,14 @@ def run_backtest_analysis(df: pd.DataFrame, signals: List[Any],
         signals: Lista de señales del motor de trading
         initial_capital: Capital inicial
         risk_per_trade: Riesgo por trade (%)
+        timeframe: Timeframe de df ('15m', '1h'...); si no se indica se infiere de los timestamps
 
     Returns:
         Diccionario con resultados de backtesting
     """
     try:
         backtester = SMCBacktester(initial_capital, risk_per_trade)
-        results = backtester.run_backtest(df, signals)
+        results = backtester.run_backtest(df, signals, timeframe=timeframe)
         chart = backtester.create_performance_chart()
         report = backtester.generate_report()
 
@@ -637,13 +1092,226 @@ def run_backtest_analysis(df: pd.DataFrame, signals: List[Any],
             'success': False
         }
 
+# ==================== WALK-FORWARD ====================
+
+@dataclass
+class WalkForwardFold:
+    """Fold de walk-forward: posiciones [train_start, test_start) y [test_start, test_end)"""
+    fold: int
+    train_start: int
+    test_start: int
+    test_end: int
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    signals: List[Any] = field(default_factory=list)
+    results: BacktestResults = field(default_factory=BacktestResults)
+
+def walk_forward_folds(n_candles: int, train_size: int, test_size: int,
+                       step: Optional[int] = None) -> List[WalkForwardFold]:
+    """
+    Ventanas móviles de entrenamiento/prueba
+
+    Args:
+        n_candles: Número total de velas
+        train_size: Velas de histórico previas a cada ventana de prueba
+        test_size: Velas de cada ventana de prueba (fuera de muestra)
+        step: Desplazamiento entre folds (por defecto test_size: pruebas consecutivas)
+
+    Returns:
+        Lista de folds en orden temporal
+    """
+    step = step or test_size
+    if train_size <= 0 or test_size <= 0 or step <= 0:
+        raise ValueError("train_size, test_size y step deben ser positivos")
+
+    folds = []
+    for train_start in range(0, n_candles - train_size - test_size + 1, step):
+        test_start = train_start + train_size
+        folds.append(WalkForwardFold(len(folds), train_start, test_start, test_start + test_size))
+    return folds
+
+def to_backtest_signal(signal: Any, timestamp: Any = None, entry_price: Optional[float] = None) -> Any:
+    """
+    Adaptar una TradingSignal de SMCBot (BUY/SELL) al formato del backtester (LONG/SHORT)
+
+    Args:
+        signal: Señal del bot
+        timestamp: Momento de entrada (por defecto el de la señal)
+        entry_price: Precio de entrada (por defecto el de la señal); al entrar
+            en una vela posterior se usa su apertura, no el cierre de la vela
+            que originó la señal
+    """
+    from types import SimpleNamespace
+    from smc_bot import SignalType as BotSignalType
+    from smc_trade_engine import SignalType as TradeSignalType
+
+    side = TradeSignalType.LONG if signal.signal_type == BotSignalType.BUY else TradeSignalType.SHORT
+    return SimpleNamespace(
+        timestamp=signal.timestamp if timestamp is None else timestamp,
+        entry_price=signal.entry_price if entry_price is None else entry_price,
+        stop_loss=signal.stop_loss,
+        take_profit=signal.take_profit,
+        signal_type=side
+    )
+
+def _walk_forward_segment(df: pd.DataFrame, config: Dict[str, Any], folds: List[WalkForwardFold],
+                          horizon: int, initial_capital: float, risk_per_trade: float,
+                          max_trade_duration: int, timeframe: Optional[str]) -> List[WalkForwardFold]:
+    """
+    Procesar un tramo de folds consecutivos
+
+    Cada fold usa un IncrementalSMCBot nuevo calentado exactamente con su ventana
+    de entrenamiento, de modo que el resultado no depende de cómo se repartan los
+    folds entre tramos. Las señales emitidas al cierre de una vela entran a la
+    apertura de la siguiente, así que ningún detector ve datos posteriores a la entrada, y
+    los SL/TP se validan con el rango y el ATR del tramo de entrenamiento.
+    """
+    import contextlib
+    import io
+    from smc_bot import SMCConfig
+    from smc_incremental import IncrementalSMCBot
+
+    opens = df['open'].to_numpy()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for fold in folds:
+            bot = IncrementalSMCBot(SMCConfig(**config))
+            bot.warm_up(df.iloc[fold.train_start:fold.test_start])
+
+            emitted = []  # (posición de la vela de emisión, señal)
+            test_window = df.iloc[fold.test_start:fold.test_end]
+            for position, events in enumerate(bot.replay(test_window), start=fold.test_start):
+                emitted.extend((position, signal) for signal in events['signals'])
+
+            fold.start_time = df.index[fold.test_start]
+            fold.end_time = df.index[fold.test_end - 1]
+            fold.signals = [to_backtest_signal(signal, df.index[position + 1], float(opens[position + 1]))
+                            for position, signal in emitted if position + 1 < len(df)]
+
+            # Los trades abiertos al final de la prueba pueden cerrarse después; los SL/TP
+            # se validan con el histórico de entrenamiento, no con las velas de la ventana
+            window = df.iloc[fold.test_start:min(len(df), fold.test_end + horizon + 1)]
+            context = ValidationContext.from_dataframe(df.iloc[fold.train_start:fold.test_start])
+            backtester = SMCBacktester(initial_capital, risk_per_trade)
+            fold.results = backtester.run_backtest(window.reset_index(), fold.signals,
+                                                   max_trade_duration=max_trade_duration, timeframe=timeframe,
+                                                   validation_context=context)
+    return folds
+
+# DataFrame del worker, reconstruido una vez desde la memoria compartida
+_walk_forward_df: Optional[pd.DataFrame] = None
+_walk_forward_blocks: List[Any] = []
+
+def _init_walk_forward_worker(handle):
+    """Inicializador del ProcessPoolExecutor de walk-forward"""
+    from smc_optimizer import attach_shared_ohlc
+
+    global _walk_forward_df, _walk_forward_blocks
+    _walk_forward_df, _walk_forward_blocks = attach_shared_ohlc(handle)
+
+def _run_walk_forward_segment(folds: List[WalkForwardFold], options: Dict[str, Any]) -> List[WalkForwardFold]:
+    """Tarea de un worker: tramo de folds sobre el DataFrame compartido"""
+    return _walk_forward_segment(_walk_forward_df, folds=folds, **options)
+
+def run_walk_forward(df: pd.DataFrame, config: Any = None, train_size: int = 2000,
+                     test_size: int = 500, step: Optional[int] = None,
+                     max_workers: Optional[int] = None, segments: Optional[int] = None,
+                     initial_capital: float = 10000, risk_per_trade: Optional[float] = None,
+                     max_trade_duration: int = 48,
+                     timeframe: Optional[str] = None) -> List[WalkForwardFold]:
+    """
+    Backtesting walk-forward fuera de muestra
+
+    Cada fold solo opera señales emitidas dentro de su ventana de prueba por un
+    bot calentado con las train_size velas previas y que nunca ve velas futuras.
+    Los folds se reparten en tramos consecutivos que se ejecutan en paralelo;
+    el reparto no cambia los resultados.
+
+    Args:
+        df: DataFrame OHLCV (índice de timestamps o columna 'timestamp')
+        config: SMCConfig del bot (por defecto la configuración estándar)
+        train_size: Velas de histórico antes de cada ventana de prueba
+        test_size: Velas de cada ventana de prueba
+        step: Desplazamiento entre folds (por defecto test_size)
+        max_workers: Procesos en paralelo (0 o 1 = en el proceso actual)
+        segments: Tramos de folds (por defecto uno por proceso)
+        initial_capital: Capital inicial de cada fold
+        risk_per_trade: Riesgo por trade (%); por defecto el de config
+        max_trade_duration: Máximo de horas por trade
+        timeframe: Timeframe de df; si no se indica se infiere de los timestamps
+
+    Returns:
+        Lista de folds con sus señales y resultados
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from dataclasses import asdict
+    from smc_bot import SMCConfig
+    from smc_optimizer import SharedOHLC, indexed_ohlcv
+
+    config = config or SMCConfig()
+    market_df = indexed_ohlcv(df)
+    folds = walk_forward_folds(len(market_df), train_size, test_size, step)
+    if not folds:
+        print("⚠️ Datos insuficientes para walk-forward")
+        return []
+
+    bars_per_hour = MarketArrays.from_dataframe(market_df.reset_index()).bars_per_hour(timeframe)
+    options = {
+        'config': asdict(config),
+        'horizon': int(round(max_trade_duration * bars_per_hour)),
+        'initial_capital': initial_capital,
+        'risk_per_trade': config.risk_per_trade if risk_per_trade is None else risk_per_trade,
+        'max_trade_duration': max_trade_duration,
+        'timeframe': timeframe
+    }
+
+    inline = max_workers is not None and max_workers <= 1
+    workers = 1 if inline else (max_workers or os.cpu_count() or 1)
+    chunks = [list(chunk) for chunk in np.array_split(np.array(folds, dtype=object), min(len(folds), segments or workers))]
+
+    print(f"🔁 Walk-forward: {len(folds)} folds en {len(chunks)} tramos "
+          f"(train={train_size}, test={test_size}, step={step or test_size})")
+
+    if inline:
+        done = [_walk_forward_segment(market_df, folds=chunk, **options) for chunk in chunks]
+    else:
+        with SharedOHLC(market_df) as shared:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_walk_forward_worker,
+                                     initargs=(shared.handle,)) as executor:
+                done = list(executor.map(_run_walk_forward_segment, chunks, [options] * len(chunks)))
+
+    folds = [fold for chunk in done for fold in chunk]
+    for fold in folds:
+        print(f"   📅 Fold {fold.fold}: {fold.start_time} → {fold.end_time} | "
+              f"{fold.results.total_trades} trades, retorno {fold.results.total_return:.2f}%")
+    return folds
+
+def walk_forward_summary(folds: List[WalkForwardFold]) -> pd.DataFrame:
+    """Tabla con las métricas fuera de muestra de cada fold"""
+    return pd.DataFrame([{
+        'fold': fold.fold,
+        'start_time': fold.start_time,
+        'end_time': fold.end_time,
+        'signals': len(fold.signals),
+        'total_trades': fold.results.total_trades,
+        'win_rate': fold.results.win_rate,
+        'profit_factor': fold.results.profit_factor,
+        'total_return': fold.results.total_return,
+        'max_drawdown_percent': fold.results.max_drawdown_percent,
+        'sharpe_ratio': fold.results.sharpe_ratio
+    } for fold in folds])
+
 # Exportar clases y funciones principales
 __all__ = [
     'SMCBacktester',
     'BacktestResults',
     'BacktestTrade',
+    'TradeLedger',
     'TradeResult',
-    'run_backtest_analysis'
+    'WalkForwardFold',
+    'run_backtest_analysis',
+    'run_walk_forward',
+    'walk_forward_summary'
 ]
 
 class LevelValidationResult(Enum):
@@ -666,118 +1334,187 @@ class ValidationReport:
     recommended_tp: Optional[float] = None
     market_volatility: float = 0.0
 
-def validate_sl_tp_levels(df: pd.DataFrame, entry_price: float,
-                         stop_loss: float, take_profit: float,
-                         signal_type: str = "LONG") -> ValidationReport:
-    """
-    Validar niveles de SL/TP basados en datos históricos
+@dataclass
+class ValidationContext:
+    """Rango histórico y ATR de un DataFrame, calculados una vez para validar muchas señales"""
+    price_min: float
+    price_max: float
+    atr: float
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame, atr_period: int = 14) -> 'ValidationContext':
+        """Mínimo, máximo y último ATR del DataFrame"""
+        from smc_advanced import INDICATOR_CACHE
+        return cls(
+            price_min=df['low'].min(),
+            price_max=df['high'].max(),
+            atr=INDICATOR_CACHE.atr(df, atr_period).iloc[-1]
+        )
 
-    Args:
-        df: DataFrame con datos OHLC
-        entry_price: Precio de entrada
-        stop_loss: Precio de stop loss
-        take_profit: Precio de take profit
-        signal_type: LONG o SHORT
+    @property
+    def volatility_pct(self) -> float:
+        """Rango histórico en % sobre el mínimo"""
+        return ((self.price_max - self.price_min) / self.price_min) * 100
 
-    Returns:
-        ValidationReport con resultado y sugerencias
-    """
-    try:
-        # Calcular volatilidad del mercado
-        price_min = df['low'].min()
-        price_max = df['high'].max()
-        price_range = price_max - price_min
-        volatility_pct = (price_range / price_min) * 100
-
-        # Calcular ATR (Average True Range) para los últimos 14 períodos
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-
-        true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        atr = true_range.rolling(window=14).mean().iloc[-1]
-        atr_pct = (atr / entry_price) * 100
+# Orden de los códigos de LevelValidationBatch.codes
+VALIDATION_RESULTS = list(LevelValidationResult)
 
-        # Calcular porcentajes de SL/TP
-        if signal_type == "LONG":
-            sl_pct = abs((stop_loss - entry_price) / entry_price) * 100
-            tp_pct = abs((take_profit - entry_price) / entry_price) * 100
-        else:  # SHORT
-            sl_pct = abs((stop_loss - entry_price) / entry_price) * 100
-            tp_pct = abs((take_profit - entry_price) / entry_price) * 100
+@dataclass
+class LevelValidationBatch:
+    """
+    Validación de muchas señales: arrays por señal y ValidationReport bajo demanda
 
-        # Calcular Risk/Reward ratio
-        rr_ratio = tp_pct / sl_pct if sl_pct > 0 else 0
+    sl_check/tp_check: 0 = correcto, 1 = muy ajustado, 2 = muy amplio.
+    """
+    context: ValidationContext
+    is_long: np.ndarray
+    codes: np.ndarray
+    sl_pct: np.ndarray
+    tp_pct: np.ndarray
+    rr_ratio: np.ndarray
+    atr_pct: np.ndarray
+    sl_check: np.ndarray
+    tp_check: np.ndarray
+    low_rr: np.ndarray
+    outside: np.ndarray
+    recommended_sl: np.ndarray
+    recommended_tp: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def results(self) -> List[LevelValidationResult]:
+        return [VALIDATION_RESULTS[code] for code in self.codes]
+
+    @property
+    def valid(self) -> np.ndarray:
+        return self.codes == VALIDATION_RESULTS.index(LevelValidationResult.VALID)
+
+    def report(self, i: int) -> ValidationReport:
+        """ValidationReport de la señal i (mismo contenido que validate_sl_tp_levels)"""
+        context = self.context
+        if self.outside[i]:
+            return ValidationReport(
+                result=LevelValidationResult.OUTSIDE_RANGE,
+                message=f"Niveles fuera del rango histórico ({context.price_min:.2f} - {context.price_max:.2f})",
+                suggestions=["Ajustar SL/TP dentro del rango de precios histórico"],
+                market_volatility=context.volatility_pct
+            )
 
-        # Criterios de validación
+        sl_pct, tp_pct, rr_ratio, atr_pct = self.sl_pct[i], self.tp_pct[i], self.rr_ratio[i], self.atr_pct[i]
         suggestions = []
-
-        # 1. Verificar que SL/TP estén dentro del rango histórico
-        if signal_type == "LONG":
-            if stop_loss < price_min or take_profit > price_max:
-                return ValidationReport(
-                    result=LevelValidationResult.OUTSIDE_RANGE,
-                    message=f"Niveles fuera del rango histórico ({price_min:.2f} - {price_max:.2f})",
-                    suggestions=["Ajustar SL/TP dentro del rango de precios histórico"],
-                    market_volatility=volatility_pct
-                )
-        else:  # SHORT
-            if stop_loss > price_max or take_profit < price_min:
-                return ValidationReport(
-                    result=LevelValidationResult.OUTSIDE_RANGE,
-                    message=f"Niveles fuera del rango histórico ({price_min:.2f} - {price_max:.2f})",
-                    suggestions=["Ajustar SL/TP dentro del rango de precios histórico"],
-                    market_volatility=volatility_pct
-                )
-
-        # 2. Verificar SL basado en ATR
-        if sl_pct < atr_pct * 0.3:
+        if self.sl_check[i] == 1:
             suggestions.append(f"SL muy ajustado ({sl_pct:.1f}%). Considerar usar >={atr_pct * 0.5:.1f}% (0.5x ATR)")
-            result = LevelValidationResult.SL_TOO_TIGHT
-        elif sl_pct > atr_pct * 3:
+        elif self.sl_check[i] == 2:
             suggestions.append(f"SL muy amplio ({sl_pct:.1f}%). Considerar usar <={atr_pct * 2:.1f}% (2x ATR)")
-            result = LevelValidationResult.SL_TOO_WIDE
-
-        # 3. Verificar TP basado en ATR
-        if tp_pct < atr_pct * 0.5:
+        if self.tp_check[i] == 1:
             suggestions.append(f"TP muy ajustado ({tp_pct:.1f}%). Considerar usar >={atr_pct:.1f}% (1x ATR)")
-            result = LevelValidationResult.TP_TOO_TIGHT
-        elif tp_pct > atr_pct * 5:
+        elif self.tp_check[i] == 2:
             suggestions.append(f"TP muy amplio ({tp_pct:.1f}%). Considerar usar <={atr_pct * 3:.1f}% (3x ATR)")
-            result = LevelValidationResult.TP_TOO_WIDE
-
-        # 4. Verificar Risk/Reward ratio
-        if rr_ratio < 1.0:
+        if self.low_rr[i]:
             suggestions.append(f"Risk/Reward bajo ({rr_ratio:.1f}). Considerar RR >= 1.5")
-            result = LevelValidationResult.INVALID_RR
 
-        # 5. Generar recomendaciones
-        recommended_sl_pct = atr_pct * 1.0  # 1x ATR
-        recommended_tp_pct = atr_pct * 2.0  # 2x ATR
-
-        if signal_type == "LONG":
-            recommended_sl = entry_price * (1 - recommended_sl_pct / 100)
-            recommended_tp = entry_price * (1 + recommended_tp_pct / 100)
-        else:  # SHORT
-            recommended_sl = entry_price * (1 + recommended_sl_pct / 100)
-            recommended_tp = entry_price * (1 - recommended_tp_pct / 100)
-
-        # Si no hay problemas, validar como correcto
         if not suggestions:
-            result = LevelValidationResult.VALID
             message = f"Niveles válidos - SL: {sl_pct:.1f}%, TP: {tp_pct:.1f}%, RR: {rr_ratio:.1f}"
         else:
             message = f"Niveles requieren ajustes - SL: {sl_pct:.1f}%, TP: {tp_pct:.1f}%, RR: {rr_ratio:.1f}"
 
         return ValidationReport(
-            result=result,
+            result=VALIDATION_RESULTS[self.codes[i]],
             message=message,
             suggestions=suggestions,
-            recommended_sl=recommended_sl,
-            recommended_tp=recommended_tp,
-            market_volatility=volatility_pct
+            recommended_sl=self.recommended_sl[i],
+            recommended_tp=self.recommended_tp[i],
+            market_volatility=context.volatility_pct
         )
 
+    def reports(self) -> List[ValidationReport]:
+        return [self.report(i) for i in range(len(self))]
+
+def validate_sl_tp_levels_batch(context: Any, entry_price, stop_loss, take_profit,
+                                signal_type) -> LevelValidationBatch:
+    """
+    Validar niveles de SL/TP de muchas señales en una pasada
+
+    Mismos criterios que validate_sl_tp_levels, con el rango histórico y el
+    ATR calculados una sola vez.
+
+    Args:
+        context: ValidationContext o DataFrame con datos OHLC
+        entry_price: Precios de entrada
+        stop_loss: Precios de stop loss
+        take_profit: Precios de take profit
+        signal_type: LONG o SHORT por señal
+
+    Returns:
+        LevelValidationBatch con un resultado por señal
+    """
+    if isinstance(context, pd.DataFrame):
+        context = ValidationContext.from_dataframe(context)
+
+    entry_price = np.asarray(entry_price, dtype=float)
+    stop_loss = np.asarray(stop_loss, dtype=float)
+    take_profit = np.asarray(take_profit, dtype=float)
+    is_long = np.asarray(signal_type) == "LONG"
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        atr_pct = (context.atr / entry_price) * 100
+        sl_pct = np.abs((stop_loss - entry_price) / entry_price) * 100
+        tp_pct = np.abs((take_profit - entry_price) / entry_price) * 100
+        rr_ratio = np.where(sl_pct > 0, tp_pct / sl_pct, 0.0)
+
+    # 1. SL/TP dentro del rango histórico
+    outside = np.where(is_long,
+                       (stop_loss < context.price_min) | (take_profit > context.price_max),
+                       (stop_loss > context.price_max) | (take_profit < context.price_min))
+
+    # 2-4. SL/TP según ATR y Risk/Reward (la última comprobación que falla decide el resultado)
+    sl_check = np.select([sl_pct < atr_pct * 0.3, sl_pct > atr_pct * 3], [1, 2], 0).astype(np.int8)
+    tp_check = np.select([tp_pct < atr_pct * 0.5, tp_pct > atr_pct * 5], [1, 2], 0).astype(np.int8)
+    low_rr = rr_ratio < 1.0
+
+    code = VALIDATION_RESULTS.index
+    codes = np.select(
+        [outside, low_rr, tp_check == 2, tp_check == 1, sl_check == 2, sl_check == 1],
+        [code(LevelValidationResult.OUTSIDE_RANGE), code(LevelValidationResult.INVALID_RR),
+         code(LevelValidationResult.TP_TOO_WIDE), code(LevelValidationResult.TP_TOO_TIGHT),
+         code(LevelValidationResult.SL_TOO_WIDE), code(LevelValidationResult.SL_TOO_TIGHT)],
+        code(LevelValidationResult.VALID)
+    )
+
+    # 5. Recomendaciones: SL a 1x ATR y TP a 2x ATR
+    direction = np.where(is_long, 1.0, -1.0)
+    recommended_sl = entry_price * (1 - direction * atr_pct * 1.0 / 100)
+    recommended_tp = entry_price * (1 + direction * atr_pct * 2.0 / 100)
+
+    return LevelValidationBatch(context, is_long, codes, sl_pct, tp_pct, rr_ratio, atr_pct,
+                                sl_check, tp_check, low_rr, outside, recommended_sl, recommended_tp)
+
+def validate_sl_tp_levels(df: pd.DataFrame, entry_price: float,
+                         stop_loss: float, take_profit: float,
+                         signal_type: str = "LONG",
+                         context: Optional[ValidationContext] = None) -> ValidationReport:
+    """
+    Validar niveles de SL/TP basados en datos históricos
+
+    Args:
+        df: DataFrame con datos OHLC
+        entry_price: Precio de entrada
+        stop_loss: Precio de stop loss
+        take_profit: Precio de take profit
+        signal_type: LONG o SHORT
+        context: Rango y ATR ya calculados (evita recorrer df en cada señal)
+
+    Returns:
+        ValidationReport con resultado y sugerencias
+    """
+    try:
+        context = context or ValidationContext.from_dataframe(df)
+        batch = validate_sl_tp_levels_batch(context, [entry_price], [stop_loss],
+                                            [take_profit], [signal_type])
+        return batch.report(0)
+
     except Exception as e:
         return ValidationReport(
             result=LevelValidationResult.OUTSIDE_RANGE,
@@ -788,7 +1525,8 @@ def validate_sl_tp_levels(df: pd.DataFrame, entry_price: float,
 
 def calculate_adaptive_levels(df: pd.DataFrame, entry_price: float,
                              signal_type: str = "LONG",
-                             risk_multiplier: float = 1.0) -> Tuple[float, float]:
+                             risk_multiplier: float = 1.0,
+                             context: Optional[ValidationContext] = None) -> Tuple[float, float]:
     """
     Calcular niveles adaptativos de SL/TP basados en ATR
 
@@ -797,18 +1535,18 @@ def calculate_adaptive_levels(df: pd.DataFrame, entry_price: float,
         entry_price: Precio de entrada
         signal_type: LONG o SHORT
         risk_multiplier: Multiplicador de riesgo (1.0 = normal, 0.5 = conservador, 2.0 = agresivo)
+        context: Rango y ATR ya calculados (evita recorrer df en cada señal)
 
     Returns:
         Tuple[stop_loss, take_profit]
     """
     try:
         # Calcular ATR
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-
-        true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        atr = true_range.rolling(window=14).mean().iloc[-1]
+        if context is not None:
+            atr = context.atr
+        else:
+            from smc_advanced import INDICATOR_CACHE
+            atr = INDICATOR_CACHE.atr(df, 14).iloc[-1]
 
         # Calcular niveles adaptativos
         atr_pct = (atr / entry_price) * 100
@@ -16,10 +16,14 @@ Versión: 1.0
 
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Tuple, Optional
-from dataclasses import dataclass
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Tuple, Optional
+from dataclasses import dataclass, field, astuple
 from enum import Enum
 import warnings
+
+from smc_advanced import frame_version
 warnings.filterwarnings('ignore')
 
 # ==================== CONFIGURACIÓN ====================
@@ -59,6 +63,9 @@ class SMCConfig:
     enable_rejection_wick: bool = True
     min_wick_ratio: float = 2.0  # Ratio mínimo mecha/cuerpo para pinbar
 
+    # Motores vectorizados NumPy (False = bucles originales vela a vela)
+    use_vectorized: bool = True
+
 class TrendDirection(Enum):
     """Direcciones de tendencia"""
     BULLISH = "bullish"
@@ -89,6 +96,69 @@ class TradingSignal:
     reason: str
     timestamp: pd.Timestamp
 
+@dataclass
+class AnalysisContext:
+    """Contexto de una ejecución de analyze_market: resultados memoizados y tiempos por etapa"""
+    key: Tuple
+    df: pd.DataFrame
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def run_stage(self, stage: str, compute: Callable[[], Any]) -> Any:
+        """Ejecutar una etapa una sola vez y registrar su duración (segundos)"""
+        if stage not in self.results:
+            start = time.perf_counter()
+            self.results[stage] = compute()
+            self.timings[stage] = time.perf_counter() - start
+        return self.results[stage]
+
+def analysis_stage(stage: str):
+    """
+    Memoizar un detector de SMCBot dentro del AnalysisContext activo
+
+    Fuera de analyze_market (sin contexto, con otro DataFrame o con la
+    configuración cambiada) el detector se ejecuta normalmente.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            context = self.context
+            if context is None or context.df is not self.df or context.key[1] != astuple(self.config):
+                return method(self, *args, **kwargs)
+            return context.run_stage(stage, lambda: method(self, *args, **kwargs))
+        return wrapper
+    return decorator
+
+def trend_from_structure(structure: List[Dict]) -> TrendDirection:
+    """
+    Tendencia según los últimos 4 puntos de estructura (HH/HL vs LL/LH)
+
+    Args:
+        structure: Lista con puntos de estructura
+
+    Returns:
+        Dirección de la tendencia
+    """
+    if not structure or len(structure) < 4:
+        return TrendDirection.SIDEWAYS
+
+    # Analizar últimos 4 puntos de estructura
+    recent_structure = structure[-4:]
+
+    hh_count = sum(1 for s in recent_structure if s['type'] == StructureType.HH)
+    hl_count = sum(1 for s in recent_structure if s['type'] == StructureType.HL)
+    ll_count = sum(1 for s in recent_structure if s['type'] == StructureType.LL)
+    lh_count = sum(1 for s in recent_structure if s['type'] == StructureType.LH)
+
+    bullish_signals = hh_count + hl_count
+    bearish_signals = ll_count + lh_count
+
+    if bullish_signals > bearish_signals:
+        return TrendDirection.BULLISH
+    elif bearish_signals > bullish_signals:
+        return TrendDirection.BEARISH
+    return TrendDirection.SIDEWAYS
+
 # ==================== CLASE PRINCIPAL ====================
 
 class SMCBot:
@@ -115,6 +185,9 @@ class SMCBot:
         self.fvg_zones = []
         self.signals = []
 
+        # Contexto del último análisis (memoización y tiempos)
+        self.context: Optional[AnalysisContext] = None
+
         print("🤖 SMC Bot inicializado con configuración:")
         print(f"   📊 Swing Length: {self.config.swing_length}")
         print(f"   📏 Equal Tolerance: {self.config.equal_tolerance}%")
@@ -129,11 +202,15 @@ class SMCBot:
             df: DataFrame con datos OHLC
 
         Returns:
-            Diccionario con análisis completo
+            Diccionario con análisis completo (incluye 'timings' por etapa)
         """
         print("\n🔍 Iniciando análisis de mercado...")
 
-        self.df = df.copy()
+        # Cada detector se calcula una sola vez por versión de datos + configuración
+        key = (frame_version(df), astuple(self.config))
+        if self.context is None or self.context.key != key:
+            self.df = df.copy()
+            self.context = AnalysisContext(key=key, df=self.df)
 
         # 1. Detectar estructura
         self.swings = self.detect_swings()
@@ -164,11 +241,13 @@ class SMCBot:
             'choch_bos': len(choch_bos),
             'order_blocks': len(self.order_blocks),
             'fvg_zones': len(self.fvg_zones),
-            'signals': len(self.signals)
+            'signals': len(self.signals),
+            'timings': dict(self.context.timings)
         }
 
     # ==================== DETECCIÓN DE ESTRUCTURA ====================
 
+    @analysis_stage('swings')
     def detect_swings(self) -> pd.DataFrame:
         """
         Detectar swing highs y swing lows usando 5 velas (2 izq + 2 der)
@@ -178,6 +257,34 @@ class SMCBot:
         """
         print("📈 Detectando swings highs/lows...")
 
+        # Usar 5 velas: 2 izquierda + 1 central + 2 derecha
+        if self.config.use_vectorized:
+            from smc_advanced import detect_swings_vectorized
+            swings = detect_swings_vectorized(self.df, left_bars=2, right_bars=2)
+        else:
+            swings = self._detect_swings_loop(left_bars=2, right_bars=2)
+
+        # Filtrar solo swings válidos
+        swing_highs = swings[swings['swing_high']].copy()
+        swing_lows = swings[swings['swing_low']].copy()
+
+        print(f"   ✅ Detectados {len(swing_highs)} swing highs y {len(swing_lows)} swing lows")
+
+        return swings
+
+    def _detect_swings_loop(self, left_bars: int = 2, right_bars: int = 2) -> pd.DataFrame:
+        """
+        Detección de swings vela a vela (implementación original)
+
+        Se mantiene como referencia y para ``use_vectorized=False``.
+
+        Args:
+            left_bars: Velas a la izquierda del swing
+            right_bars: Velas a la derecha del swing
+
+        Returns:
+            DataFrame con swings detectados
+        """
         df = self.df.copy()
         swings = pd.DataFrame(index=df.index)
         swings['swing_high'] = False
@@ -185,10 +292,6 @@ class SMCBot:
         swings['swing_high_price'] = np.nan
         swings['swing_low_price'] = np.nan
 
-        # Usar 5 velas: 2 izquierda + 1 central + 2 derecha
-        left_bars = 2
-        right_bars = 2
-
         for i in range(left_bars, len(df) - right_bars):
             current_high = df.iloc[i]['high']
             current_low = df.iloc[i]['low']
@@ -227,14 +330,9 @@ class SMCBot:
                 swings.iloc[i, swings.columns.get_loc('swing_low')] = True
                 swings.iloc[i, swings.columns.get_loc('swing_low_price')] = current_low
 
-        # Filtrar solo swings válidos
-        swing_highs = swings[swings['swing_high']].copy()
-        swing_lows = swings[swings['swing_low']].copy()
-
-        print(f"   ✅ Detectados {len(swing_highs)} swing highs y {len(swing_lows)} swing lows")
-
         return swings
 
+    @analysis_stage('structure')
     def detect_structure(self) -> List[Dict]:
         """
         Detectar estructura del mercado (HH, HL, LL, LH)
@@ -291,6 +389,7 @@ class SMCBot:
 
         return structure_points
 
+    @analysis_stage('trend')
     def determine_trend(self) -> TrendDirection:
         """
         Determinar la tendencia actual del mercado
@@ -300,26 +399,7 @@ class SMCBot:
         """
         print("📊 Determinando tendencia del mercado...")
 
-        if not self.structure or len(self.structure) < 4:
-            return TrendDirection.SIDEWAYS
-
-        # Analizar últimos 4 puntos de estructura
-        recent_structure = self.structure[-4:]
-
-        hh_count = sum(1 for s in recent_structure if s['type'] == StructureType.HH)
-        hl_count = sum(1 for s in recent_structure if s['type'] == StructureType.HL)
-        ll_count = sum(1 for s in recent_structure if s['type'] == StructureType.LL)
-        lh_count = sum(1 for s in recent_structure if s['type'] == StructureType.LH)
-
-        bullish_signals = hh_count + hl_count
-        bearish_signals = ll_count + lh_count
-
-        if bullish_signals > bearish_signals:
-            trend = TrendDirection.BULLISH
-        elif bearish_signals > bullish_signals:
-            trend = TrendDirection.BEARISH
-        else:
-            trend = TrendDirection.SIDEWAYS
+        trend = trend_from_structure(self.structure)
 
         print(f"   ✅ Tendencia detectada: {trend.value.upper()}")
 
@@ -327,6 +407,7 @@ class SMCBot:
 
     # ==================== DETECCIÓN DE LIQUIDEZ ====================
 
+    @analysis_stage('liquidity_zones')
     def detect_liquidity_zones(self) -> List[Dict]:
         """
         Detectar zonas de liquidez (equal highs/lows) con tolerancia mejorada
@@ -336,16 +417,39 @@ class SMCBot:
         """
         print("💧 Detectando zonas de liquidez...")
 
-        liquidity_zones = []
         tolerance = self.config.equal_tolerance / 100  # Convertir a decimal
 
+        print(f"[DEBUG] Swings detectados: {len(self.swings)} swing_highs, {len(self.swings)} swing_lows")
+        print(f"[DEBUG] Tolerancia para equal highs/lows: {tolerance}")
+
+        if self.config.use_vectorized:
+            from smc_advanced import cluster_liquidity_zones
+            liquidity_zones = cluster_liquidity_zones(self.swings, tolerance)
+        else:
+            liquidity_zones = self._detect_liquidity_zones_loop(tolerance)
+
+        print(f"   ✅ Detectadas {len(liquidity_zones)} zonas de liquidez")
+
+        return liquidity_zones
+
+    def _detect_liquidity_zones_loop(self, tolerance: float) -> List[Dict]:
+        """
+        Comparación par a par de swings (implementación original, O(s²))
+
+        Se mantiene como referencia y para ``use_vectorized=False``.
+
+        Args:
+            tolerance: Tolerancia en decimal
+
+        Returns:
+            Lista con zonas de liquidez
+        """
+        liquidity_zones = []
+
         # Obtener swing highs y lows
         swing_highs = self.swings[self.swings['swing_high']].copy()
         swing_lows = self.swings[self.swings['swing_low']].copy()
 
-        print(f"[DEBUG] Swings detectados: {len(self.swings)} swing_highs, {len(self.swings)} swing_lows")
-        print(f"[DEBUG] Tolerancia para equal highs/lows: {tolerance}")
-
         # Función helper para verificar si dos precios son "iguales"
         def is_equal_level(price1, price2, tolerance_pct):
             return abs(price1 - price2) / ((price1 + price2) / 2) <= tolerance_pct
@@ -414,10 +518,9 @@ class SMCBot:
                     'strength': 'high' if len(equal_lows) >= 3 else 'medium'
                 })
 
-        print(f"   ✅ Detectadas {len(liquidity_zones)} zonas de liquidez")
-
         return liquidity_zones
 
+    @analysis_stage('sweeps')
     def detect_sweeps(self) -> List[Dict]:
         """
         Detectar barridos de liquidez
@@ -427,6 +530,25 @@ class SMCBot:
         """
         print("🌊 Detectando barridos de liquidez...")
 
+        if self.config.use_vectorized and self.df.index.is_monotonic_increasing:
+            from smc_advanced import detect_sweeps_vectorized
+            sweeps = detect_sweeps_vectorized(self.df, self.liquidity_zones)
+        else:
+            sweeps = self._detect_sweeps_loop()
+
+        print(f"   ✅ Detectados {len(sweeps)} barridos de liquidez")
+
+        return sweeps
+
+    def _detect_sweeps_loop(self) -> List[Dict]:
+        """
+        Barridos de liquidez recorriendo las velas de cada zona (implementación original)
+
+        Se mantiene como referencia y para ``use_vectorized=False``.
+
+        Returns:
+            Lista con barridos detectados
+        """
         sweeps = []
 
         for zone in self.liquidity_zones:
@@ -469,12 +591,11 @@ class SMCBot:
                         zone['swept'] = True
                         break
 
-        print(f"   ✅ Detectados {len(sweeps)} barridos de liquidez")
-
         return sweeps
 
     # ==================== PLACEHOLDERS PARA FUNCIONES ADICIONALES ====================
 
+    @analysis_stage('choch_bos')
     def detect_choch_bos(self) -> List[Dict]:
         """
         Detectar cambios de estructura (CHoCH) y rupturas de estructura (BOS)
@@ -495,6 +616,7 @@ class SMCBot:
             print(f"   ⚠️ Error en detección CHoCH/BOS: {e}")
             return []
 
+    @analysis_stage('order_blocks')
     def detect_order_blocks(self) -> List[Dict]:
         """
         Detectar Order Blocks
@@ -505,18 +627,22 @@ class SMCBot:
         print("📦 Detectando Order Blocks...")
 
         # Importar función avanzada
-        from smc_advanced import detect_order_blocks_advanced
+        from smc_advanced import detect_order_blocks_advanced, detect_order_blocks_vectorized
 
         try:
             # Primero necesitamos CHoCH/BOS
             choch_bos = self.detect_choch_bos()
-            order_blocks = detect_order_blocks_advanced(self.df, self.swings, choch_bos)
+            if self.config.use_vectorized and self.df.index.is_monotonic_increasing:
+                order_blocks = detect_order_blocks_vectorized(self.df, self.swings, choch_bos)
+            else:
+                order_blocks = detect_order_blocks_advanced(self.df, self.swings, choch_bos)
             print(f"   ✅ Detectados {len(order_blocks)} Order Blocks")
             return order_blocks
         except Exception as e:
             print(f"   ⚠️ Error en detección Order Blocks: {e}")
             return []
 
+    @analysis_stage('fvg')
     def detect_fvg(self) -> List[Dict]:
         """
         Detectar Fair Value Gaps
@@ -527,16 +653,32 @@ class SMCBot:
         print("⚡ Detectando Fair Value Gaps...")
 
         # Importar función avanzada
-        from smc_advanced import detect_fvg_advanced
+        from smc_advanced import detect_fvg_advanced, detect_fvg_vectorized
 
         try:
-            fvg_zones = detect_fvg_advanced(self.df, self.config.fvg_min_size)
+            if self.config.use_vectorized and self.df.index.is_monotonic_increasing:
+                fvg_zones = detect_fvg_vectorized(self.df, self.config.fvg_min_size)
+            else:
+                fvg_zones = detect_fvg_advanced(self.df, self.config.fvg_min_size)
             print(f"   ✅ Detectados {len(fvg_zones)} Fair Value Gaps")
             return fvg_zones
         except Exception as e:
             print(f"   ⚠️ Error en detección FVG: {e}")
             return []
 
+    @analysis_stage('candle_patterns')
+    def detect_candle_patterns(self) -> pd.DataFrame:
+        """
+        Clasificar los patrones de confirmación de todas las velas a la vez
+
+        Returns:
+            DataFrame con confirmed, type, strength y description por vela
+        """
+        from smc_advanced import candle_pattern_table, classify_confirmation_patterns
+
+        patterns = candle_pattern_table(self.df, self.config.min_wick_ratio)
+        return classify_confirmation_patterns(patterns, self.config)
+
     def detect_confirmation(self, index: int) -> Dict:
         """
         Detectar velas de confirmación
@@ -550,12 +692,14 @@ class SMCBot:
         from smc_advanced import detect_confirmation_patterns
 
         try:
-            confirmation = detect_confirmation_patterns(self.df, index, self.config.min_confirmation_body)
+            confirmation = detect_confirmation_patterns(self.df, index, self.config,
+                                                        self.detect_candle_patterns())
             return confirmation
         except Exception as e:
             print(f"   ⚠️ Error en detección confirmación: {e}")
             return {'confirmed': False, 'type': None, 'strength': 0}
 
+    @analysis_stage('signals')
     def generate_signals(self) -> List[TradingSignal]:
         """
         Generar señales de trading basadas en la estrategia SMC
@@ -566,8 +710,7 @@ class SMCBot:
         print("🎯 Generando señales de trading...")
 
         try:
-            from smc_advanced import calculate_atr
-            from smc_integration import generate_trading_signals
+            from smc_advanced import calculate_atr, generate_trading_signals
 
             # Calcular ATR
             atr = calculate_atr(self.df)
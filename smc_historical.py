@@ -11,16 +11,31 @@ de indicadores y señales.
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import bisect
+import json
+import multiprocessing
 import pickle
 import os
+import shutil
+import time
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from enum import Enum
 
-from fetch_data import get_ohlcv
+import pyarrow as pa
+import pyarrow.ipc
+
 from smc_integration import get_smc_bot_analysis
 from smc_bot import TradingSignal, SignalType
 
+def _utc_ns(value) -> int:
+    """Timestamp en ns UTC (los datetime sin zona horaria se interpretan como UTC)"""
+    ts = pd.Timestamp(value)
+    ts = ts.tz_localize('UTC') if ts.tzinfo is None else ts.tz_convert('UTC')
+    return ts.value
+
 class HistoricalPeriod(Enum):
     """Períodos históricos disponibles"""
     HOUR_1 = "1h"
@@ -34,15 +49,447 @@ class HistoricalPeriod(Enum):
 
 @dataclass
 class HistoricalSnapshot:
-    """Snapshot histórico de datos y análisis"""
+    """
+    Snapshot histórico de datos y análisis
+
+    Las velas no se copian por snapshot: data es el frame OHLCV compartido
+    por todo el timeline y [start, end) las posiciones de la ventana.
+    """
     timestamp: datetime
-    df: pd.DataFrame
+    data: pd.DataFrame
+    start: int
+    end: int
     bot_analysis: Dict
     signals: List[TradingSignal]
     market_conditions: Dict
     symbol: str
     timeframe: str
 
+    @property
+    def df(self) -> pd.DataFrame:
+        """Ventana de velas del snapshot (vista sobre el frame compartido)"""
+        return self.data.iloc[self.start:self.end].reset_index(drop=True)
+
+    def __setstate__(self, state: Dict):
+        # Snapshots guardados con el formato anterior (DataFrame propio en 'df')
+        if 'df' in state:
+            df = state.pop('df')
+            state.update(data=df, start=0, end=len(df))
+        self.__dict__.update(state)
+
+# ==================== ANÁLISIS DE VENTANAS ====================
+
+MIN_SNAPSHOT_BARS = 10  # Mínimo de velas para considerar válido el snapshot
+
+def _snapshot_bounds(start: int, end: int) -> Optional[Tuple[int, int]]:
+    """
+    Posiciones [start, end) que se analizan en un snapshot
+
+    Returns:
+        La ventana, solo su última vela si no llega al mínimo, o None si está vacía
+    """
+    if end <= start:
+        return None
+    if end - start < MIN_SNAPSHOT_BARS:
+        # Usar el último dato disponible del rango
+        return end - 1, end
+    return start, end
+
+def analyze_snapshot_window(df: pd.DataFrame) -> Tuple[Dict, Dict]:
+    """
+    Análisis SMC y condiciones del mercado de una ventana
+
+    Returns:
+        Tupla (bot_analysis, market_conditions)
+    """
+    bot_analysis = get_smc_bot_analysis(df)
+    return bot_analysis, analyze_market_conditions(df, bot_analysis)
+
+def analyze_market_conditions(df: pd.DataFrame, bot_analysis: Dict) -> Dict:
+    """
+    Analizar condiciones del mercado
+
+    Args:
+        df: DataFrame con datos OHLC
+        bot_analysis: Análisis del bot
+
+    Returns:
+        Diccionario con condiciones del mercado
+    """
+    if df.empty:
+        return {}
+
+    # Precio y movimiento
+    current_price = df['close'].iloc[-1]
+    prev_price = df['close'].iloc[-2] if len(df) > 1 else current_price
+    price_change = ((current_price - prev_price) / prev_price) * 100
+
+    # Volatilidad
+    volatility = df['close'].pct_change().std() * 100
+
+    # Rango del día
+    daily_range = ((df['high'].max() - df['low'].min()) / current_price) * 100
+
+    # Tendencia
+    trend = bot_analysis.get('trend', 'UNKNOWN')
+
+    # Análisis de volumen (si está disponible)
+    volume_analysis = "N/A"
+    if 'volume' in df.columns:
+        avg_volume = df['volume'].mean()
+        current_volume = df['volume'].iloc[-1]
+        volume_ratio = current_volume / avg_volume if avg_volume > 0 else 1
+
+        if volume_ratio > 1.5:
+            volume_analysis = "Alto"
+        elif volume_ratio < 0.5:
+            volume_analysis = "Bajo"
+        else:
+            volume_analysis = "Normal"
+
+    return {
+        'price': current_price,
+        'price_change': price_change,
+        'volatility': volatility,
+        'daily_range': daily_range,
+        'trend': trend.value if hasattr(trend, 'value') else str(trend),
+        'volume_analysis': volume_analysis,
+        'smc_elements': {
+            'liquidity_zones': len(bot_analysis.get('liquidity_zones', [])),
+            'order_blocks': len(bot_analysis.get('order_blocks', [])),
+            'fvg_zones': len(bot_analysis.get('fvg_zones', [])),
+            'sweeps': len(bot_analysis.get('sweeps', [])),
+            'choch_bos': len(bot_analysis.get('choch_bos', []))
+        }
+    }
+
+_worker_data: Optional[pd.DataFrame] = None
+_worker_blocks: List = []
+
+# Los workers no heredan por fork el proceso de Streamlit (hilos, sockets abiertos)
+SNAPSHOT_POOL_CONTEXT = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+MAX_SNAPSHOT_WORKERS = 4  # Procesos del pool si no se indica max_workers
+
+def _init_snapshot_worker(handle):
+    """Inicializador del ProcessPoolExecutor: velas del timeline desde memoria compartida"""
+    from smc_optimizer import attach_shared_ohlc
+    global _worker_data, _worker_blocks
+    indexed, _worker_blocks = attach_shared_ohlc(handle)
+    _worker_data = indexed.reset_index()
+
+def _analyze_window(data: pd.DataFrame, start: int, end: int) -> Optional[Tuple[Dict, Dict]]:
+    """Analizar la ventana [start, end) de las velas del timeline (None si falla)"""
+    try:
+        return analyze_snapshot_window(data.iloc[start:end].reset_index(drop=True))
+    except Exception as e:
+        return None
+
+def _analyze_shared_window(start: int, end: int) -> Optional[Tuple[Dict, Dict]]:
+    """Analizar una ventana de las velas compartidas dentro de un worker"""
+    return _analyze_window(_worker_data, start, end)
+
+# ==================== TIMELINE EN DISCO ====================
+
+TIMELINE_OHLCV_FILE = 'ohlcv.arrow'
+TIMELINE_SNAPSHOTS_FILE = 'snapshots.parquet'
+TIMELINE_POINTER_FILE = 'CURRENT'
+TIMELINE_KEEP_VERSIONS = 2  # La versión actual y la anterior (lectores perezosos que aún la usan)
+
+class LazyAnalysis(Mapping):
+    """bot_analysis de un snapshot guardado: se lee del disco en el primer acceso"""
+
+    def __init__(self, store: 'TimelineStore', position: int):
+        self._store = store
+        self._position = position
+        self._values = None
+
+    def _load(self) -> Dict:
+        if self._values is None:
+            self._values = self._store.load_analysis(self._position)
+        return self._values
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __reduce__(self):
+        # Al serializar se guarda el análisis ya cargado
+        return dict, (dict(self._load()),)
+
+class TimelineStore:
+    """
+    Timeline guardado en formato columnar y de carga perezosa
+
+        timeline_<tf>_<period>/
+            CURRENT                      nombre de la versión vigente
+            v<ns>-<pid>/
+                ohlcv.arrow              velas compartidas (Arrow IPC, memory-map)
+                snapshots.parquet        una fila por snapshot: posiciones y condiciones
+                analysis_<clave>.parquet filas no vacías de cada DataFrame de bot_analysis
+
+    Al abrir un timeline solo se leen snapshots.parquet y el mapa de las velas;
+    el análisis de cada snapshot se lee al acceder a su bot_analysis. Cada
+    guardado escribe una versión nueva y después sustituye CURRENT con
+    os.replace: un lector ve siempre la versión anterior o la nueva completa.
+    Los timelines sin CURRENT (formato anterior) tienen los ficheros en la raíz.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._current: Optional[str] = None
+        self._analysis_rows: Dict[str, Tuple[pd.DataFrame, Dict[int, np.ndarray]]] = {}
+        self._extras: Optional[pd.Series] = None
+
+    def _version_path(self) -> str:
+        """Directorio de la versión vigente (la raíz en el formato anterior)"""
+        try:
+            with open(os.path.join(self.path, TIMELINE_POINTER_FILE)) as f:
+                return os.path.join(self.path, f.read().strip())
+        except OSError:
+            return self.path
+
+    @property
+    def current_path(self) -> str:
+        """Versión que lee este store (se fija en la primera lectura)"""
+        if self._current is None:
+            self._current = self._version_path()
+        return self._current
+
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self._version_path(), TIMELINE_SNAPSHOTS_FILE))
+
+    def save(self, snapshots: List[HistoricalSnapshot]):
+        """
+        Guardar el timeline como versión nueva y publicarla de una vez (CURRENT)
+
+        Snapshots con frames distintos se guardan sobre un único frame con
+        sus posiciones desplazadas.
+        """
+        frames, offsets = [], {}
+        for snapshot in snapshots:
+            if id(snapshot.data) not in offsets:
+                offsets[id(snapshot.data)] = sum(len(frame) for frame in frames)
+                frames.append(snapshot.data)
+        data = pd.concat(frames, ignore_index=True) if len(frames) > 1 else (frames[0] if frames else pd.DataFrame())
+
+        rows, analysis_rows = [], {}
+        for position, snapshot in enumerate(snapshots):
+            offset = offsets[id(snapshot.data)]
+            extras, frame_meta = {}, {}
+            for key, value in dict(snapshot.bot_analysis).items():
+                if isinstance(value, pd.DataFrame) and value.index.equals(pd.RangeIndex(len(value))):
+                    # Solo las filas con algún valor (la mayoría de velas no tienen zona)
+                    sparse = value[value.notna().any(axis=1)]
+                    analysis_rows.setdefault(key, []).append(sparse.assign(_snapshot=position, _row=sparse.index))
+                    frame_meta[key] = {'length': len(value), 'columns': list(value.columns),
+                                       'dtypes': {col: str(dtype) for col, dtype in value.dtypes.items()}}
+                else:
+                    extras[key] = value
+            rows.append({
+                'timestamp': snapshot.timestamp,
+                'start': snapshot.start + offset,
+                'end': snapshot.end + offset,
+                'symbol': snapshot.symbol,
+                'timeframe': snapshot.timeframe,
+                'market_conditions': json.dumps(snapshot.market_conditions, default=str),
+                'signals': pickle.dumps(snapshot.signals),
+                'analysis': pickle.dumps({'values': extras, 'frames': frame_meta}),
+            })
+
+        version = f"v{time.time_ns():020d}-{os.getpid()}"
+        version_path = os.path.join(self.path, version)
+        tmp_path = f"{version_path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        with pa.ipc.new_file(os.path.join(tmp_path, TIMELINE_OHLCV_FILE), table.schema) as writer:
+            writer.write_table(table)
+        pd.DataFrame(rows).to_parquet(os.path.join(tmp_path, TIMELINE_SNAPSHOTS_FILE), index=False)
+        for key, parts in analysis_rows.items():
+            pd.concat(parts, ignore_index=True).to_parquet(os.path.join(tmp_path, f"analysis_{key}.parquet"), index=False)
+
+        os.replace(tmp_path, version_path)
+
+        # Publicar la versión: CURRENT se sustituye de una vez
+        pointer_path = os.path.join(self.path, TIMELINE_POINTER_FILE)
+        with open(f"{pointer_path}.tmp-{os.getpid()}", 'w') as f:
+            f.write(version)
+        os.replace(f"{pointer_path}.tmp-{os.getpid()}", pointer_path)
+        self._prune(version)
+
+    def _prune(self, current: str):
+        """Borrar las versiones antiguas (se conserva la anterior) y los ficheros del formato anterior"""
+        entries = sorted(os.listdir(self.path))
+        versions = [name for name in entries
+                    if name.startswith('v') and not name.endswith('.tmp') and name <= current
+                    and os.path.isdir(os.path.join(self.path, name))]
+        for name in versions[:-TIMELINE_KEEP_VERSIONS]:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        for name in entries:
+            if name == TIMELINE_OHLCV_FILE or (name.endswith('.parquet') and
+                                               (name == TIMELINE_SNAPSHOTS_FILE or name.startswith('analysis_'))):
+                os.remove(os.path.join(self.path, name))
+
+    def load(self) -> List[HistoricalSnapshot]:
+        """Snapshots del timeline (velas mapeadas, análisis perezoso)"""
+        from ohlcv_store import mapped_table
+        data = mapped_table(os.path.join(self.current_path, TIMELINE_OHLCV_FILE)).to_pandas(split_blocks=True)
+        table = pd.read_parquet(os.path.join(self.current_path, TIMELINE_SNAPSHOTS_FILE),
+                                columns=['timestamp', 'start', 'end', 'symbol', 'timeframe', 'market_conditions', 'signals'])
+        return [
+            HistoricalSnapshot(
+                timestamp=row.timestamp.to_pydatetime() if isinstance(row.timestamp, pd.Timestamp) else row.timestamp,
+                data=data,
+                start=int(row.start),
+                end=int(row.end),
+                bot_analysis=LazyAnalysis(self, position),
+                signals=pickle.loads(row.signals),
+                market_conditions=json.loads(row.market_conditions),
+                symbol=row.symbol,
+                timeframe=row.timeframe
+            )
+            for position, row in enumerate(table.itertuples(index=False))
+        ]
+
+    def load_analysis(self, position: int) -> Dict:
+        """bot_analysis del snapshot position, con sus DataFrames a tamaño completo"""
+        if self._extras is None:
+            self._extras = pd.read_parquet(os.path.join(self.current_path, TIMELINE_SNAPSHOTS_FILE), columns=['analysis'])['analysis']
+        stored = pickle.loads(self._extras.iloc[position])
+        analysis = dict(stored['values'])
+        for key, meta in stored['frames'].items():
+            rows, groups = self._frame_rows(key)
+            sparse = rows.iloc[groups.get(position, [])]
+            frame = sparse.set_index('_row').reindex(range(meta['length']))[meta['columns']]
+            frame.index = pd.RangeIndex(meta['length'])
+            for col, dtype in meta['dtypes'].items():
+                if str(frame[col].dtype) != dtype and not frame[col].isna().any():
+                    frame[col] = frame[col].astype(dtype)
+            analysis[key] = frame
+        return analysis
+
+    def _frame_rows(self, key: str) -> Tuple[pd.DataFrame, Dict[int, np.ndarray]]:
+        """Filas guardadas de una clave de bot_analysis (una lectura para todo el timeline)"""
+        if key not in self._analysis_rows:
+            rows = pd.read_parquet(os.path.join(self.current_path, f"analysis_{key}.parquet"))
+            self._analysis_rows[key] = (rows, rows.groupby('_snapshot').indices)
+        return self._analysis_rows[key]
+
+# ==================== AGREGADOS DEL TIMELINE ====================
+
+class TimelineAggregates:
+    """
+    Métricas de señales del timeline en columnas (una entrada por snapshot, en
+    orden temporal) y totales acumulados. Se actualizan al insertar cada
+    snapshot, así las gráficas y estadísticas no recorren las señales.
+    """
+
+    COLUMNS = ('total_signals', 'buy_signals', 'sell_signals', 'rr_sum', 'confidence_sum', 'price', 'volatility')
+
+    def __init__(self):
+        self.timestamps: List[datetime] = []
+        self.market_conditions: List[Dict] = []
+        self._columns: Dict[str, List[float]] = {name: [] for name in self.COLUMNS}
+        self._arrays: Dict[str, np.ndarray] = {}
+        self.total_signals = 0
+        self.buy_signals = 0
+        self.sell_signals = 0
+        self.rr_sum = 0.0
+        self.confidence_sum = 0.0
+        self.best_rr: Optional[float] = None
+        self.worst_rr: Optional[float] = None
+
+    @classmethod
+    def from_snapshots(cls, snapshots: List[HistoricalSnapshot]) -> 'TimelineAggregates':
+        """Agregados de una lista de snapshots ya ordenada"""
+        aggregates = cls()
+        for position, snapshot in enumerate(snapshots):
+            aggregates.insert(position, snapshot)
+        return aggregates
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def insert(self, position: int, snapshot: HistoricalSnapshot):
+        """
+        Añadir las métricas de un snapshot en la posición indicada
+
+        Args:
+            position: Posición del snapshot en el timeline
+            snapshot: Snapshot insertado
+        """
+        signals = snapshot.signals
+        rr_values = [signal.risk_reward for signal in signals]
+        confidence_values = [signal.confidence for signal in signals]
+        row = {
+            'total_signals': len(signals),
+            'buy_signals': sum(1 for signal in signals if signal.signal_type == SignalType.BUY),
+            'sell_signals': sum(1 for signal in signals if signal.signal_type == SignalType.SELL),
+            'rr_sum': sum(rr_values),
+            'confidence_sum': sum(confidence_values),
+            'price': snapshot.market_conditions.get('price', 0),
+            'volatility': snapshot.market_conditions.get('volatility', 0)
+        }
+        for name, value in row.items():
+            self._columns[name].insert(position, value)
+        self.timestamps.insert(position, snapshot.timestamp)
+        self.market_conditions.insert(position, snapshot.market_conditions)
+        self._arrays = {}
+
+        self.total_signals += row['total_signals']
+        self.buy_signals += row['buy_signals']
+        self.sell_signals += row['sell_signals']
+        self.rr_sum += row['rr_sum']
+        self.confidence_sum += row['confidence_sum']
+        if rr_values:
+            self.best_rr = max(rr_values) if self.best_rr is None else max(self.best_rr, *rr_values)
+            self.worst_rr = min(rr_values) if self.worst_rr is None else min(self.worst_rr, *rr_values)
+
+    def column(self, name: str) -> np.ndarray:
+        """Columna como array de solo lectura (se materializa una vez por cada cambio del timeline)"""
+        if name not in self._arrays:
+            dtype = np.int64 if name.endswith('_signals') else float
+            array = np.array(self._columns[name], dtype=dtype)
+            array.flags.writeable = False  # Compartido entre llamadas: nadie puede alterar la caché
+            self._arrays[name] = array
+        return self._arrays[name]
+
+    def average(self, name: str) -> np.ndarray:
+        """Media por snapshot de una columna *_sum (0 en snapshots sin señales)"""
+        counts = self.column('total_signals')
+        return np.divide(self.column(name), counts, out=np.zeros(len(counts)), where=counts > 0)
+
+class _SnapshotList(list):
+    """
+    Lista de snapshots que anota cualquier modificación hecha desde fuera
+
+    El manager reconstruye su índice temporal y los agregados al ver la marca,
+    también cuando se sustituye un elemento sin cambiar la longitud.
+    """
+
+    modified = False
+
+    def __reduce_ex__(self, protocol):
+        # Se guarda como lista normal (los pickles no dependen de esta clase)
+        return list, (list(self),)
+
+def _marks_modified(method):
+    def wrapper(self, *args, **kwargs):
+        self.modified = True
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+for _name in ('__setitem__', '__delitem__', '__iadd__', '__imul__', 'append', 'extend',
+              'insert', 'pop', 'remove', 'clear', 'sort', 'reverse'):
+    setattr(_SnapshotList, _name, _marks_modified(getattr(list, _name)))
+del _name
+
 class SMCHistoricalManager:
     """
     Gestor de histórico para el SMC Bot
@@ -52,7 +499,11 @@ class SMCHistoricalManager:
         self.symbol = symbol
         self.timeframe = timeframe
         self.cache_dir = "historical_cache"
-        self.snapshots: List[HistoricalSnapshot] = []
+        # Snapshots ordenados por timestamp y sus timestamps (ns UTC) para búsquedas binarias
+        self._snapshots: List[HistoricalSnapshot] = _SnapshotList()
+        self._snapshot_times: List[int] = []
+        # Métricas de señales por snapshot para las gráficas de evolución
+        self._aggregates = TimelineAggregates()
 
         # Crear directorio de cache si no existe
         try:
@@ -86,6 +537,83 @@ class SMCHistoricalManager:
             "1M": {"delta": timedelta(days=30), "limit": 100}
         }
 
+    # ==================== ÍNDICE TEMPORAL ====================
+
+    @property
+    def snapshots(self) -> List[HistoricalSnapshot]:
+        """Snapshots del timeline, ordenados por timestamp (se reordenan si se modificaron desde fuera)"""
+        self._times()
+        return self._snapshots
+
+    @snapshots.setter
+    def snapshots(self, snapshots: List[HistoricalSnapshot]):
+        self._snapshots = _SnapshotList(sorted(snapshots, key=lambda s: _utc_ns(s.timestamp)))
+        self._snapshot_times = [_utc_ns(s.timestamp) for s in self._snapshots]
+        self._aggregates = TimelineAggregates.from_snapshots(self._snapshots)
+
+    def _times(self) -> List[int]:
+        """Timestamps de los snapshots (se regeneran si la lista se modificó desde fuera)"""
+        if self._snapshots.modified or len(self._snapshot_times) != len(self._snapshots):
+            self.snapshots = self._snapshots
+        return self._snapshot_times
+
+    @property
+    def aggregates(self) -> TimelineAggregates:
+        """Métricas de señales del timeline, alineadas con self.snapshots"""
+        self._times()
+        return self._aggregates
+
+    def add_snapshot(self, snapshot: HistoricalSnapshot) -> int:
+        """
+        Insertar un snapshot manteniendo el orden temporal
+
+        Returns:
+            Posición en la que se insertó
+        """
+        times = self._times()
+        key = _utc_ns(snapshot.timestamp)
+        position = bisect.bisect_right(times, key)
+        times.insert(position, key)
+        list.insert(self._snapshots, position, snapshot)  # Sin marcar: el índice ya está al día
+        self._aggregates.insert(position, snapshot)
+        return position
+
+    def snapshot_position(self, target_time: datetime, side: str = 'left') -> int:
+        """
+        Posición de target_time en el timeline (bisect)
+
+        Args:
+            target_time: Tiempo objetivo
+            side: 'left' = primer snapshot con timestamp >= target_time,
+                'right' = primer snapshot con timestamp > target_time
+
+        Returns:
+            Índice en self.snapshots (len si todos son anteriores)
+        """
+        search = bisect.bisect_left if side == 'left' else bisect.bisect_right
+        return search(self._times(), _utc_ns(target_time))
+
+    def nearest_snapshot_index(self, target_time: datetime) -> Optional[int]:
+        """
+        Índice del snapshot más cercano a target_time (el primero en caso de empate)
+
+        Returns:
+            Índice o None si no hay snapshots
+        """
+        times = self._times()
+        if not times:
+            return None
+        key = _utc_ns(target_time)
+        position = bisect.bisect_left(times, key)
+        if position == len(times):
+            index = position - 1
+        elif position == 0 or times[position] - key < key - times[position - 1]:
+            index = position
+        else:
+            index = position - 1
+        # Primer snapshot con ese timestamp si hay repetidos
+        return bisect.bisect_left(times, times[index])
+
     def get_historical_data(self, period: HistoricalPeriod,
                           end_time: Optional[datetime] = None) -> pd.DataFrame:
         """
@@ -107,145 +635,200 @@ class SMCHistoricalManager:
         # print(f"📊 Obteniendo datos históricos desde {start_time} hasta {end_time}")
 
         try:
-            from fetch_data import get_ohlcv_full
-            # Descargar todas las velas necesarias para el rango
-            df = get_ohlcv_full(self.symbol, self.timeframe, since=start_time, until=end_time)
+            # Velas del rango a través de la caché OHLCV local
+            df = self._fetch_range(start_time, end_time)
             # print(f"   ✅ Obtenidos {len(df)} puntos de datos (full range)")
             return df
         except Exception as e:
             # print(f"   ❌ Error obteniendo datos históricos: {e}")
             return pd.DataFrame()
 
-    def create_historical_snapshot(self, target_time: datetime, period) -> Optional[HistoricalSnapshot]:
+    def _fetch_range(self, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+        """Velas de [start_time, end_time] desde la caché OHLCV local (descarga solo lo que falte)"""
+        from fetch_data import get_ohlcv_with_cache
+        return get_ohlcv_with_cache(self.symbol, self.timeframe, start_time, end_time)
+
+    def get_timeline_data(self, period, target_times: List[datetime]) -> Tuple[pd.DataFrame, np.ndarray]:
+        """
+        Datos de todos los snapshots de un timeline con una sola descarga
+
+        Se obtiene una vez la unión de los rangos [target - delta, target] y
+        la ventana de cada snapshot se localiza por posición (búsqueda binaria
+        sobre los timestamps), con las mismas velas que get_historical_data.
+
+        Args:
+            period: Período histórico de cada snapshot
+            target_times: Momentos objetivo de los snapshots
+
+        Returns:
+            Tupla (velas de la unión, array (n, 2) con [inicio, fin) de cada ventana)
+        """
+        bounds = np.zeros((len(target_times), 2), dtype=np.int64)
+        if not target_times:
+            return pd.DataFrame(), bounds
+        delta = self.period_configs[period]["delta"]
+        try:
+            data = self._fetch_range(min(target_times) - delta, max(target_times))
+        except Exception as e:
+            data = pd.DataFrame()
+        if data.empty:
+            return data, bounds
+
+        timestamps = pd.DatetimeIndex(data['timestamp']).as_unit('ns').asi8
+        ends = np.array([_utc_ns(target_time) for target_time in target_times])
+        starts = np.array([_utc_ns(target_time - delta) for target_time in target_times])
+        bounds[:, 0] = np.searchsorted(timestamps, starts, side='left')
+        bounds[:, 1] = np.searchsorted(timestamps, ends, side='right')
+        return data, bounds
+
+    def create_historical_snapshot(self, target_time: datetime, period,
+                                   df: Optional[pd.DataFrame] = None) -> Optional[HistoricalSnapshot]:
         """
         Crear un snapshot histórico para un momento específico y período
 
         Args:
             target_time: Momento objetivo
             period: Período histórico a usar para el snapshot
+            df: Velas de la ventana; si no se indican se obtienen con
+                get_historical_data
 
         Returns:
             Snapshot histórico o None si hay error
         """
         try:
             # Obtener datos hasta el momento objetivo usando el período correcto
-            df = self.get_historical_data(period, target_time)
-
-            min_required = 10  # Mínimo de velas para considerar válido el snapshot
-            if df.empty or len(df) < min_required:
-                # print(f"❌ No hay suficientes datos para {target_time} (obtenidos: {len(df)})")
-                # Intentar buscar el dato más cercano anterior si el rango está vacío
-                if not df.empty:
-                    # Buscar el último dato anterior al rango
-                    last_row = df.iloc[[-1]]
-                    # print(f"   ⚠️ Usando último dato disponible anterior para snapshot: {last_row['timestamp'].values[0]}")
-                    df = last_row
-                else:
-                    return None
+            if df is None:
+                df = self.get_historical_data(period, target_time)
+
+            bounds = _snapshot_bounds(0, len(df))
+            if bounds is None:
+                return None
+            start, end = bounds
 
             # Realizar análisis SMC para ese momento
             # print(f"🤖 Analizando condiciones del mercado en {target_time}")
-            bot_analysis = get_smc_bot_analysis(df)
-
-            # Extraer señales
-            signals = bot_analysis.get('signals', [])
-
-            # Analizar condiciones del mercado
-            market_conditions = self._analyze_market_conditions(df, bot_analysis)
-
-            # Crear snapshot
-            snapshot = HistoricalSnapshot(
-                timestamp=target_time,
-                df=df,
-                bot_analysis=bot_analysis,
-                signals=signals,
-                market_conditions=market_conditions,
-                symbol=self.symbol,
-                timeframe=self.timeframe
-            )
-
-            # print(f"   ✅ Snapshot creado con {len(signals)} señales")
-
-            # Debug print block removed to avoid empty if/else blocks
-
-            return snapshot
+            bot_analysis, market_conditions = analyze_snapshot_window(df.iloc[start:end])
+            return self._build_snapshot(target_time, df, start, end, bot_analysis, market_conditions)
 
         except Exception as e:
             # print(f"   ❌ Error creando snapshot: {e}")
             return None
 
-    def _analyze_market_conditions(self, df: pd.DataFrame, bot_analysis: Dict) -> Dict:
+    def _build_snapshot(self, target_time: datetime, data: pd.DataFrame, start: int, end: int,
+                        bot_analysis: Dict, market_conditions: Dict) -> HistoricalSnapshot:
+        """Snapshot a partir de la posición de su ventana en data y su análisis"""
+        return HistoricalSnapshot(
+            timestamp=target_time,
+            data=data,
+            start=start,
+            end=end,
+            bot_analysis=bot_analysis,
+            signals=bot_analysis.get('signals', []),
+            market_conditions=market_conditions,
+            symbol=self.symbol,
+            timeframe=self.timeframe
+        )
+
+    def stream_timeline_snapshots(self, period, target_times: List[datetime],
+                                  max_workers: Optional[int] = None) -> Iterator[HistoricalSnapshot]:
         """
-        Analizar condiciones del mercado
+        Analizar los snapshots de un timeline y devolverlos según terminan
+
+        Las velas se descargan una vez (get_timeline_data) y se comparten con
+        un pool de procesos en memoria compartida; cada worker analiza su
+        ventana por posición. Con max_workers=1 se analiza en el proceso actual.
 
         Args:
-            df: DataFrame con datos OHLC
-            bot_analysis: Análisis del bot
+            period: Período histórico de cada snapshot
+            target_times: Momentos objetivo
+            max_workers: Procesos del pool (None = hasta MAX_SNAPSHOT_WORKERS)
 
-        Returns:
-            Diccionario con condiciones del mercado
+        Yields:
+            Snapshots en orden de finalización (no necesariamente temporal)
         """
-        if df.empty:
-            return {}
+        for snapshot, _ in self._timeline_results(period, target_times, max_workers):
+            if snapshot is not None:
+                yield snapshot
 
-        # Precio y movimiento
-        current_price = df['close'].iloc[-1]
-        prev_price = df['close'].iloc[-2] if len(df) > 1 else current_price
-        price_change = ((current_price - prev_price) / prev_price) * 100
-
-        # Volatilidad
-        volatility = df['close'].pct_change().std() * 100
-
-        # Rango del día
-        daily_range = ((df['high'].max() - df['low'].min()) / current_price) * 100
+    def _timeline_results(self, period, target_times: List[datetime],
+                          max_workers: Optional[int] = None) -> Iterator[Tuple[Optional[HistoricalSnapshot], int]]:
+        """
+        Resultado de cada ventana con velas según termina (ver stream_timeline_snapshots)
 
-        # Tendencia
-        trend = bot_analysis.get('trend', 'UNKNOWN')
+        Yields:
+            (snapshot o None si el análisis falló, ventanas con velas a analizar)
+        """
+        data, bounds = self.get_timeline_data(period, target_times)
+        jobs = {}
+        for position, (target_time, (start, end)) in enumerate(zip(target_times, bounds)):
+            window = _snapshot_bounds(int(start), int(end))
+            if window is not None:
+                jobs[position] = (target_time, *window)
+
+        total = len(jobs)
+        if max_workers == 1 or total <= 1:
+            for target_time, start, end in jobs.values():
+                result = _analyze_window(data, start, end)
+                yield (self._build_snapshot(target_time, data, start, end, *result) if result is not None else None), total
+            return
+
+        from smc_optimizer import SharedOHLC
+        workers = max_workers or min(MAX_SNAPSHOT_WORKERS, os.cpu_count() or 1)
+        with SharedOHLC(data) as shared:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(SNAPSHOT_POOL_CONTEXT),
+                                     initializer=_init_snapshot_worker, initargs=(shared.handle,)) as executor:
+                futures = {executor.submit(_analyze_shared_window, start, end): position
+                           for position, (_, start, end) in jobs.items()}
+                for future in as_completed(futures):
+                    result = future.result()
+                    target_time, start, end = jobs[futures[future]]
+                    yield (self._build_snapshot(target_time, data, start, end, *result) if result is not None else None), total
+
+    def build_timeline(self, period, target_times: List[datetime], max_workers: Optional[int] = None,
+                       on_snapshot: Optional[Callable[[HistoricalSnapshot, int, int], None]] = None) -> List[HistoricalSnapshot]:
+        """
+        Construir self.snapshots (ordenado por timestamp) a partir de los momentos objetivo
 
-        # Análisis de volumen (si está disponible)
-        volume_analysis = "N/A"
-        if 'volume' in df.columns:
-            avg_volume = df['volume'].mean()
-            current_volume = df['volume'].iloc[-1]
-            volume_ratio = current_volume / avg_volume if avg_volume > 0 else 1
+        Args:
+            period: Período histórico de cada snapshot
+            target_times: Momentos objetivo
+            max_workers: Procesos del pool (1 = sin paralelismo)
+            on_snapshot: Callback (snapshot, completados, total) al terminar cada
+                snapshot, para ir mostrando el progreso en la UI. total son las
+                ventanas con velas (las vacías no se analizan) y completados
+                cuenta también las que fallaron.
 
-            if volume_ratio > 1.5:
-                volume_analysis = "Alto"
-            elif volume_ratio < 0.5:
-                volume_analysis = "Bajo"
-            else:
-                volume_analysis = "Normal"
+        Returns:
+            Lista de snapshots ordenada por timestamp
+        """
+        self.snapshots = []
+        for completed, (snapshot, total) in enumerate(self._timeline_results(period, target_times, max_workers), 1):
+            if snapshot is None:
+                continue
+            self.add_snapshot(snapshot)
+            if on_snapshot:
+                on_snapshot(snapshot, completed, total)
+        return self.snapshots
 
-        return {
-            'price': current_price,
-            'price_change': price_change,
-            'volatility': volatility,
-            'daily_range': daily_range,
-            'trend': trend.value if hasattr(trend, 'value') else str(trend),
-            'volume_analysis': volume_analysis,
-            'smc_elements': {
-                'liquidity_zones': len(bot_analysis.get('liquidity_zones', [])),
-                'order_blocks': len(bot_analysis.get('order_blocks', [])),
-                'fvg_zones': len(bot_analysis.get('fvg_zones', [])),
-                'sweeps': len(bot_analysis.get('sweeps', [])),
-                'choch_bos': len(bot_analysis.get('choch_bos', []))
-            }
-        }
+    def _analyze_market_conditions(self, df: pd.DataFrame, bot_analysis: Dict) -> Dict:
+        """Analizar condiciones del mercado (ver analyze_market_conditions)"""
+        return analyze_market_conditions(df, bot_analysis)
 
     def generate_historical_timeline(self, period: HistoricalPeriod,
-                                   intervals: int = 10) -> List[HistoricalSnapshot]:
+                                   intervals: int = 10, max_workers: Optional[int] = None,
+                                   on_snapshot: Optional[Callable[[HistoricalSnapshot, int, int], None]] = None) -> List[HistoricalSnapshot]:
         """
         Generar timeline histórico con múltiples snapshots
 
         Args:
             period: Período histórico total
             intervals: Número de intervalos a generar
+            max_workers: Procesos para analizar los snapshots (1 = sin paralelismo)
+            on_snapshot: Callback (snapshot, completados, total) según terminan
 
         Returns:
             Lista de snapshots históricos
         """
-        snapshots = []
-
         # Calcular intervalos de tiempo
         total_delta = self.period_configs[period]["delta"]
         interval_delta = total_delta / intervals
@@ -255,31 +838,25 @@ class SMCHistoricalManager:
         period_str = period.value if hasattr(period, 'value') else str(period)
         # print(f"📅 Generando timeline histórico para {period_str} con {intervals} intervalos")
 
-        for i in range(intervals):
-            target_time = end_time - (interval_delta * i)
-
-            # print(f"   📊 Procesando intervalo {i+1}/{intervals} - {target_time}")
-
-            snapshot = self.create_historical_snapshot(target_time, period)
-            if snapshot:
-                snapshots.append(snapshot)
+        target_times = [end_time - (interval_delta * i) for i in range(intervals)]
 
-        # Ordenar por timestamp
-        snapshots.sort(key=lambda x: x.timestamp)
-
-        self.snapshots = snapshots
+        # Snapshots analizados en paralelo; self.snapshots queda ordenado por timestamp
+        snapshots = self.build_timeline(period, target_times, max_workers, on_snapshot)
         # print(f"   ✅ Timeline generado con {len(snapshots)} snapshots")
 
         return snapshots
 
     def create_detailed_historical_timeline(self, period: HistoricalPeriod,
-                                          intervals: int = 20) -> List[HistoricalSnapshot]:
+                                          intervals: int = 20, max_workers: Optional[int] = None,
+                                          on_snapshot: Optional[Callable[[HistoricalSnapshot, int, int], None]] = None) -> List[HistoricalSnapshot]:
         """
         Crear timeline histórico detallado con más puntos de datos
 
         Args:
             period: Período histórico
             intervals: Número de intervalos (puntos temporales)
+            max_workers: Procesos para analizar los snapshots (1 = sin paralelismo)
+            on_snapshot: Callback (snapshot, completados, total) según terminan
 
         Returns:
             Lista de snapshots históricos
@@ -299,16 +876,10 @@ class SMCHistoricalManager:
         time_delta = config["delta"] / intervals
 
         # Crear timeline
-        timeline = []
-
-        for i in range(intervals + 1):
-            target_time = start_time + (time_delta * i)
-            snapshot = self.create_historical_snapshot(target_time, period)
-            if snapshot:
-                timeline.append(snapshot)
+        target_times = [start_time + (time_delta * i) for i in range(intervals + 1)]
 
-        # Guardar timeline
-        self.snapshots = timeline
+        # Snapshots analizados en paralelo; self.snapshots queda ordenado por timestamp
+        timeline = self.build_timeline(period, target_times, max_workers, on_snapshot)
 
         # Guardar en cache
         self.save_timeline_to_cache(period, timeline)
@@ -329,25 +900,28 @@ class SMCHistoricalManager:
             symbol_dir = os.path.join(self.cache_dir, self.symbol.replace('/', '_'))
             os.makedirs(symbol_dir, exist_ok=True)
 
-            period_str = period.value if hasattr(period, 'value') else str(period)
-            cache_file = os.path.join(
-                symbol_dir,
-                f"timeline_{self.timeframe}_{period_str}.pkl"
-            )
-
-            with open(cache_file, 'wb') as f:
-                pickle.dump(timeline, f)
+            # Formato columnar: velas una sola vez y posiciones por snapshot
+            self._timeline_store(period).save(timeline)
 
-            # print(f"💾 Timeline guardado en cache: {cache_file}")
+            # print(f"💾 Timeline guardado en cache: {self._timeline_store(period).path}")
 
         except Exception as e:
             # print(f"❌ Error guardando timeline en cache: {e}")
             pass
 
+    def _timeline_store(self, period: HistoricalPeriod) -> TimelineStore:
+        """Timeline en disco de un período"""
+        symbol_dir = os.path.join(self.cache_dir, self.symbol.replace('/', '_'))
+        period_str = period.value if hasattr(period, 'value') else str(period)
+        return TimelineStore(os.path.join(symbol_dir, f"timeline_{self.timeframe}_{period_str}"))
+
     def load_timeline_from_cache(self, period: HistoricalPeriod) -> Optional[List[HistoricalSnapshot]]:
         """
         Cargar timeline desde cache
 
+        Las velas se mapean desde disco y el análisis de cada snapshot se lee
+        al acceder a su bot_analysis.
+
         Args:
             period: Período histórico
 
@@ -355,13 +929,12 @@ class SMCHistoricalManager:
             Lista de snapshots o None si no existe
         """
         try:
-            symbol_dir = os.path.join(self.cache_dir, self.symbol.replace('/', '_'))
-            period_str = period.value if hasattr(period, 'value') else str(period)
-            cache_file = os.path.join(
-                symbol_dir,
-                f"timeline_{self.timeframe}_{period_str}.pkl"
-            )
+            store = self._timeline_store(period)
+            if store.exists():
+                return store.load()
 
+            # Timelines guardados con el formato anterior (lista pickle)
+            cache_file = f"{store.path}.pkl"
             if os.path.exists(cache_file):
                 with open(cache_file, 'rb') as f:
                     timeline = pickle.load(f)
@@ -462,20 +1035,9 @@ class SMCHistoricalManager:
         Returns:
             Snapshot más cercano o None
         """
-        if not self.snapshots:
-            return None
-
-        # Encontrar snapshot más cercano
-        closest_snapshot = None
-        min_diff = float('inf')
-
-        for snapshot in self.snapshots:
-            diff = abs((snapshot.timestamp - target_time).total_seconds())
-            if diff < min_diff:
-                min_diff = diff
-                closest_snapshot = snapshot
-
-        return closest_snapshot
+        # Búsqueda binaria sobre los timestamps ordenados
+        index = self.nearest_snapshot_index(target_time)
+        return self.snapshots[index] if index is not None else None
 
     def get_snapshots_in_range(self, start_time: datetime,
                               end_time: datetime) -> List[HistoricalSnapshot]:
@@ -492,52 +1054,35 @@ class SMCHistoricalManager:
         if not self.snapshots:
             return []
 
-        return [snapshot for snapshot in self.snapshots
-                if start_time <= snapshot.timestamp <= end_time]
+        first = self.snapshot_position(start_time, 'left')
+        last = self.snapshot_position(end_time, 'right')
+        return self.snapshots[first:last]
 
     def get_signals_evolution(self) -> Dict:
         """
         Obtener evolución de señales a lo largo del tiempo
 
+        Las series salen de los agregados del timeline (arrays por snapshot),
+        sin recorrer las señales. Las listas son copias y los arrays de solo
+        lectura, así el llamador no puede desalinear los agregados.
+
         Returns:
             Diccionario con evolución de señales
         """
         if not self.snapshots:
             return {}
 
-        evolution = {
-            'timestamps': [],
-            'total_signals': [],
-            'buy_signals': [],
-            'sell_signals': [],
-            'avg_rr': [],
-            'avg_confidence': [],
-            'market_conditions': []
+        aggregates = self.aggregates
+        return {
+            'timestamps': list(aggregates.timestamps),
+            'total_signals': aggregates.column('total_signals'),
+            'buy_signals': aggregates.column('buy_signals'),
+            'sell_signals': aggregates.column('sell_signals'),
+            'avg_rr': aggregates.average('rr_sum'),
+            'avg_confidence': aggregates.average('confidence_sum'),
+            'market_conditions': list(aggregates.market_conditions)
         }
 
-        for snapshot in self.snapshots:
-            evolution['timestamps'].append(snapshot.timestamp)
-            evolution['total_signals'].append(len(snapshot.signals))
-
-            buy_count = len([s for s in snapshot.signals if s.signal_type == SignalType.BUY])
-            sell_count = len([s for s in snapshot.signals if s.signal_type == SignalType.SELL])
-
-            evolution['buy_signals'].append(buy_count)
-            evolution['sell_signals'].append(sell_count)
-
-            if snapshot.signals:
-                avg_rr = sum(s.risk_reward for s in snapshot.signals) / len(snapshot.signals)
-                avg_conf = sum(s.confidence for s in snapshot.signals) / len(snapshot.signals)
-                evolution['avg_rr'].append(avg_rr)
-                evolution['avg_confidence'].append(avg_conf)
-            else:
-                evolution['avg_rr'].append(0)
-                evolution['avg_confidence'].append(0)
-
-            evolution['market_conditions'].append(snapshot.market_conditions)
-
-        return evolution
-
     def get_signal_statistics(self) -> Dict:
         """
         Obtener estadísticas de señales históricas
@@ -548,33 +1093,15 @@ class SMCHistoricalManager:
         if not self.snapshots:
             return {}
 
-        total_signals = 0
-        buy_signals = 0
-        sell_signals = 0
-        total_rr = 0
-        total_confidence = 0
-
-        for snapshot in self.snapshots:
-            total_signals += len(snapshot.signals)
-
-            for signal in snapshot.signals:
-                if signal.signal_type == SignalType.BUY:
-                    buy_signals += 1
-                elif signal.signal_type == SignalType.SELL:
-                    sell_signals += 1
-
-                total_rr += signal.risk_reward
-                total_confidence += signal.confidence
-
-        avg_rr = total_rr / max(total_signals, 1)
-        avg_confidence = total_confidence / max(total_signals, 1)
+        aggregates = self.aggregates
+        total_signals = aggregates.total_signals
 
         return {
             'total_signals': total_signals,
-            'buy_signals': buy_signals,
-            'sell_signals': sell_signals,
-            'avg_rr': avg_rr,
-            'avg_confidence': avg_confidence,
+            'buy_signals': aggregates.buy_signals,
+            'sell_signals': aggregates.sell_signals,
+            'avg_rr': aggregates.rr_sum / max(total_signals, 1),
+            'avg_confidence': aggregates.confidence_sum / max(total_signals, 1),
             'snapshots_count': len(self.snapshots),
             'timespan': {
                 'start': self.snapshots[0].timestamp,
@@ -597,12 +1124,15 @@ def create_historical_manager(symbol: str, timeframe: str) -> SMCHistoricalManag
     """
     return SMCHistoricalManager(symbol, timeframe)
 
-def analyze_historical_performance(snapshots: List[HistoricalSnapshot]) -> Dict:
+def analyze_historical_performance(snapshots: List[HistoricalSnapshot],
+                                   aggregates: Optional[TimelineAggregates] = None) -> Dict:
     """
     Analizar rendimiento histórico de señales
 
     Args:
         snapshots: Lista de snapshots históricos
+        aggregates: Agregados ya calculados de esos snapshots (manager.aggregates);
+            si no se pasan se calculan aquí
 
     Returns:
         Análisis de rendimiento
@@ -610,32 +1140,19 @@ def analyze_historical_performance(snapshots: List[HistoricalSnapshot]) -> Dict:
     if not snapshots:
         return {}
 
-    total_signals = 0
-    total_buy = 0
-    total_sell = 0
-    rr_values = []
-    confidence_values = []
-
-    for snapshot in snapshots:
-        total_signals += len(snapshot.signals)
-
-        for signal in snapshot.signals:
-            if signal.signal_type == SignalType.BUY:
-                total_buy += 1
-            else:
-                total_sell += 1
-
-            rr_values.append(signal.risk_reward)
-            confidence_values.append(signal.confidence)
+    if aggregates is None or len(aggregates) != len(snapshots):
+        aggregates = TimelineAggregates.from_snapshots(snapshots)
+    total_signals = aggregates.total_signals
 
     analysis = {
         'total_signals': total_signals,
-        'buy_signals': total_buy,
-        'sell_signals': total_sell,
-        'avg_rr': np.mean(rr_values) if rr_values else 0,
-        'avg_confidence': np.mean(confidence_values) if confidence_values else 0,
-        'best_rr': max(rr_values) if rr_values else 0,
-        'worst_rr': min(rr_values) if rr_values else 0,
+        'buy_signals': aggregates.buy_signals,
+        # Todo lo que no es BUY cuenta como SELL
+        'sell_signals': total_signals - aggregates.buy_signals,
+        'avg_rr': aggregates.rr_sum / total_signals if total_signals else 0,
+        'avg_confidence': aggregates.confidence_sum / total_signals if total_signals else 0,
+        'best_rr': aggregates.best_rr if total_signals else 0,
+        'worst_rr': aggregates.worst_rr if total_signals else 0,
         'timespan': {
             'start': snapshots[0].timestamp,
             'end': snapshots[-1].timestamp,
@@ -657,7 +1174,7 @@ if __name__ == "__main__":
     timeline = manager.generate_historical_timeline(HistoricalPeriod.DAY_1, 5)
 
     # Analizar rendimiento
-    performance = analyze_historical_performance(timeline)
+    performance = analyze_historical_performance(timeline, manager.aggregates)
 
     # print("\n📊 Análisis de rendimiento histórico:")
     # print(f"   Total señales: {performance.get('total_signals', 0)}")
@@ -100,9 +100,9 @@ class HistoricalVisualizer:
             if len(self.manager.snapshots) > 1:
                 # Crear etiquetas para el slider
                 snapshot_labels = []
-                for i, snapshot in enumerate(self.manager.snapshots):
+                signal_counts = self.manager.aggregates.column('total_signals')
+                for snapshot, signals_count in zip(self.manager.snapshots, signal_counts):
                     timestamp_str = snapshot.timestamp.strftime('%m/%d %H:%M')
-                    signals_count = len(snapshot.signals)
                     snapshot_labels.append(f"{timestamp_str} ({signals_count}🎯)")
 
                 # Slider principal
@@ -241,15 +241,14 @@ class HistoricalVisualizer:
         markers["Final"] = total_snapshots - 1
 
         # Marcadores por señales (snapshots con más señales)
-        signal_counts = [(i, len(snapshot.signals))
-                        for i, snapshot in enumerate(self.manager.snapshots)]
-        signal_counts.sort(key=lambda x: x[1], reverse=True)
+        signal_counts = self.manager.aggregates.column('total_signals')
+        top = np.argsort(-signal_counts, kind='stable')[:2]
 
         # Añadir los 2 snapshots con más señales
-        if len(signal_counts) >= 2:
-            markers["🎯 Max Señales"] = signal_counts[0][0]
-            if signal_counts[1][1] > 0:
-                markers["🎯 2da Max"] = signal_counts[1][0]
+        if len(top) >= 2:
+            markers["🎯 Max Señales"] = int(top[0])
+            if signal_counts[top[1]] > 0:
+                markers["🎯 2da Max"] = int(top[1])
 
         return markers
 
@@ -269,17 +268,8 @@ class HistoricalVisualizer:
 
         target_time = current_snapshot.timestamp + delta
 
-        # Encontrar el snapshot más cercano al tiempo objetivo
-        closest_index = 0
-        min_diff = float('inf')
-
-        for i, snapshot in enumerate(self.manager.snapshots):
-            diff = abs((snapshot.timestamp - target_time).total_seconds())
-            if diff < min_diff:
-                min_diff = diff
-                closest_index = i
-
-        self.current_snapshot_index = closest_index
+        # Snapshot más cercano al tiempo objetivo (búsqueda binaria)
+        self.current_snapshot_index = self.manager.nearest_snapshot_index(target_time)
 
     def add_enhanced_historical_signals_to_chart(self, fig: go.Figure, snapshot: HistoricalSnapshot,
                                                show_future_signals: bool = False,
@@ -375,10 +365,9 @@ class HistoricalVisualizer:
             snapshot: Snapshot histórico
         """
         # Obtener snapshots previos para mostrar evolución
-        prev_snapshots = [s for s in self.manager.snapshots
-                         if s.timestamp <= snapshot.timestamp]
+        prev_count = self.manager.snapshot_position(snapshot.timestamp, 'right')
 
-        if len(prev_snapshots) <= 1:
+        if prev_count <= 1:
             return
 
         # Crear trazas para evolución de señales
@@ -387,7 +376,7 @@ class HistoricalVisualizer:
         sell_signals_x = []
         sell_signals_y = []
 
-        for prev_snapshot in prev_snapshots[-10:]:  # Últimos 10 snapshots
+        for prev_snapshot in self.manager.snapshots[max(0, prev_count - 10):prev_count]:  # Últimos 10 snapshots
             for signal in prev_snapshot.signals:
                 if hasattr(signal, 'timestamp') and hasattr(signal, 'price'):
                     if signal.signal_type == SignalType.BUY:
@@ -525,9 +514,10 @@ class HistoricalVisualizer:
         current_time = current_snapshot.timestamp
 
         # Obtener snapshots futuros
-        future_snapshots = [s for s in self.manager.snapshots if s.timestamp > current_time]
+        first_future = self.manager.snapshot_position(current_time, 'right')
+        future_snapshots = self.manager.snapshots[first_future:first_future + 5]
 
-        for i, future_snapshot in enumerate(future_snapshots[:5]):  # Máximo 5 señales futuras
+        for i, future_snapshot in enumerate(future_snapshots):  # Máximo 5 señales futuras
             for signal in future_snapshot.signals:
                 # Determinar timestamp de la señal
                 if hasattr(signal.timestamp, 'strftime'):
@@ -585,8 +575,8 @@ class HistoricalVisualizer:
             return
 
         # Crear línea de tiempo
-        timestamps = [s.timestamp for s in self.manager.snapshots]
-        signal_counts = [len(s.signals) for s in self.manager.snapshots]
+        timestamps = self.manager.aggregates.timestamps
+        signal_counts = self.manager.aggregates.column('total_signals')
 
         # Añadir puntos de timeline
         for i, (timestamp, count) in enumerate(zip(timestamps, signal_counts)):
@@ -735,7 +725,7 @@ class HistoricalVisualizer:
         fig = go.Figure()
 
         # Gráfico de confianza promedio
-        confidence_pct = [c * 100 for c in evolution['avg_confidence']]
+        confidence_pct = evolution['avg_confidence'] * 100
 
         fig.add_trace(go.Scatter(
             x=evolution['timestamps'],
@@ -778,9 +768,10 @@ class HistoricalVisualizer:
         if not self.manager.snapshots:
             return go.Figure()
 
-        timestamps = [s.timestamp for s in self.manager.snapshots]
-        prices = [s.market_conditions.get('price', 0) for s in self.manager.snapshots]
-        volatilities = [s.market_conditions.get('volatility', 0) for s in self.manager.snapshots]
+        aggregates = self.manager.aggregates
+        timestamps = aggregates.timestamps
+        prices = aggregates.column('price')
+        volatilities = aggregates.column('volatility')
 
         fig = go.Figure()
 
@@ -0,0 +1,642 @@
+#!/usr/bin/env python3
+"""
+SMC Bot Incremental - Actualización vela a vela
+===============================================
+
+Versión en streaming del bot SMC: en lugar de reconstruir swings, estructura,
+liquidez, Order Blocks y FVG sobre toda la ventana en cada refresco, mantiene
+el estado de los detectores y procesa solo la vela nueva.
+
+Estado mantenido entre velas:
+- Swings confirmados y ventana pendiente (las últimas 2 velas aún sin confirmar)
+- Estructura (HH/HL/LL/LH) y eventos CHoCH/BOS
+- Eventos CHoCH/BOS cuyo Order Block espera velas de impulso
+- FVG y Order Blocks abiertos (sin llenar / sin mitigar)
+- Pools de liquidez (equal highs/lows) sin barrer
+
+Tras procesar las mismas velas, el estado coincide con ``SMCBot.analyze_market``.
+"""
+
+import bisect
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from smc_advanced import (
+    SIGNAL_WINDOW, EqualLevelClusters, classify_structure_change, generate_trading_signals
+)
+from smc_bot import SMCBot, SMCConfig, StructureType, TrendDirection, trend_from_structure
+
+
+class _PriceIndex:
+    """
+    Elementos ordenados por precio con extracción por rango mediante bisect
+
+    Cada elemento guarda un número de secuencia para devolver los extraídos en
+    el orden en que se añadieron (el mismo orden que la lista original).
+    """
+
+    def __init__(self):
+        self._keys: List[float] = []
+        self._items: List[tuple] = []  # (secuencia, elemento), paralelo a _keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def insert(self, key: float, sequence: int, item):
+        """Insertar un elemento con su precio (los precios no finitos no se indexan)"""
+        if not np.isfinite(key):
+            return
+        pos = bisect.bisect_right(self._keys, key)
+        self._keys.insert(pos, key)
+        self._items.insert(pos, (sequence, item))
+
+    def remove(self, key: float, item) -> Optional[int]:
+        """Quitar un elemento (por identidad) y devolver su secuencia, o None si no está"""
+        pos = bisect.bisect_left(self._keys, key)
+        while pos < len(self._keys) and self._keys[pos] == key:
+            sequence, stored = self._items[pos]
+            if stored is item:
+                del self._keys[pos]
+                del self._items[pos]
+                return sequence
+            pos += 1
+        return None
+
+    def pop_range(self, lower: float, upper: float, inclusive: bool) -> List[tuple]:
+        """
+        Extraer los elementos con precio dentro de (lower, upper)
+
+        Args:
+            lower: Límite inferior
+            upper: Límite superior
+            inclusive: True para [lower, upper]
+
+        Returns:
+            Lista de (secuencia, elemento) extraídos
+        """
+        # Con límites NaN ninguna comparación se cumple: no hay elementos en el rango
+        if not (lower <= upper if inclusive else lower < upper):
+            return []
+        if inclusive:
+            start = bisect.bisect_left(self._keys, lower)
+            end = bisect.bisect_right(self._keys, upper)
+        else:
+            start = bisect.bisect_right(self._keys, lower)
+            end = bisect.bisect_left(self._keys, upper)
+        if start >= end:
+            return []
+        items = self._items[start:end]
+        del self._keys[start:end]
+        del self._items[start:end]
+        return items
+
+class IncrementalSMCBot(SMCBot):
+    """
+    SMC Bot que se actualiza con cada vela nueva y emite solo los eventos nuevos
+
+    Cada vela cuesta O(swing_length) para swings/estructura/FVG, más una
+    búsqueda bisect en las zonas abiertas y los pools sin barrer, ordenados
+    por precio: solo se revisan los que caen en el rango de la vela.
+    """
+
+    LEFT_BARS = 2          # Velas a la izquierda del swing (igual que detect_swings)
+    RIGHT_BARS = 2         # Velas a la derecha: retraso de confirmación
+    OB_LOOKBACK = 20       # Velas previas al evento donde buscar el OB
+    OB_IMPULSE_BARS = 10   # Velas posteriores al OB que validan el impulso
+    ATR_PERIOD = 14
+
+    def __init__(self, config: SMCConfig = None):
+        """
+        Inicializar el bot incremental
+
+        Args:
+            config: Configuración del bot
+        """
+        super().__init__(config)
+        self.reset()
+
+    def reset(self):
+        """Vaciar el historial y el estado de todos los detectores"""
+        # Historial de velas (listas: añadir es O(1))
+        self.timestamps: List[Any] = []
+        self.opens: List[float] = []
+        self.highs: List[float] = []
+        self.lows: List[float] = []
+        self.closes: List[float] = []
+        self.volumes: List[float] = []
+
+        # Estructura
+        self.swing_highs: List[tuple] = []   # (timestamp, precio)
+        self.swing_lows: List[tuple] = []
+        self.structure: List[Dict] = []
+        self._structure_positions: List[int] = []
+        self.choch_bos: List[Dict] = []
+        self.trend = TrendDirection.SIDEWAYS
+
+        # Liquidez
+        tolerance = self.config.equal_tolerance / 100
+        self._clusters = {
+            'high': EqualLevelClusters('equal_highs', tolerance),
+            'low': EqualLevelClusters('equal_lows', tolerance),
+        }
+        self.liquidity_zones: List[Dict] = []
+        self._zone_keys: List[tuple] = []    # (categoría, base) paralelo a liquidity_zones
+        self._zone_ids: set = set()
+        self.sweeps: List[Dict] = []
+        self._swept_ids: set = set()
+        # Pools sin barrer ordenados por precio: id(zona) -> precio indexado
+        self._unswept = {'equal_highs': _PriceIndex(), 'equal_lows': _PriceIndex()}
+        self._unswept_prices: Dict[int, float] = {}
+        self._pool_sequence = 0
+
+        # Zonas
+        self.order_blocks: List[Dict] = []
+        self.fvg_zones: List[Dict] = []
+        self.pending_events: deque = deque()  # (evento CHoCH/BOS, posición)
+        # Zonas sin mitigar/llenar: 'below' por top, 'above' por bottom respecto a la última vela
+        self._open_zones = {'below': _PriceIndex(), 'above': _PriceIndex()}
+        self._zone_sequence = 0
+        self._last_choch: List[Dict] = []
+
+        # Señales
+        self.signals: List[Any] = []
+        self._true_ranges: deque = deque(maxlen=self.ATR_PERIOD)
+
+        # Vistas tabulares (se materializan bajo demanda)
+        self.df = None
+        self.swings = None
+
+    # ==================== API PRINCIPAL ====================
+
+    def update(self, candle, timestamp=None) -> Dict[str, Any]:
+        """
+        Procesar una vela nueva (cerrada)
+
+        Args:
+            candle: dict o pd.Series con open/high/low/close (y opcionalmente volume)
+            timestamp: Marca temporal de la vela; por defecto candle['timestamp']
+                       o el nombre de la Series
+
+        Returns:
+            Diccionario con los eventos generados por esta vela
+        """
+        if timestamp is None:
+            if 'timestamp' in candle:
+                timestamp = candle['timestamp']
+            else:
+                timestamp = getattr(candle, 'name', len(self.timestamps))
+
+        self._append_candle(candle, timestamp)
+        p = len(self.timestamps) - 1
+
+        events = {
+            'timestamp': timestamp,
+            'swings': [],
+            'structure': [],
+            'choch_bos': [],
+            'liquidity_zones': [],
+            'sweeps': [],
+            'order_blocks': [],
+            'fvg_zones': [],
+            'mitigations': [],
+            'signals': [],
+        }
+
+        # 1. Zonas abiertas y pools tocados por esta vela (antes de añadir zonas nuevas)
+        self._check_open_zones(p, events)
+        self._check_sweeps(p, events)
+
+        # 2. Swing confirmado en la vela central de la ventana pendiente
+        self._confirm_swing(p, events)
+
+        # 3. Order Blocks pendientes de impulso
+        self._resolve_pending_events(p, events)
+
+        # 4. FVG formado por las 3 últimas velas
+        self._detect_fvg(p, events)
+
+        # 5. Señales solo cuando hay eventos que pueden completar un setup
+        if events['choch_bos'] or events['order_blocks'] or events['fvg_zones'] or events['sweeps']:
+            events['signals'] = self._generate_new_signals()
+
+        events['trend'] = self.trend.value
+        return events
+
+    def replay(self, df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+        """
+        Alimentar un histórico vela a vela devolviendo los eventos de cada una
+
+        Args:
+            df: DataFrame con datos OHLC; el índice se usa como timestamp
+
+        Returns:
+            Generador con el resultado de update() para cada vela
+        """
+        columns = [df[col].to_numpy() for col in ('open', 'high', 'low', 'close')]
+        volumes = df['volume'].to_numpy() if 'volume' in df.columns else np.zeros(len(df))
+        for timestamp, o, h, l, c, v in zip(df.index, *columns, volumes):
+            yield self.update({'open': o, 'high': h, 'low': l, 'close': c, 'volume': v}, timestamp)
+
+    def warm_up(self, df: pd.DataFrame) -> int:
+        """
+        Alimentar un histórico completo vela a vela (sin devolver eventos)
+
+        Args:
+            df: DataFrame con datos OHLC; el índice se usa como timestamp
+
+        Returns:
+            Número de velas procesadas
+        """
+        for _ in self.replay(df):
+            pass
+        return len(df)
+
+    def analyze_market(self, df: pd.DataFrame) -> Dict:
+        """
+        Análisis completo desde cero (equivalente a reset + warm_up)
+
+        Args:
+            df: DataFrame con datos OHLC
+
+        Returns:
+            Diccionario con el resumen del análisis
+        """
+        print("\n🔍 Iniciando análisis incremental de mercado...")
+        self.reset()
+        self.warm_up(df)
+        return self.summary()
+
+    def summary(self) -> Dict:
+        """Resumen del estado actual con las mismas claves que SMCBot.analyze_market"""
+        return {
+            'trend': self.trend.value,
+            'swings': len(self.swing_highs) + len(self.swing_lows),
+            'liquidity_zones': len(self.liquidity_zones),
+            'sweeps': len(self.sweeps),
+            'choch_bos': len(self.choch_bos),
+            'order_blocks': len(self.order_blocks),
+            'fvg_zones': len(self.fvg_zones),
+            'signals': len(self.signals),
+            'pending_order_blocks': len(self.pending_events)
+        }
+
+    def materialize(self) -> pd.DataFrame:
+        """
+        Construir self.df y self.swings con el formato del bot por lotes
+
+        Coste O(n): pensado para visualización o integración, no para cada vela.
+        """
+        self.df = pd.DataFrame({
+            'open': self.opens,
+            'high': self.highs,
+            'low': self.lows,
+            'close': self.closes,
+            'volume': self.volumes,
+        }, index=pd.Index(self.timestamps))
+
+        swings = pd.DataFrame(index=self.df.index)
+        swings['swing_high'] = False
+        swings['swing_low'] = False
+        swings['swing_high_price'] = np.nan
+        swings['swing_low_price'] = np.nan
+        for column, points in (('high', self.swing_highs), ('low', self.swing_lows)):
+            if points:
+                stamps = [ts for ts, _ in points]
+                swings.loc[stamps, f'swing_{column}'] = True
+                swings.loc[stamps, f'swing_{column}_price'] = [price for _, price in points]
+        self.swings = swings
+        return self.df
+
+    # ==================== ESTADO POR VELA ====================
+
+    def _append_candle(self, candle, timestamp):
+        """Añadir la vela al historial y actualizar el true range para el ATR"""
+        high = float(candle['high'])
+        low = float(candle['low'])
+        close = float(candle['close'])
+
+        if self.closes:
+            prev_close = self.closes[-1]
+            true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        else:
+            true_range = np.nan  # Igual que calculate_atr: sin cierre previo
+        self._true_ranges.append(true_range)
+
+        self.timestamps.append(timestamp)
+        self.opens.append(float(candle['open']))
+        self.highs.append(high)
+        self.lows.append(low)
+        self.closes.append(close)
+        self.volumes.append(float(candle['volume']) if 'volume' in candle else 0.0)
+
+    def _confirm_swing(self, p: int, events: Dict):
+        """Confirmar si la vela p - RIGHT_BARS es swing high/low"""
+        c = p - self.RIGHT_BARS
+        if c < self.LEFT_BARS:
+            return
+
+        neighbors = [c + offset for offset in range(-self.LEFT_BARS, self.RIGHT_BARS + 1) if offset]
+        high = self.highs[c]
+        low = self.lows[c]
+
+        # Misma semántica que el bucle original (comparaciones con NaN no descartan)
+        if not any(high <= self.highs[j] for j in neighbors):
+            self.swing_highs.append((self.timestamps[c], high))
+            events['swings'].append({'type': 'swing_high', 'price': high, 'timestamp': self.timestamps[c]})
+            self._add_structure_point('high', c, events)
+
+        if not any(low >= self.lows[j] for j in neighbors):
+            self.swing_lows.append((self.timestamps[c], low))
+            events['swings'].append({'type': 'swing_low', 'price': low, 'timestamp': self.timestamps[c]})
+            self._add_structure_point('low', c, events)
+
+    def _add_structure_point(self, category: str, c: int, events: Dict):
+        """Estructura, CHoCH/BOS y liquidez para un swing recién confirmado"""
+        points = self.swing_highs if category == 'high' else self.swing_lows
+        timestamp, price = points[-1]
+
+        clusters = self._clusters[category]
+        zone = clusters.add(timestamp, price)
+        if zone is not None:
+            rank = 0 if category == 'high' else 1  # Mismo orden que el bot por lotes
+            self._on_liquidity_zone(zone, (rank, clusters.last_base), c, events)
+
+        if len(points) < 2:
+            return
+
+        prev_price = points[-2][1]
+        if category == 'high':
+            structure_type = StructureType.HH if price > prev_price else StructureType.LH
+        else:
+            structure_type = StructureType.HL if price > prev_price else StructureType.LL
+
+        point = {
+            'type': structure_type,
+            'price': price,
+            'timestamp': timestamp,
+            'category': category
+        }
+        self.structure.append(point)
+        self._structure_positions.append(c)
+        events['structure'].append(point)
+        self.trend = trend_from_structure(self.structure)
+
+        # detect_choch_bos_advanced exige al menos 4 puntos y evalúa desde i=2
+        n_points = len(self.structure)
+        if n_points < 4:
+            return
+        first = 2 if n_points == 4 else n_points - 1
+        for i in range(first, n_points):
+            event = classify_structure_change(self.structure[i-2], self.structure[i-1], self.structure[i])
+            if event is not None:
+                self.choch_bos.append(event)
+                events['choch_bos'].append(event)
+                if event['type'] == 'CHoCH':
+                    self._last_choch = [event]
+                self.pending_events.append((event, self._structure_positions[i]))
+
+    # ==================== LIQUIDEZ ====================
+
+    def _on_liquidity_zone(self, zone: Dict, key: tuple, c: int, events: Dict):
+        """Registrar una zona creada o ampliada y buscar barridos desde su último swing"""
+        zone_id = id(zone)
+        if zone_id not in self._zone_ids:
+            self._zone_ids.add(zone_id)
+            pos = bisect.bisect_right(self._zone_keys, key)
+            self._zone_keys.insert(pos, key)
+            self.liquidity_zones.insert(pos, zone)
+        elif zone_id in self._swept_ids:
+            # Un swing nuevo mueve el nivel y reinicia la búsqueda de barrido
+            self._swept_ids.discard(zone_id)
+            self.sweeps = [sweep for sweep in self.sweeps if sweep['zone'] is not zone]
+        events['liquidity_zones'].append(zone)
+
+        # Reindexar el pool con su precio nuevo conservando su posición en el orden
+        sequence = None
+        if zone_id in self._unswept_prices:
+            sequence = self._unswept[zone['type']].remove(self._unswept_prices.pop(zone_id), zone)
+        if sequence is None:
+            sequence = self._pool_sequence
+            self._pool_sequence += 1
+
+        # Velas ya vistas posteriores al swing (ventana de confirmación)
+        for p in range(c + 1, len(self.timestamps)):
+            if self._is_swept(zone, p):
+                self._record_sweep(zone, p, events)
+                return
+
+        self._unswept_prices[zone_id] = zone['price']
+        self._unswept[zone['type']].insert(zone['price'], sequence, zone)
+
+    def _is_swept(self, zone: Dict, p: int) -> bool:
+        """Comprobar si la vela p barre el pool"""
+        if zone['type'] == 'equal_highs':
+            return self.highs[p] > zone['price'] and self.closes[p] < zone['price']
+        return self.lows[p] < zone['price'] and self.closes[p] > zone['price']
+
+    def _check_sweeps(self, p: int, events: Dict):
+        """Barridos de los pools sin barrer cuyo precio cae entre el cierre y la mecha de la vela p"""
+        if not self._unswept_prices:
+            return
+
+        high, low, close = self.highs[p], self.lows[p], self.closes[p]
+        swept = (self._unswept['equal_highs'].pop_range(close, high, inclusive=False) +
+                 self._unswept['equal_lows'].pop_range(low, close, inclusive=False))
+        for _, zone in sorted(swept, key=lambda item: item[0]):
+            del self._unswept_prices[id(zone)]
+            self._record_sweep(zone, p, events)
+
+    def _record_sweep(self, zone: Dict, p: int, events: Dict):
+        """Registrar el barrido del pool en la vela p"""
+        if zone['type'] == 'equal_highs':
+            sweep = {
+                'type': 'bullish_sweep',
+                'zone_price': zone['price'],
+                'sweep_high': self.highs[p],
+                'close_price': self.closes[p],
+                'timestamp': self.timestamps[p],
+                'zone': zone
+            }
+        else:
+            sweep = {
+                'type': 'bearish_sweep',
+                'zone_price': zone['price'],
+                'sweep_low': self.lows[p],
+                'close_price': self.closes[p],
+                'timestamp': self.timestamps[p],
+                'zone': zone
+            }
+        zone['swept'] = True
+        self._swept_ids.add(id(zone))
+        self.sweeps.append(sweep)
+        events['sweeps'].append(sweep)
+
+    # ==================== ORDER BLOCKS Y FVG ====================
+
+    def _resolve_pending_events(self, p: int, events: Dict):
+        """Resolver en orden los eventos CHoCH/BOS cuyo Order Block ya es definitivo"""
+        while self.pending_events:
+            event, end = self.pending_events[0]
+            decided, candidate = self._find_order_block(event, end, p)
+            if not decided:
+                return
+            self.pending_events.popleft()
+            if candidate is None:
+                continue
+
+            order_block = {
+                'type': 'bullish_ob' if event['direction'] == 'bullish' else 'bearish_ob',
+                'top': self.highs[candidate],
+                'bottom': self.lows[candidate],
+                'timestamp': self.timestamps[candidate],
+                'event_timestamp': event['timestamp'],
+                'mitigated': False,
+                'strength': 'high' if event['type'] == 'CHoCH' else 'medium'
+            }
+            self.order_blocks.append(order_block)
+            events['order_blocks'].append(order_block)
+            self._open_zone(order_block, 'mitigated', 'mitigation_timestamp', candidate, p, events)
+
+    def _find_order_block(self, event: Dict, end: int, p: int):
+        """
+        Última vela contraria con impulso del 0.5% en las OB_LOOKBACK velas previas
+
+        Returns:
+            (decidido, posición del OB o None). No está decidido mientras una
+            vela candidata más reciente espera sus velas de impulso.
+        """
+        begin = max(end - self.OB_LOOKBACK, 0)
+        if end - begin < 5:
+            return True, None
+
+        bullish = event['direction'] == 'bullish'
+        for i in range(end - 1, begin - 1, -1):
+            contrary = self.closes[i] < self.opens[i] if bullish else self.closes[i] > self.opens[i]
+            if not contrary:
+                continue
+
+            future_end = min(i + 1 + self.OB_IMPULSE_BARS, p + 1)
+            if future_end > i + 1:
+                if bullish:
+                    impulse = np.fmax.reduce(self.highs[i + 1:future_end]) > self.highs[i] * 1.005
+                else:
+                    impulse = np.fmin.reduce(self.lows[i + 1:future_end]) < self.lows[i] * 0.995
+                if impulse:
+                    return True, i
+            if i + self.OB_IMPULSE_BARS > p:
+                return False, None  # Faltan velas de impulso para esta candidata
+
+        return True, None
+
+    def _detect_fvg(self, p: int, events: Dict):
+        """FVG entre las velas p-2, p-1 y p"""
+        if p < 2:
+            return
+
+        high1, low1 = self.highs[p - 2], self.lows[p - 2]
+        close2 = np.float64(self.closes[p - 1])
+        high3, low3 = self.highs[p], self.lows[p]
+
+        fvg = None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if high1 < low3:
+                gap_size_pct = (low3 - high1) / close2 * 100
+                if gap_size_pct >= self.config.fvg_min_size:
+                    fvg = {'type': 'bullish_fvg', 'top': low3, 'bottom': high1}
+            elif low1 > high3:
+                gap_size_pct = (low1 - high3) / close2 * 100
+                if gap_size_pct >= self.config.fvg_min_size:
+                    fvg = {'type': 'bearish_fvg', 'top': low1, 'bottom': high3}
+
+        if fvg is None:
+            return
+
+        fvg.update({
+            'timestamp': self.timestamps[p],
+            'size_pct': gap_size_pct,
+            'filled': False,
+            'strength': 'high' if gap_size_pct > 0.2 else 'medium'
+        })
+        self.fvg_zones.append(fvg)
+        events['fvg_zones'].append(fvg)
+        self._open_zone(fvg, 'filled', 'fill_timestamp', p, p, events)
+
+    def _open_zone(self, zone: Dict, flag: str, time_key: str, origin: int, p: int, events: Dict):
+        """Buscar el toque en las velas ya vistas tras origin; si no hay, dejarla abierta"""
+        for j in range(origin + 1, p + 1):
+            if self.lows[j] <= zone['top'] and self.highs[j] >= zone['bottom']:
+                zone[flag] = True
+                zone[time_key] = self.timestamps[j]
+                events['mitigations'].append(zone)
+                return
+        self._index_open_zone((self._zone_sequence, (zone, flag, time_key)), self.highs[p])
+        self._zone_sequence += 1
+
+    def _index_open_zone(self, item: tuple, high: float):
+        """Guardar la zona en el lado 'above' si está por encima de la vela, si no en 'below'"""
+        zone = item[1][0]
+        if not (np.isfinite(zone['top']) and np.isfinite(zone['bottom'])):
+            return  # Con límites NaN la zona nunca se toca
+        if zone['bottom'] > high:
+            self._open_zones['above'].insert(zone['bottom'], *item)
+        else:
+            self._open_zones['below'].insert(zone['top'], *item)
+
+    def _check_open_zones(self, p: int, events: Dict):
+        """
+        Mitigar/llenar las zonas abiertas que toca la vela p
+
+        Solo pueden tocarse las zonas 'below' con top >= low y las 'above' con
+        bottom <= high; las candidatas no tocadas (la vela saltó por encima o
+        por debajo) se recolocan en el lado que les corresponde.
+        """
+        low, high = self.lows[p], self.highs[p]
+        if not (np.isfinite(low) and np.isfinite(high)):
+            return  # Comparaciones con NaN: ninguna zona se toca
+
+        candidates = (self._open_zones['below'].pop_range(low, np.inf, inclusive=True) +
+                      self._open_zones['above'].pop_range(-np.inf, high, inclusive=True))
+        for item in sorted(candidates, key=lambda item: item[0]):
+            zone, flag, time_key = item[1]
+            if low <= zone['top'] and high >= zone['bottom']:
+                zone[flag] = True
+                zone[time_key] = self.timestamps[p]
+                events['mitigations'].append(zone)
+            else:
+                self._index_open_zone(item, high)
+
+    # ==================== SEÑALES ====================
+
+    def _generate_new_signals(self) -> List[Any]:
+        """
+        Señales nuevas usando el mismo generador que SMCBot.generate_signals
+
+        El generador solo mira las últimas SIGNAL_WINDOW velas y si existen
+        zonas, barridos, CHoCH y OB/FVG, así que recibe esa ventana y el último
+        evento de cada tipo. Devuelve solo las señales posteriores a la última emitida.
+        """
+        try:
+            start = max(len(self.timestamps) - SIGNAL_WINDOW, 0)
+            window = pd.DataFrame({
+                'open': self.opens[start:],
+                'high': self.highs[start:],
+                'low': self.lows[start:],
+                'close': self.closes[start:],
+                'volume': self.volumes[start:],
+            }, index=pd.Index(self.timestamps[start:]))
+            current_atr = float(np.mean(self._true_ranges))
+            signals = generate_trading_signals(
+                window, self.liquidity_zones[-1:], self.sweeps[-1:], self._last_choch,
+                self.order_blocks[-1:], self.fvg_zones[-1:], current_atr, self.config
+            )
+        except Exception as e:
+            print(f"   ⚠️ Error en generación incremental de señales: {e}")
+            return []
+
+        last_time = self.signals[-1].timestamp if self.signals else None
+        new_signals = [s for s in signals if last_time is None or s.timestamp > last_time]
+        self.signals.extend(new_signals)
+        return new_signals
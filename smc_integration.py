@@ -16,6 +16,7 @@ import json
 
 # Importaciones locales
 import smc_analysis
+from smc_advanced import generate_trading_signals  # Generador de señales de SMCBot
 
 # Mejorar logging de liquidez en integración
 import logging
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Optimizador de parámetros SMC
+=============================
+
+Barrido de configuraciones (perfiles, grid o búsqueda aleatoria) que ejecuta
+IncrementalSMCBot + SMCBacktester.run_backtest para cada SMCConfig en
+paralelo. Las velas se comparten con los procesos a través de memoria
+compartida (sin enviar el DataFrame a cada tarea) y cada celda terminada se
+guarda en un checkpoint JSONL para poder reanudar un barrido interrumpido.
+"""
+
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, fields, replace
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from smc_backtester import SMCBacktester, to_backtest_signal
+from smc_bot import SMCConfig
+from smc_incremental import IncrementalSMCBot
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# ==================== DATOS COMPARTIDOS ====================
+
+@dataclass
+class SharedOHLCHandle:
+    """Referencia serializable a las velas en memoria compartida"""
+    values_name: str
+    timestamps_name: str
+    length: int
+    tz: Optional[str]
+
+class SharedOHLC:
+    """
+    Velas OHLCV en memoria compartida
+
+    El proceso principal crea los bloques una vez; los workers se conectan por
+    nombre y reconstruyen el DataFrame sin copiar ni deserializar los datos.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        """
+        Args:
+            df: DataFrame OHLCV con índice de timestamps o columna 'timestamp'
+        """
+        df = indexed_ohlcv(df)
+        values = df[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
+        timestamps = df.index.asi8
+
+        self._values_block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self._timestamps_block = shared_memory.SharedMemory(create=True, size=max(timestamps.nbytes, 1))
+        np.ndarray(values.shape, dtype=np.float64, buffer=self._values_block.buf)[:] = values
+        np.ndarray(timestamps.shape, dtype=np.int64, buffer=self._timestamps_block.buf)[:] = timestamps
+
+        self.handle = SharedOHLCHandle(
+            values_name=self._values_block.name,
+            timestamps_name=self._timestamps_block.name,
+            length=len(df),
+            tz=str(df.index.tz) if df.index.tz else None
+        )
+
+    def close(self):
+        """Liberar los bloques de memoria compartida"""
+        for block in (self._values_block, self._timestamps_block):
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    """Conectarse a un bloque existente sin registrarlo para borrado al salir"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+def attach_shared_ohlc(handle: SharedOHLCHandle) -> Tuple[pd.DataFrame, List[shared_memory.SharedMemory]]:
+    """
+    Reconstruir el DataFrame a partir de la memoria compartida
+
+    Returns:
+        Tupla (DataFrame indexado por timestamp, bloques abiertos que deben seguir vivos)
+    """
+    values_block = _attach_block(handle.values_name)
+    timestamps_block = _attach_block(handle.timestamps_name)
+    values = np.ndarray((handle.length, len(OHLCV_COLUMNS)), dtype=np.float64, buffer=values_block.buf)
+    timestamps = np.ndarray((handle.length,), dtype=np.int64, buffer=timestamps_block.buf)
+
+    index = pd.DatetimeIndex(timestamps.view('datetime64[ns]'), name='timestamp')
+    if handle.tz:
+        index = index.tz_localize('UTC').tz_convert(handle.tz)
+    df = pd.DataFrame(values, index=index, columns=OHLCV_COLUMNS, copy=False)
+    return df, [values_block, timestamps_block]
+
+def indexed_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """DataFrame OHLCV indexado por timestamp (acepta también columna 'timestamp')"""
+    if 'timestamp' in df.columns:
+        df = df.set_index('timestamp')
+    df = df.copy()
+    # Misma resolución que los timestamps en memoria compartida
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.index), name='timestamp').as_unit('ns')
+    if 'volume' not in df.columns:
+        df['volume'] = 0.0
+    return df
+
+# ==================== GENERACIÓN DE CONFIGURACIONES ====================
+
+def config_key(config: SMCConfig) -> str:
+    """Identificador estable de una configuración (para checkpoints)"""
+    payload = json.dumps(asdict(config), sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+def grid_configs(param_grid: Dict[str, List[Any]], base: Optional[SMCConfig] = None) -> List[SMCConfig]:
+    """
+    Producto cartesiano de valores de parámetros
+
+    Args:
+        param_grid: Parámetro de SMCConfig -> lista de valores
+        base: Configuración base para el resto de parámetros
+
+    Returns:
+        Lista de configuraciones
+    """
+    base = base or SMCConfig()
+    _check_params(param_grid)
+    names = list(param_grid)
+    return [replace(base, **dict(zip(names, values)))
+            for values in itertools.product(*(param_grid[name] for name in names))]
+
+def random_configs(param_space: Dict[str, Any], n_samples: int, base: Optional[SMCConfig] = None,
+                   seed: Optional[int] = None) -> List[SMCConfig]:
+    """
+    Muestreo aleatorio del espacio de parámetros
+
+    Args:
+        param_space: Parámetro -> lista de valores (elección) o tupla (mínimo, máximo)
+            (entero si ambos extremos son enteros, uniforme en otro caso)
+        n_samples: Número de configuraciones
+        base: Configuración base para el resto de parámetros
+        seed: Semilla para reproducir el muestreo
+
+    Returns:
+        Lista de configuraciones (sin duplicados)
+    """
+    base = base or SMCConfig()
+    _check_params(param_space)
+    rng = random.Random(seed)
+
+    configs, seen = [], set()
+    for _ in range(n_samples * 10):
+        if len(configs) == n_samples:
+            break
+        params = {}
+        for name, space in param_space.items():
+            if isinstance(space, tuple):
+                low, high = space
+                if isinstance(low, int) and isinstance(high, int):
+                    params[name] = rng.randint(low, high)
+                else:
+                    params[name] = round(rng.uniform(low, high), 6)
+            else:
+                params[name] = rng.choice(list(space))
+        config = replace(base, **params)
+        key = config_key(config)
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+def profile_configs() -> Dict[str, SMCConfig]:
+    """Todos los perfiles predefinidos (smc_profiles y smc_config)"""
+    from smc_config import get_config_by_profile
+    from smc_profiles import SMCProfiles
+
+    configs = {}
+    for name in ['conservative', 'aggressive', 'balanced', 'scalper', 'swing']:
+        configs[f'profile:{name}'] = SMCProfiles.get_profile(name)
+    for name in ['conservative', 'balanced', 'aggressive', 'scalping', 'swing_trading']:
+        configs[f'config:{name}'] = get_config_by_profile(name)
+    return configs
+
+def _check_params(params: Dict[str, Any]):
+    """Verificar que los parámetros existen en SMCConfig"""
+    valid = {f.name for f in fields(SMCConfig)}
+    unknown = set(params) - valid
+    if unknown:
+        raise ValueError(f"Parámetros desconocidos en SMCConfig: {sorted(unknown)}")
+
+# ==================== EVALUACIÓN ====================
+
+def evaluate_config(df: pd.DataFrame, config: SMCConfig, initial_capital: float = 10000,
+                    max_trade_duration: int = 48, timeframe: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Analizar el mercado y hacer backtesting de una configuración
+
+    Las señales salen de un IncrementalSMCBot que recorre el histórico vela a
+    vela (SMCBot.analyze_market solo evalúa las últimas velas); cada señal
+    entra a la apertura de la vela siguiente a la que la emite, aunque se haya
+    originado en una vela anterior.
+
+    Args:
+        df: DataFrame OHLCV indexado por timestamp
+        config: Configuración a evaluar
+        initial_capital: Capital inicial del backtest
+        max_trade_duration: Máximo de horas por trade
+        timeframe: Timeframe de df (si no, se infiere de los timestamps)
+
+    Returns:
+        Diccionario con métricas del análisis y del backtest
+    """
+    start = time.perf_counter()
+
+    # Los detectores imprimen su progreso: silenciarlo dentro del barrido
+    with contextlib.redirect_stdout(io.StringIO()):
+        bot = IncrementalSMCBot(config)
+        emitted = []  # (posición de la vela de emisión, señal)
+        for position, events in enumerate(bot.replay(df)):
+            emitted.extend((position, signal) for signal in events['signals'])
+        analysis = bot.summary()
+        opens = df['open'].to_numpy()
+        signals = [to_backtest_signal(signal, df.index[position + 1], float(opens[position + 1]))
+                   for position, signal in emitted if position + 1 < len(df)]
+
+        backtester = SMCBacktester(initial_capital, config.risk_per_trade)
+        results = backtester.run_backtest(df.reset_index(), signals,
+                                          max_trade_duration=max_trade_duration, timeframe=timeframe)
+
+    return {
+        'signals': len(signals),
+        'order_blocks': analysis['order_blocks'],
+        'fvg_zones': analysis['fvg_zones'],
+        'liquidity_zones': analysis['liquidity_zones'],
+        'total_trades': results.total_trades,
+        'win_rate': results.win_rate,
+        'profit_factor': results.profit_factor,
+        'total_pnl': results.total_pnl,
+        'total_return': results.total_return,
+        'max_drawdown_percent': results.max_drawdown_percent,
+        'sharpe_ratio': results.sharpe_ratio,
+        'expectancy': results.expectancy,
+        'final_capital': results.final_capital,
+        'elapsed': time.perf_counter() - start
+    }
+
+# Estado de cada worker: DataFrame reconstruido una vez desde la memoria compartida
+_worker_df: Optional[pd.DataFrame] = None
+_worker_blocks: List[shared_memory.SharedMemory] = []
+
+def _init_worker(handle: SharedOHLCHandle):
+    """Inicializador del ProcessPoolExecutor"""
+    global _worker_df, _worker_blocks
+    _worker_df, _worker_blocks = attach_shared_ohlc(handle)
+
+def _run_cell(name: str, key: str, config_dict: Dict[str, Any], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Evaluar una celda del barrido dentro de un worker"""
+    row = {'name': name, 'config_key': key, **config_dict}
+    try:
+        row.update(evaluate_config(_worker_df, SMCConfig(**config_dict), **options))
+        row['error'] = None
+    except Exception as e:
+        row['error'] = str(e)
+    return row
+
+# ==================== BARRIDO ====================
+
+def checkpoint_header(df: pd.DataFrame, options: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cabecera de un checkpoint: huella de los datos y opciones del backtest
+
+    Args:
+        df: DataFrame OHLCV del barrido
+        options: initial_capital, max_trade_duration y timeframe
+
+    Returns:
+        Diccionario que se guarda como primera línea del JSONL
+    """
+    from smc_advanced import frame_version
+
+    bars, digest = frame_version(indexed_ohlcv(df)[OHLCV_COLUMNS])
+    # Normalizado como JSON para comparar con la cabecera leída del fichero
+    return json.loads(json.dumps({'checkpoint': {'bars': bars, 'data_version': str(digest), **options}},
+                                 default=str))
+
+def load_checkpoint(path: Optional[str], header: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Cargar las celdas ya evaluadas de un checkpoint JSONL
+
+    Args:
+        path: Fichero JSONL del checkpoint
+        header: Cabecera esperada (checkpoint_header); si el fichero tiene otra,
+            se rechaza en lugar de mezclar resultados de otros datos u opciones
+
+    Returns:
+        config_key -> fila de resultados
+    """
+    completed = {}
+    if not path or not os.path.exists(path):
+        return completed
+    with open(path, 'rb+') as f:
+        content = f.read()
+        # Descartar la última línea si quedó cortada por una interrupción
+        valid = content[:content.rfind(b'\n') + 1]
+        if len(valid) != len(content):
+            f.truncate(len(valid))
+    lines = [line for line in valid.decode().splitlines() if line.strip()]
+    if lines and header is not None and json.loads(lines[0]) != header:
+        raise ValueError(f"El checkpoint {path} se generó con otros datos u opciones de backtest")
+    for line in lines:
+        row = json.loads(line)
+        if 'config_key' in row and row.get('error') is None:
+            completed[row['config_key']] = row
+    return completed
+
+def run_parameter_sweep(df: pd.DataFrame, configs, max_workers: Optional[int] = None,
+                        checkpoint_path: Optional[str] = None, rank_by: str = 'total_return',
+                        initial_capital: float = 10000, max_trade_duration: int = 48,
+                        timeframe: Optional[str] = None) -> pd.DataFrame:
+    """
+    Evaluar muchas configuraciones en paralelo y ordenarlas por una métrica
+
+    Args:
+        df: DataFrame OHLCV (índice de timestamps o columna 'timestamp')
+        configs: Dict nombre -> SMCConfig o lista de SMCConfig
+        max_workers: Procesos del pool (0 o 1 = en el proceso actual)
+        checkpoint_path: Fichero JSONL donde se guarda cada celda terminada;
+            al relanzar el barrido las celdas ya guardadas no se recalculan. Un
+            checkpoint de otros datos u opciones lanza ValueError
+        rank_by: Métrica para ordenar (mayor es mejor)
+        initial_capital: Capital inicial de cada backtest
+        max_trade_duration: Máximo de horas por trade
+        timeframe: Timeframe de df (si no, se infiere de los timestamps)
+
+    Returns:
+        DataFrame con una fila por configuración, ordenado por rank_by
+    """
+    if not isinstance(configs, dict):
+        configs = {f'cell_{i:04d}': config for i, config in enumerate(configs)}
+
+    options = {'initial_capital': initial_capital, 'max_trade_duration': max_trade_duration,
+               'timeframe': timeframe}
+
+    header = checkpoint_header(df, options) if checkpoint_path else None
+    completed = load_checkpoint(checkpoint_path, header)
+    if checkpoint_path and (not os.path.exists(checkpoint_path) or os.path.getsize(checkpoint_path) == 0):
+        with open(checkpoint_path, 'w') as f:
+            f.write(json.dumps(header) + '\n')
+    cells = [(name, config_key(config)) for name, config in configs.items()]
+    # Configuraciones repetidas con distinto nombre se evalúan una sola vez
+    unique = {key: asdict(config) for (_, key), config in zip(cells, configs.values())}
+    pending = [key for key in unique if key not in completed]
+
+    print(f"🧪 Barrido de parámetros: {len(unique)} configuraciones "
+          f"({len(unique) - len(pending)} en checkpoint, {len(pending)} pendientes)")
+
+    results = {key: row for key, row in completed.items() if key in unique}
+
+    def record(row: Dict[str, Any]):
+        results[row['config_key']] = row
+        if checkpoint_path and row['error'] is None:
+            with open(checkpoint_path, 'a') as f:
+                f.write(json.dumps(row, default=str) + '\n')
+        status = f"❌ {row['error']}" if row['error'] else f"{rank_by}={row.get(rank_by)}"
+        print(f"   ✅ [{len(results)}/{len(unique)}] {row['name']}: {status}")
+
+    names = {}
+    for name, key in cells:
+        names.setdefault(key, name)
+
+    if pending and max_workers is not None and max_workers <= 1:
+        global _worker_df
+        _worker_df = indexed_ohlcv(df)
+        try:
+            for key in pending:
+                record(_run_cell(names[key], key, unique[key], options))
+        finally:
+            _worker_df = None
+    elif pending:
+        with SharedOHLC(df) as shared:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(shared.handle,)) as executor:
+                futures = [executor.submit(_run_cell, names[key], key, unique[key], options)
+                           for key in pending]
+                for future in as_completed(futures):
+                    record(future.result())
+
+    table = rank_results([{**results[key], 'name': name} for name, key in cells if key in results], rank_by)
+    if not table.empty and 'signals' in table and not table['signals'].fillna(0).any():
+        print("⚠️ Ninguna configuración generó señales: el ranking no es significativo")
+    return table
+
+def rank_results(rows: List[Dict[str, Any]], rank_by: str = 'total_return') -> pd.DataFrame:
+    """
+    Tabla de resultados ordenada por la métrica indicada (mayor es mejor)
+
+    Args:
+        rows: Filas de resultados del barrido
+        rank_by: Métrica para ordenar
+
+    Returns:
+        DataFrame con columna 'rank' (1 = mejor)
+    """
+    table = pd.DataFrame(rows)
+    if table.empty:
+        return table
+    table = table.sort_values(rank_by, ascending=False, na_position='last', kind='stable')
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table.reset_index(drop=True)
+
+def sweep_profiles(df: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """Evaluar todos los perfiles predefinidos (en lugar de solo imprimirlos)"""
+    return run_parameter_sweep(df, profile_configs(), **kwargs)
+
+if __name__ == "__main__":
+    from fetch_data import get_ohlcv
+
+    df = get_ohlcv("BTC/USDT", "15m", limit=1000)
+    table = sweep_profiles(df, checkpoint_path="sweep_profiles.jsonl")
+    columns = ['rank', 'name', 'total_trades', 'win_rate', 'total_return', 'max_drawdown_percent', 'sharpe_ratio']
+    print(table[columns].to_string(index=False))
@@ -7,6 +7,7 @@ Sistema de trading automático que implementa la estrategia TJR (Tom Joseph Ross
 con Smart Money Concepts para generar entradas, stop loss y take profit.
 """
 
+import bisect
 import pandas as pd
 import numpy as np
 from typing import Dict, List, Optional, Tuple, Any
@@ -62,11 +63,8 @@ class SMCTradeEngine:
         high = df['high'].iloc[-1]
         low = df['low'].iloc[-1]
         high_low_gap = high - low
-        high_low = df['high'] - df['low']
-        high_close = np.abs(df['high'] - df['close'].shift())
-        low_close = np.abs(df['low'] - df['close'].shift())
-        true_range = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-        atr = true_range.rolling(window=14).mean().iloc[-1]
+        from smc_advanced import INDICATOR_CACHE
+        atr = INDICATOR_CACHE.atr(df, 14).iloc[-1]
         gap_threshold = atr * 3
         if high_low_gap > gap_threshold:
             print(f"[GAP][WARN] Gap extremo detectado (gap={high_low_gap:.2f}, ATR={atr:.2f}) - Generando señales conservadoras")
@@ -119,62 +117,93 @@ class SMCTradeEngine:
                 swings_data = smc_analysis['swing_highs_lows']
 
                 if not swings_data.empty and 'HighLow' in swings_data.columns:
-                    # Detectar equal highs/lows
-                    highs = []
-                    lows = []
-
-                    for idx, row in swings_data.iterrows():
-                        if pd.notna(row['HighLow']):
-                            if row['HighLow'] == 1:  # Swing high
-                                highs.append({'index': idx, 'level': row['Level']})
-                            elif row['HighLow'] == -1:  # Swing low
-                                lows.append({'index': idx, 'level': row['Level']})
-
-                    # Buscar equal highs swept
-                    for i in range(len(highs) - 1):
-                        for j in range(i + 1, len(highs)):
-                            high1 = highs[i]
-                            high2 = highs[j]
-
-                            # Si son niveles similares (equal highs)
-                            if abs(high1['level'] - high2['level']) / high1['level'] < 0.002:  # 0.2% tolerance
-                                # Verificar si fue swept (precio fue arriba)
-                                max_idx = max(high1['index'], high2['index'])
-                                if max_idx < len(df) - 1:
-                                    subsequent_high = df['high'].iloc[max_idx + 1:].max()
-                                    if subsequent_high > max(high1['level'], high2['level']):
-                                        sweeps.append({
-                                            'type': 'high_sweep',
-                                            'level': max(high1['level'], high2['level']),
-                                            'index': max_idx,
-                                            'timestamp': df.index[max_idx] if max_idx < len(df) else df.index[-1]
-                                        })
-
-                    # Buscar equal lows swept
-                    for i in range(len(lows) - 1):
-                        for j in range(i + 1, len(lows)):
-                            low1 = lows[i]
-                            low2 = lows[j]
-
-                            # Si son niveles similares (equal lows)
-                            if abs(low1['level'] - low2['level']) / low1['level'] < 0.002:  # 0.2% tolerance
-                                # Verificar si fue swept (precio fue abajo)
-                                max_idx = max(low1['index'], low2['index'])
-                                if max_idx < len(df) - 1:
-                                    subsequent_low = df['low'].iloc[max_idx + 1:].min()
-                                    if subsequent_low < min(low1['level'], low2['level']):
-                                        sweeps.append({
-                                            'type': 'low_sweep',
-                                            'level': min(low1['level'], low2['level']),
-                                            'index': max_idx,
-                                            'timestamp': df.index[max_idx] if max_idx < len(df) else df.index[-1]
-                                        })
+                    high_low = swings_data['HighLow'].to_numpy()
+                    levels = swings_data['Level'].to_numpy(dtype=float)
+                    indices = swings_data.index.to_numpy()
+                    is_high = high_low == 1   # Swing high
+                    is_low = high_low == -1   # Swing low
+
+                    # Máximo/mínimo desde cada vela hasta el final, calculado una sola vez
+                    future_high = np.fmax.accumulate(df['high'].to_numpy(dtype=float)[::-1])[::-1]
+                    future_low = np.fmin.accumulate(df['low'].to_numpy(dtype=float)[::-1])[::-1]
+
+                    # Buscar equal highs swept (precio fue arriba)
+                    sweeps.extend(self._equal_level_sweeps(
+                        df, indices[is_high], levels[is_high], future_high, 'high_sweep'))
+
+                    # Buscar equal lows swept (precio fue abajo)
+                    sweeps.extend(self._equal_level_sweeps(
+                        df, indices[is_low], levels[is_low], future_low, 'low_sweep'))
 
         except Exception as e:
             print(f"Error detectando sweeps: {e}")
 
         return sweeps
 
+    def _equal_level_sweeps(self, df: pd.DataFrame, indices: np.ndarray, levels: np.ndarray,
+                            future_extreme: np.ndarray, sweep_type: str,
+                            tolerance: float = 0.002) -> List[Dict]:
+        """
+        Pares de niveles iguales (equal highs o equal lows) barridos por el precio posterior
+
+        Los niveles se ordenan una vez y cada swing solo se compara con los de su
+        ventana de tolerancia (búsqueda binaria), en el mismo orden de pares (i, j)
+        que la comparación de todos contra todos.
+
+        Args:
+            df: DataFrame con datos OHLC
+            indices: Posición de cada swing en df
+            levels: Precio de cada swing
+            future_extreme: Máximo (high_sweep) o mínimo (low_sweep) desde cada vela hasta el final
+            sweep_type: 'high_sweep' o 'low_sweep'
+            tolerance: Diferencia relativa máxima entre niveles (0.2%)
+
+        Returns:
+            Lista con sweeps detectados
+        """
+        sweeps = []
+        n = len(df)
+        is_high = sweep_type == 'high_sweep'
+
+        order = np.argsort(levels, kind='stable')
+        sorted_levels = levels[order]
+
+        # Ventana |l1 - l2| < tolerance * l1, ampliada para no perder empates por redondeo
+        margin = np.abs(levels) * (tolerance + 1e-9)
+        lower = np.searchsorted(sorted_levels, levels - margin, side='left')
+        upper = np.searchsorted(sorted_levels, levels + margin, side='right')
+
+        for i in range(len(levels)):
+            level1 = levels[i]
+            candidates = order[lower[i]:upper[i]]
+            for j in np.sort(candidates[candidates > i]):
+                level2 = levels[j]
+
+                # Si son niveles similares (equal highs/lows)
+                if not abs(level1 - level2) / level1 < tolerance:
+                    continue
+
+                max_idx = max(indices[i], indices[j])
+                if max_idx >= n - 1:
+                    continue
+
+                if is_high:
+                    level = max(level1, level2)
+                    swept = future_extreme[max_idx + 1] > level
+                else:
+                    level = min(level1, level2)
+                    swept = future_extreme[max_idx + 1] < level
+
+                if swept:
+                    sweeps.append({
+                        'type': sweep_type,
+                        'level': level,
+                        'index': int(max_idx),
+                        'timestamp': df.index[max_idx]
+                    })
+
+        return sweeps
+
     def _detect_structure_breaks(self, df: pd.DataFrame, smc_analysis: Dict) -> List[Dict]:
         """Detectar CHoCH/BOS confirmados"""
         breaks = []
@@ -250,64 +279,45 @@ class SMCTradeEngine:
 
     def _detect_candle_confirmations(self, df: pd.DataFrame) -> List[Dict]:
         """Detectar patrones de confirmación de vela"""
+        from smc_advanced import candle_pattern_table
+
         confirmations = []
 
         try:
-            for i in range(1, len(df)):
-                current = df.iloc[i]
-                previous = df.iloc[i-1]
-
-                # Engulfing bullish
-                if (current['close'] > current['open'] and  # Vela verde
-                    previous['close'] < previous['open'] and  # Vela roja anterior
-                    current['open'] < previous['close'] and  # Abre por debajo del cierre anterior
-                    current['close'] > previous['open']):    # Cierra por encima de apertura anterior
-
-                    confirmations.append({
-                        'type': ConfirmationType.ENGULFING,
-                        'direction': 'bullish',
-                        'index': i,
-                        'timestamp': df.index[i],
-                        'strength': self._calculate_engulfing_strength(current, previous)
-                    })
-
-                # Engulfing bearish
-                elif (current['close'] < current['open'] and  # Vela roja
-                      previous['close'] > previous['open'] and  # Vela verde anterior
-                      current['open'] > previous['close'] and  # Abre por encima del cierre anterior
-                      current['close'] < previous['open']):    # Cierra por debajo de apertura anterior
-
+            patterns = candle_pattern_table(df)
+
+            # Engulfing y mechas de rechazo de todas las velas (la primera no tiene anterior)
+            engulfing_bullish = patterns['bullish_engulfing_strict'].to_numpy()
+            engulfing_bearish = patterns['bearish_engulfing_strict'].to_numpy() & ~engulfing_bullish
+            rejection_bearish = patterns['upper_rejection'].to_numpy()
+            rejection_bullish = patterns['lower_rejection'].to_numpy() & ~rejection_bearish
+            engulfing_strength = patterns['engulfing_strength'].to_numpy()
+            body_size = patterns['body_size'].to_numpy()
+            upper_wick = patterns['upper_wick'].to_numpy()
+            lower_wick = patterns['lower_wick'].to_numpy()
+
+            candidates = engulfing_bullish | engulfing_bearish | rejection_bearish | rejection_bullish
+            candidates[:1] = False
+
+            for i in map(int, np.flatnonzero(candidates)):
+                if engulfing_bullish[i] or engulfing_bearish[i]:
                     confirmations.append({
                         'type': ConfirmationType.ENGULFING,
-                        'direction': 'bearish',
-                        'index': i,
-                        'timestamp': df.index[i],
-                        'strength': self._calculate_engulfing_strength(current, previous)
-                    })
-
-                # Rejection wick
-                body_size = abs(current['close'] - current['open'])
-                upper_wick = current['high'] - max(current['open'], current['close'])
-                lower_wick = min(current['open'], current['close']) - current['low']
-
-                # Upper rejection (bearish)
-                if upper_wick > body_size * 2 and upper_wick > lower_wick * 2:
-                    confirmations.append({
-                        'type': ConfirmationType.REJECTION_WICK,
-                        'direction': 'bearish',
+                        'direction': 'bullish' if engulfing_bullish[i] else 'bearish',
                         'index': i,
                         'timestamp': df.index[i],
-                        'strength': upper_wick / body_size if body_size > 0 else 5
+                        'strength': engulfing_strength[i]
                     })
 
-                # Lower rejection (bullish)
-                elif lower_wick > body_size * 2 and lower_wick > upper_wick * 2:
+                # Upper rejection (bearish) / Lower rejection (bullish)
+                if rejection_bearish[i] or rejection_bullish[i]:
+                    wick = upper_wick[i] if rejection_bearish[i] else lower_wick[i]
                     confirmations.append({
                         'type': ConfirmationType.REJECTION_WICK,
-                        'direction': 'bullish',
+                        'direction': 'bearish' if rejection_bearish[i] else 'bullish',
                         'index': i,
                         'timestamp': df.index[i],
-                        'strength': lower_wick / body_size if body_size > 0 else 5
+                        'strength': wick / body_size[i] if body_size[i] > 0 else 5
                     })
 
         except Exception as e:
@@ -315,85 +325,73 @@ class SMCTradeEngine:
 
         return confirmations
 
-    def _calculate_engulfing_strength(self, current: pd.Series, previous: pd.Series) -> float:
-        """Calcular la fuerza de un patrón engulfing"""
-        try:
-            current_body = abs(current['close'] - current['open'])
-            previous_body = abs(previous['close'] - previous['open'])
-
-            if previous_body > 0:
-                return current_body / previous_body
-            return 1.0
-        except:
-            return 1.0
-
     def _generate_trade_signals(self, df: pd.DataFrame, sweeps: List[Dict],
                                breaks: List[Dict], zones: List[Dict],
                                confirmations: List[Dict]) -> List[TradeSignal]:
-        """Generar señales de trading combinando todas las condiciones TJR"""
+        """
+        Generar señales de trading combinando todas las condiciones TJR
+
+        Unión ordenada por tiempo: cada sweep con un CHoCH/BOS posterior se
+        combina con la primera zona OB/FVG posterior que contiene el precio
+        actual y con la primera confirmación posterior a esa zona (búsqueda
+        binaria sobre timestamps ordenados), en lugar de combinar todos los
+        eventos entre sí.
+        """
         signals = []
 
         try:
             current_price = df['close'].iloc[-1]
-            current_time = df.index[-1]
-
-            # Buscar setups LONG
-            for sweep in sweeps:
-                if sweep['type'] == 'low_sweep':  # Liquidez baja tomada (bullish setup)
-
-                    # Buscar CHoCH/BOS bullish después del sweep
-                    for structure_break in breaks:
-                        if (structure_break['timestamp'] > sweep['timestamp'] and
-                            structure_break['type'] in ['BOS', 'CHOCH']):
-
-                            # Buscar OB/FVG relevante
-                            for zone in zones:
-                                if (zone['timestamp'] > sweep['timestamp'] and
-                                    zone['bottom'] <= current_price <= zone['top'] and
-                                    not zone['mitigated']):
-
-                                    # Buscar confirmación de vela bullish
-                                    for confirmation in confirmations:
-                                        if (confirmation['timestamp'] > zone['timestamp'] and
-                                            confirmation['direction'] == 'bullish' and
-                                            confirmation['strength'] >= 1.2):
-
-                                            # ¡SETUP COMPLETO! Calcular entrada
-                                            signal = self._calculate_long_entry(
-                                                df, sweep, zone, confirmation, current_price
-                                            )
-
-                                            if signal and signal.risk_reward >= self.min_rr:
-                                                signals.append(signal)
-
-            # Buscar setups SHORT
-            for sweep in sweeps:
-                if sweep['type'] == 'high_sweep':  # Liquidez alta tomada (bearish setup)
-
-                    # Buscar CHoCH/BOS bearish después del sweep
-                    for structure_break in breaks:
-                        if (structure_break['timestamp'] > sweep['timestamp'] and
-                            structure_break['type'] in ['BOS', 'CHOCH']):
-
-                            # Buscar OB/FVG relevante
-                            for zone in zones:
-                                if (zone['timestamp'] > sweep['timestamp'] and
-                                    zone['bottom'] <= current_price <= zone['top'] and
-                                    not zone['mitigated']):
-
-                                    # Buscar confirmación de vela bearish
-                                    for confirmation in confirmations:
-                                        if (confirmation['timestamp'] > zone['timestamp'] and
-                                            confirmation['direction'] == 'bearish' and
-                                            confirmation['strength'] >= 1.2):
-
-                                            # ¡SETUP COMPLETO! Calcular entrada
-                                            signal = self._calculate_short_entry(
-                                                df, sweep, zone, confirmation, current_price
-                                            )
-
-                                            if signal and signal.risk_reward >= self.min_rr:
-                                                signals.append(signal)
+
+            # CHoCH/BOS ordenados por tiempo
+            break_times = sorted(b['timestamp'] for b in breaks if b['type'] in ['BOS', 'CHOCH'])
+
+            # OB/FVG que contienen el precio actual y siguen sin mitigar
+            active_zones = sorted(
+                (zone for zone in zones
+                 if zone['bottom'] <= current_price <= zone['top'] and not zone['mitigated']),
+                key=lambda zone: zone['timestamp']
+            )
+            zone_times = [zone['timestamp'] for zone in active_zones]
+
+            # Confirmaciones con fuerza suficiente, por dirección
+            confirmed = {}
+            for direction in ('bullish', 'bearish'):
+                confirmed[direction] = sorted(
+                    (c for c in confirmations if c['direction'] == direction and c['strength'] >= 1.2),
+                    key=lambda c: c['timestamp']
+                )
+            confirmation_times = {d: [c['timestamp'] for c in cs] for d, cs in confirmed.items()}
+
+            # LONG tras tomar liquidez baja, SHORT tras tomar liquidez alta
+            setups = [('low_sweep', 'bullish', self._calculate_long_entry),
+                      ('high_sweep', 'bearish', self._calculate_short_entry)]
+
+            for sweep_type, direction, calculate_entry in setups:
+                for sweep in sweeps:
+                    if sweep['type'] != sweep_type:
+                        continue
+
+                    # CHoCH/BOS después del sweep
+                    if bisect.bisect_right(break_times, sweep['timestamp']) == len(break_times):
+                        continue
+
+                    # Primer OB/FVG relevante después del sweep
+                    z = bisect.bisect_right(zone_times, sweep['timestamp'])
+                    if z == len(active_zones):
+                        continue
+                    zone = active_zones[z]
+
+                    # Primera confirmación de vela después de la zona
+                    c = bisect.bisect_right(confirmation_times[direction], zone['timestamp'])
+                    if c == len(confirmed[direction]):
+                        continue
+                    confirmation = confirmed[direction][c]
+
+                    # ¡SETUP COMPLETO! Calcular entrada
+                    signal = calculate_entry(df, sweep, zone, confirmation, current_price)
+
+                    if signal and signal.risk_reward >= self.min_rr:
+                        signals.append(signal)
 
         except Exception as e:
             print(f"Error generando señales: {e}")
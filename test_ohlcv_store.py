@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Tests del almacén OHLCV particionado
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ohlcv_store import (
+    OHLCVStore, clear_mapped_tables, find_gaps, plan_fetch_ranges, subtract_ranges
+)
+from test_smc_bot import make_ohlc
+
+
+def make_bars(start, periods, freq='1h', seed=41):
+    """Velas con columna 'timestamp' (como las devuelve fetch_data)"""
+    df = make_ohlc(n=periods, seed=seed)
+    df.index = pd.date_range(start, periods=periods, freq=freq, tz='UTC')
+    return df.rename_axis('timestamp').reset_index()
+
+
+def load_fetch_data(monkeypatch, cache_dir):
+    """fetch_data con los proveedores y streamlit sustituidos por módulos vacíos"""
+    for name in ('ccxt', 'yfinance', 'streamlit'):
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    monkeypatch.delitem(sys.modules, 'fetch_data', raising=False)
+    fetch_data = importlib.import_module('fetch_data')
+    monkeypatch.setattr(fetch_data, 'CACHE_DIR', str(cache_dir))
+    return fetch_data
+
+
+def test_store_partitions_and_range_reads(tmp_path):
+    """Particiones mensuales, manifest y lecturas que solo abren los meses necesarios"""
+    store = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    bars = make_bars('2024-01-20', 24 * 60)
+    assert store.append(bars) == len(bars)
+
+    assert sorted(store.partitions) == ['2024-01', '2024-02', '2024-03']
+    assert store.coverage() == (bars['timestamp'].iloc[0], bars['timestamp'].iloc[-1])
+
+    reloaded = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    assert len(reloaded) == len(bars)
+    assert reloaded.partitions_for_range('2024-02-03', '2024-02-05') == ['2024-02']
+
+    window = reloaded.read('2024-02-03', '2024-02-05')
+    expected = bars[(bars['timestamp'] >= '2024-02-03') & (bars['timestamp'] <= '2024-02-05')]
+    pd.testing.assert_frame_equal(window, expected.reset_index(drop=True), check_dtype=False)
+    pd.testing.assert_frame_equal(reloaded.read(), bars, check_dtype=False)
+
+
+def test_store_writes_only_new_bars(tmp_path):
+    """Sin velas nuevas no se toca el disco; con velas nuevas solo se reescribe su mes"""
+    store = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    bars = make_bars('2024-01-20', 24 * 30)
+    store.append(bars)
+    files = {name: os.stat(os.path.join(store.path, name)).st_mtime_ns for name in os.listdir(store.path)}
+
+    assert store.append(bars.iloc[-50:]) == 0
+    assert {name: os.stat(os.path.join(store.path, name)).st_mtime_ns for name in os.listdir(store.path)} == files
+
+    more = make_bars(bars['timestamp'].iloc[-1] + pd.Timedelta(hours=1), 10, seed=42)
+    assert store.append(pd.concat([bars.iloc[-5:], more])) == 10
+    assert os.stat(os.path.join(store.path, '2024-01.parquet')).st_mtime_ns == files['2024-01.parquet']
+    assert len(store) == len(bars) + 10
+    assert not [name for name in os.listdir(store.path) if '.tmp-' in name]
+
+
+def test_store_serializes_concurrent_writers(tmp_path):
+    """Varias instancias escribiendo el mismo almacén a la vez no pierden velas ni entradas del manifest"""
+    bars = make_bars('2024-01-01', 24 * 60)
+    # Trozos intercalados: todos los escritores reescriben los mismos meses
+    chunks = [bars.iloc[offset::6] for offset in range(6)]
+
+    def write(chunk):
+        return OHLCVStore('BTC/USDT', '1h', str(tmp_path)).append(chunk)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        added = list(pool.map(write, chunks))
+
+    assert sum(added) == len(bars)
+    store = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    assert len(store) == len(bars)
+    pd.testing.assert_series_equal(store.read()['close'], bars['close'], check_names=False)
+    assert os.path.exists(store.lock_path)
+    assert not [name for name in os.listdir(store.path) if '.tmp-' in name]
+
+
+def test_store_migrates_legacy_file_and_rebuilds_manifest(tmp_path):
+    """El parquet único anterior se importa una vez y el manifest se regenera si se pierde"""
+    bars = make_bars('2024-03-25', 24 * 14)
+    legacy = bars.assign(timestamp=bars['timestamp'].dt.tz_localize(None))
+    legacy.to_parquet(tmp_path / 'ETH_USDT_1h.parquet', index=False)
+
+    store = OHLCVStore('ETH/USDT', '1h', str(tmp_path))
+    pd.testing.assert_frame_equal(store.read(), bars, check_dtype=False)
+    assert sorted(store.partitions) == ['2024-03', '2024-04']
+
+    os.remove(store.manifest_path)
+    rebuilt = OHLCVStore('ETH/USDT', '1h', str(tmp_path))
+    assert rebuilt.partitions == store.partitions
+
+
+def test_store_reads_share_mapped_arrow_pages(tmp_path):
+    """Las lecturas reutilizan la tabla mapeada del proceso y se remapean tras una escritura"""
+    store = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    bars = make_bars('2024-01-01', 24 * 20)
+    store.append(bars)
+
+    first = OHLCVStore('BTC/USDT', '1h', str(tmp_path)).read('2024-01-05', '2024-01-10')
+    second = OHLCVStore('BTC/USDT', '1h', str(tmp_path)).read('2024-01-03', '2024-01-12')
+    assert not first['close'].to_numpy().flags.owndata
+    assert np.shares_memory(first['close'].to_numpy(), second['close'].to_numpy())
+
+    more = make_bars(bars['timestamp'].iloc[-1] + pd.Timedelta(hours=1), 5, seed=43)
+    store.append(more)
+    updated = OHLCVStore('BTC/USDT', '1h', str(tmp_path)).read('2024-01-05')
+    assert len(updated) == len(bars) + 5 - 24 * 4
+    assert not np.shares_memory(first['close'].to_numpy(), updated['close'].to_numpy())
+
+    # Sin la copia .arrow (caché antigua) se regenera desde el parquet
+    clear_mapped_tables()
+    os.remove(os.path.join(store.path, '2024-01.arrow'))
+    pd.testing.assert_frame_equal(OHLCVStore('BTC/USDT', '1h', str(tmp_path)).read(), pd.concat([bars, more], ignore_index=True),
+                                  check_dtype=False)
+
+
+def test_cached_ohlcv_shares_mapped_pages_unless_writable(tmp_path, monkeypatch):
+    """get_ohlcv_with_cache devuelve vistas compartidas de solo lectura; writable=True da una copia propia"""
+    store = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    bars = make_bars('2024-01-01', 24 * 20)
+    store.append(bars)
+
+    fetch_data = load_fetch_data(monkeypatch, tmp_path)
+    monkeypatch.setattr(fetch_data, '_download_range', lambda *args: pytest.fail('rango ya en caché'))
+    df = fetch_data.get_ohlcv_with_cache('BTC/USDT', '1h', '2024-01-05', '2024-01-10')
+    assert len(df) == 24 * 5 + 1
+
+    shared = store.read('2024-01-05', '2024-01-10')
+    assert np.shares_memory(df['close'].to_numpy(), shared['close'].to_numpy())
+    with pytest.raises(ValueError):
+        df.loc[0, 'close'] = 1.0
+    # Reasignar una columna no toca las páginas mapeadas
+    df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+
+    own = fetch_data.get_ohlcv_with_cache('BTC/USDT', '1h', '2024-01-05', '2024-01-10', writable=True)
+    own.loc[0, 'close'] = 1.0
+    assert OHLCVStore('BTC/USDT', '1h', str(tmp_path)).read('2024-01-05', '2024-01-10').loc[0, 'close'] != 1.0
+
+
+def test_interior_outage_is_requested_only_once(tmp_path, monkeypatch):
+    """Un hueco interno sin ninguna vela en el exchange queda confirmado tras la primera descarga"""
+    bars = make_bars('2024-01-01', 200)
+    source = pd.concat([bars.iloc[:100], bars.iloc[110:]], ignore_index=True)
+    OHLCVStore('BTC/USDT', '1h', str(tmp_path)).append(source)
+
+    fetch_data = load_fetch_data(monkeypatch, tmp_path)
+    requests = []
+
+    def download(symbol, timeframe, provider, since, until):
+        requests.append((since, until))
+        return source[(source['timestamp'] >= since) & (source['timestamp'] <= until)].reset_index(drop=True)
+
+    monkeypatch.setattr(fetch_data, '_download_range', download)
+    start, end = bars['timestamp'].iloc[0], bars['timestamp'].iloc[-1]
+    assert len(fetch_data.get_ohlcv_with_cache('BTC/USDT', '1h', start, end)) == 190
+    assert requests == [(bars['timestamp'].iloc[99], bars['timestamp'].iloc[110])]
+
+    assert len(fetch_data.get_ohlcv_with_cache('BTC/USDT', '1h', start, end)) == 190
+    assert len(requests) == 1
+
+def test_downloads_share_binance_client_and_serialize_yahoo(tmp_path, monkeypatch):
+    """Los hilos de descarga comparten un cliente de Binance y nunca llaman a yf.download a la vez"""
+    fetch_data = load_fetch_data(monkeypatch, tmp_path)
+    monkeypatch.setitem(sys.modules, 'smc_backtester', None)  # La capa de datos no depende del backtester
+
+    clients = []
+
+    class FakeBinance:
+        def __init__(self, options=None):
+            self.options = options or {}
+            clients.append(self)
+
+        def fetch_ohlcv(self, symbol, timeframe, since, limit):
+            return []
+
+    active, peak = [0], [0]
+    counter = threading.Lock()
+
+    def download(*args, **kwargs):
+        with counter:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with counter:
+            active[0] -= 1
+        return pd.DataFrame()
+
+    monkeypatch.setattr(fetch_data.ccxt, 'binance', FakeBinance, raising=False)
+    monkeypatch.setattr(fetch_data.yf, 'download', download, raising=False)
+
+    start = pd.Timestamp('2024-01-01', tz='UTC')
+    ranges = [(start + pd.Timedelta(days=k), start + pd.Timedelta(days=k, hours=12)) for k in range(4)]
+    jobs = [(provider, rng) for provider in ('binance', 'yahoo') for rng in ranges]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda job: fetch_data._download_range('EUR/USD', '1h', job[0], *job[1]), jobs))
+
+    assert peak[0] == 1
+    assert len(clients) == 1 and clients[0].options.get('enableRateLimit')
+    assert fetch_data.get_ohlcv_with_cache('BTC/USDT', '1h', '2024-01-01', '2024-01-02').empty
+
+
+def test_gap_detection_and_fetch_plan():
+    """Huecos al principio, en medio y al final; los cercanos se piden en una sola descarga"""
+    step = 10
+    timestamps = np.array([30, 40, 50, 80, 90, 200, 210])
+    assert find_gaps(timestamps, 0, 250, step) == [(0, 20), (60, 70), (100, 190), (220, 250)]
+    assert find_gaps(timestamps, 0, 250, step, interior=False) == [(0, 20), (220, 250)]
+    assert find_gaps(np.array([], dtype=np.int64), 0, 50, step) == [(0, 50)]
+
+    assert subtract_ranges([(0, 100)], [[20, 40], [90, 120]]) == [(0, 19), (41, 89)]
+    assert plan_fetch_ranges([(0, 20), (60, 70)], step, page_size=100) == [(0, 70)]
+    assert plan_fetch_ranges([(0, 20), (60, 70)], step, page_size=3) == [(0, 20), (60, 70)]
+
+
+def test_store_repairs_interior_gaps(tmp_path):
+    """Los huecos internos se detectan, se validan las velas descargadas y los vacíos confirmados no se repiten"""
+    store = OHLCVStore('BTC/USDT', '1h', str(tmp_path))
+    bars = make_bars('2024-01-01', 24 * 10)
+    step = pd.Timedelta(hours=1)
+    store.append(pd.concat([bars.iloc[:50], bars.iloc[60:100], bars.iloc[130:]]))
+    start, end = bars['timestamp'].iloc[0], bars['timestamp'].iloc[-1]
+
+    ranges = store.missing_ranges(start, end, step)
+    assert ranges == [(bars['timestamp'].iloc[50], bars['timestamp'].iloc[129])]
+    assert store.missing_ranges(start, end, step, page_size=20) == [
+        (bars['timestamp'].iloc[50], bars['timestamp'].iloc[59]),
+        (bars['timestamp'].iloc[100], bars['timestamp'].iloc[129]),
+    ]
+    assert store.missing_ranges(start, end, step, interior=False) == []
+
+    # Descarga con una vela corrupta, una fuera de rejilla y un hueco real del exchange (110-114)
+    download = pd.concat([bars.iloc[50:110], bars.iloc[115:130]], ignore_index=True)
+    download.loc[3, 'high'] = download.loc[3, 'low'] - 1
+    download = pd.concat([download, bars.iloc[[70]].assign(timestamp=bars['timestamp'].iloc[70] + pd.Timedelta(minutes=7))])
+    assert store.commit_downloads([(ranges[0][0], ranges[0][1], download)], step) == 10 + 25 - 1
+
+    assert store.missing_ranges(start, end, step) == [(bars['timestamp'].iloc[53], bars['timestamp'].iloc[53])]
+    assert OHLCVStore('BTC/USDT', '1h', str(tmp_path)).empty_ranges == [
+        [bars['timestamp'].iloc[110].value, bars['timestamp'].iloc[114].value]
+    ]
+
+    # Un rango que no devuelve nada no se marca como vacío (puede ser un fallo de red)
+    assert store.commit_downloads([(start, end, pd.DataFrame())], step) == 0
+    assert store.missing_ranges(start, end, step) == [(bars['timestamp'].iloc[53], bars['timestamp'].iloc[53])]
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Tests del núcleo de simulación del backtester SMC
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from smc_backtester import MarketArrays, SMCBacktester, TradeResult
+from smc_trade_engine import SignalType
+from test_smc_bot import make_ohlc
+
+
+def make_market_df(n: int = 2000, seed: int = 21) -> pd.DataFrame:
+    """Velas sintéticas con columna timestamp (formato de fetch_data)"""
+    df = make_ohlc(n=n, seed=seed).reset_index().rename(columns={'index': 'timestamp'})
+    df['timestamp'] = df['timestamp'].dt.tz_localize(None)
+    return df
+
+
+def make_signals(df: pd.DataFrame, count: int = 60, seed: int = 22) -> list:
+    """Señales LONG/SHORT aleatorias con SL al 0.3-0.8% y RR entre 1 y 3"""
+    rng = np.random.default_rng(seed)
+    signals = []
+    for i in np.sort(rng.integers(20, len(df) - 1, count)):
+        price = df['close'].iloc[i]
+        is_long = rng.random() < 0.5
+        risk = price * rng.uniform(0.003, 0.008)
+        reward = risk * rng.uniform(1.0, 3.0)
+        signals.append(SimpleNamespace(
+            timestamp=df['timestamp'].iloc[i] - pd.Timedelta(minutes=5),
+            entry_price=price,
+            stop_loss=price - risk if is_long else price + risk,
+            take_profit=price + reward if is_long else price - reward,
+            signal_type=SignalType.LONG if is_long else SignalType.SHORT
+        ))
+    return signals
+
+
+def test_market_arrays_entry_index():
+    """La vela de entrada es la primera con timestamp >= señal (ordenado o no)"""
+    df = make_market_df(n=10)
+    market = MarketArrays.from_dataframe(df)
+    t = df['timestamp']
+
+    assert market.entry_index(t[3]) == 3
+    assert market.entry_index(t[3] - pd.Timedelta(minutes=1)) == 3
+    assert market.entry_index(t[9] + pd.Timedelta(minutes=1)) is None
+
+    shuffled = MarketArrays.from_dataframe(df.iloc[[0, 5, 2, 8, 1]])
+    assert shuffled.entry_index(t[4]) == 1
+
+
+def test_market_arrays_first_exit_prefers_stop_loss():
+    """Si SL y TP se tocan en la misma vela, gana el stop loss"""
+    market = MarketArrays(
+        timestamps=pd.date_range('2024-01-01', periods=5, freq='15min'),
+        high=np.array([101.0, 102.0, 106.0, 103.0, 110.0]),
+        low=np.array([99.0, 98.0, 97.0, 94.0, 99.0]),
+        close=np.full(5, 100.0)
+    )
+
+    assert market.first_exit(1, 5, 95.0, 105.0, is_long=True) == (2, False)
+    assert market.first_exit(1, 5, 96.0, 110.0, is_long=True) == (3, True)
+    assert market.first_exit(1, 5, 103.0, 97.5, is_long=False) == (2, True)
+    assert market.first_exit(1, 2, 90.0, 120.0, is_long=True) is None
+
+
+def test_resolve_exits_chunks_by_memory_budget():
+    """Los bloques dependen del ancho de la ventana y no cambian el resultado"""
+    import smc_backtester
+
+    assert smc_backtester.window_chunk_rows(2880) * 2880 * 8 <= smc_backtester.WINDOW_CHUNK_BYTES
+    assert smc_backtester.window_chunk_rows(10 ** 9) == 1
+    assert smc_backtester.window_chunk_rows(2880, chunk_size=7) == 7
+
+    df = make_market_df(n=600)
+    market = MarketArrays.from_dataframe(df)
+    rng = np.random.default_rng(5)
+    entry_idx = np.sort(rng.integers(0, 500, 80))
+    is_long = rng.random(80) < 0.5
+    close = df['close'].to_numpy()[entry_idx]
+    stop_loss = np.where(is_long, close * 0.995, close * 1.005)
+    take_profit = np.where(is_long, close * 1.01, close * 0.99)
+    horizon = rng.integers(1, 100, 80)
+
+    exits = market.resolve_exits(entry_idx, is_long, stop_loss, take_profit, horizon)
+    chunked = market.resolve_exits(entry_idx, is_long, stop_loss, take_profit, horizon, chunk_size=3)
+    np.testing.assert_array_equal(exits[0], chunked[0])
+    np.testing.assert_array_equal(exits[1], chunked[1])
+
+    exit_idx = np.where(exits[0] >= 0, exits[0], entry_idx + horizon)
+    extremes = market.window_extremes(entry_idx, exit_idx)
+    np.testing.assert_array_equal(extremes[0], market.window_extremes(entry_idx, exit_idx, chunk_size=3)[0])
+
+
+def test_backtest_trades_exit_on_first_touch():
+    """Cada trade sale en la primera vela que toca su SL/TP, o por tiempo al cierre"""
+    df = make_market_df()
+    backtester = SMCBacktester()
+    results = backtester.run_backtest(df, make_signals(df), max_trade_duration=2)
+
+    assert results.trades
+    index_of = {ts: i for i, ts in enumerate(df['timestamp'])}
+    for trade in results.trades:
+        entry = int(df['timestamp'].searchsorted(trade.entry_time))
+        exit_idx = index_of[trade.exit_time]
+        window = df.iloc[entry + 1:exit_idx + 1]
+        is_long = trade.signal_type == 'LONG'
+        stop_hit = window['low'] <= trade.stop_loss if is_long else window['high'] >= trade.stop_loss
+        target_hit = window['high'] >= trade.take_profit if is_long else window['low'] <= trade.take_profit
+        touched = (stop_hit | target_hit).to_numpy()
+
+        if trade.exit_price in (trade.stop_loss, trade.take_profit) and touched.any():
+            # Salida por SL/TP: ninguna vela anterior de la ventana lo tocó
+            assert touched.argmax() == len(window) - 1
+            assert (trade.result == TradeResult.LOSS) == bool(stop_hit.iloc[-1])
+        else:
+            assert not touched.any()
+            assert exit_idx == min(entry + 2 * 4, len(df) - 1)
+            assert trade.exit_price == df['close'].iloc[exit_idx]
+
+
+@pytest.mark.parametrize('freq,timeframe,expected', [
+    ('15min', None, 4.0), ('1h', None, 1.0), ('5min', None, 12.0), ('15min', '4h', 0.25),
+])
+def test_bars_per_hour_from_timeframe(freq, timeframe, expected):
+    """Velas por hora del timeframe indicado o inferidas de los timestamps"""
+    df = make_market_df(n=50)
+    df['timestamp'] = pd.date_range('2024-01-01', periods=50, freq=freq)
+
+    assert MarketArrays.from_dataframe(df).bars_per_hour(timeframe) == expected
+
+
+@pytest.mark.parametrize('timeframe', [None, '1h'])
+def test_batch_backtest_matches_sequential(timeframe):
+    """El modo batch produce exactamente los mismos trades que señal a señal"""
+    import copy
+
+    df = make_market_df(n=3000, seed=23)
+    signals = make_signals(df, count=200, seed=24)
+
+    sequential = SMCBacktester().run_backtest(df.copy(), copy.deepcopy(signals),
+                                              timeframe=timeframe, batch=False)
+    batch = SMCBacktester().run_backtest(df.copy(), copy.deepcopy(signals), timeframe=timeframe)
+
+    assert len(batch.trades) == len(signals)
+    assert batch.trades == sequential.trades
+    assert batch.final_capital == sequential.final_capital
+
+
+def test_walk_forward_folds_and_out_of_sample_signals(monkeypatch):
+    """Cada fold solo opera señales emitidas en su ventana de prueba, con entrada en la vela siguiente"""
+    from smc_backtester import run_walk_forward, walk_forward_folds, walk_forward_summary
+    from smc_bot import SignalType as BotSignalType
+    from smc_incremental import IncrementalSMCBot
+
+    folds = walk_forward_folds(1000, train_size=400, test_size=150, step=100)
+    assert [(f.train_start, f.test_start, f.test_end) for f in folds] == [
+        (0, 400, 550), (100, 500, 650), (200, 600, 750), (300, 700, 850), (400, 800, 950)]
+
+    def fake_signals(self):
+        # Señal con timestamp atrasado: el walk-forward debe entrar tras la vela de emisión
+        close = self.closes[-1]
+        signal = SimpleNamespace(timestamp=self.timestamps[max(0, len(self.timestamps) - 10)],
+                                 signal_type=BotSignalType.BUY, entry_price=close,
+                                 stop_loss=close * 0.995, take_profit=close * 1.01)
+        self.signals.append(signal)
+        return [signal]
+
+    monkeypatch.setattr(IncrementalSMCBot, '_generate_new_signals', fake_signals)
+
+    df = make_market_df(n=1200, seed=25)
+    index = pd.DatetimeIndex(df['timestamp'])
+    single = run_walk_forward(df, train_size=300, test_size=200, max_workers=1, segments=1)
+    split = run_walk_forward(df, train_size=300, test_size=200, max_workers=1, segments=2)
+
+    assert len(single) == len(split) == 4
+    for fold in single:
+        assert fold.signals
+        entries = index.get_indexer([s.timestamp for s in fold.signals])
+        assert ((entries > fold.test_start) & (entries <= fold.test_end)).all()
+        # Entrada a la apertura de la vela de entrada, no al precio de la vela que la originó
+        assert [s.entry_price for s in fold.signals] == list(df['open'].to_numpy()[entries])
+        assert fold.results.total_trades == len(fold.signals)
+
+    # Cada fold arranca con su propio histórico, sea cual sea el tramo
+    for one, other in zip(single, split):
+        assert [s.timestamp for s in one.signals] == [s.timestamp for s in other.signals]
+    assert list(walk_forward_summary(split)['signals']) == [len(f.signals) for f in split]
+
+
+def test_walk_forward_validates_levels_without_future_bars(monkeypatch):
+    """Los SL/TP de cada fold se validan con velas anteriores a su ventana de prueba"""
+    import smc_backtester
+    from smc_backtester import ValidationContext, run_walk_forward
+
+    original = ValidationContext.from_dataframe.__func__
+    seen = []
+
+    def spy(cls, frame, atr_period=14):
+        seen.append(frame.index[-1] if isinstance(frame.index, pd.DatetimeIndex) else frame['timestamp'].iloc[-1])
+        return original(cls, frame, atr_period)
+
+    monkeypatch.setattr(smc_backtester.ValidationContext, 'from_dataframe', classmethod(spy))
+
+    df = make_market_df(n=900, seed=26)
+    folds = run_walk_forward(df, train_size=300, test_size=200, max_workers=1, segments=1)
+
+    assert len(seen) == len(folds) == 3
+    for fold, last_seen in zip(folds, seen):
+        assert last_seen < fold.start_time
+
+
+def test_walk_forward_pool_matches_inline():
+    """Los tramos en paralelo dan el mismo resultado que en el proceso actual"""
+    from smc_backtester import run_walk_forward, walk_forward_summary
+
+    df = make_market_df(n=900, seed=26)
+    inline = walk_forward_summary(run_walk_forward(df, train_size=300, test_size=200,
+                                                   max_workers=1, segments=2))
+    pooled = walk_forward_summary(run_walk_forward(df, train_size=300, test_size=200,
+                                                   max_workers=2, segments=2))
+    assert inline['signals'].sum() > 0
+    pd.testing.assert_frame_equal(inline, pooled)
+
+
+def test_walk_forward_results_do_not_depend_on_segments():
+    """El número de tramos solo reparte el trabajo: los folds dan lo mismo con 1 o con N tramos"""
+    from smc_backtester import run_walk_forward, walk_forward_summary
+
+    df = make_market_df(n=2400, seed=27)
+    single = walk_forward_summary(run_walk_forward(df, train_size=300, test_size=300,
+                                                   max_workers=1, segments=1))
+    split = walk_forward_summary(run_walk_forward(df, train_size=300, test_size=300,
+                                                  max_workers=1, segments=7))
+    assert len(single) == 7
+    assert single['total_trades'].sum() > 0
+    pd.testing.assert_frame_equal(single, split)
+
+
+def test_trade_ledger_view_and_metrics():
+    """El ledger devuelve los mismos BacktestTrade y sus métricas coinciden con el cálculo trade a trade"""
+    from smc_backtester import TradeLedger
+
+    df = make_market_df(n=2500, seed=27)
+    backtester = SMCBacktester(risk_per_trade=2.0)
+    results = backtester.run_backtest(df, make_signals(df, count=150, seed=28))
+    trades = list(results.trades)
+
+    assert isinstance(results.trades, TradeLedger)
+    assert TradeLedger.from_trades(trades) == results.trades
+    assert results.trades[-1] == trades[-1] and len(results.trades[:10]) == 10
+    assert set(results.trades.to_dataframe()['result']) <= {'WIN', 'LOSS', 'BREAKEVEN'}
+
+    capital, peak, max_dd = backtester.initial_capital, backtester.initial_capital, 0.0
+    for trade in trades:
+        capital += trade.pnl_points * capital * 0.02 / abs(trade.entry_price - trade.stop_loss)
+        peak = max(peak, capital)
+        max_dd = max(max_dd, (peak - capital) / peak * 100)
+
+    wins = [t.pnl_points for t in trades if t.result == TradeResult.WIN]
+    losses = [t.pnl_points for t in trades if t.result == TradeResult.LOSS]
+    assert results.win_rate == pytest.approx(len(wins) / len(trades) * 100)
+    assert results.profit_factor == pytest.approx(sum(wins) / abs(sum(losses)))
+    assert results.expectancy == pytest.approx(sum(t.pnl_points for t in trades) / len(trades))
+    assert results.final_capital == pytest.approx(capital)
+    # El drawdown se mide sobre la equity por vela (incluye el de dentro de los trades)
+    equity = np.r_[backtester.initial_capital, results.equity_curve.to_numpy()]
+    peak = np.maximum.accumulate(equity)
+    assert results.max_drawdown_percent == pytest.approx(((peak - equity) / peak).max() * 100)
+    assert max_dd > 0
+    assert results.sharpe_ratio != 0.0
+    assert results.calmar_ratio == pytest.approx(results.annualized_return / results.max_drawdown_percent)
+
+
+@pytest.mark.parametrize('batch', [True, False])
+def test_excursions_and_bar_equity(batch):
+    """MAE/MFE desde las velas del trade y equity mark-to-market comparados con un bucle por vela"""
+    df = make_market_df(n=1500, seed=29)
+    backtester = SMCBacktester(risk_per_trade=1.5)
+    results = backtester.run_backtest(df, make_signals(df, count=80, seed=30), batch=batch)
+    trades = list(results.trades)
+    index = pd.DatetimeIndex(df['timestamp'])
+
+    capital = backtester.initial_capital
+    realized = np.zeros(len(df))
+    unrealized = np.zeros(len(df))
+    for trade in trades:
+        entry = index.searchsorted(trade.entry_time)
+        exit_idx = index.get_loc(trade.exit_time)
+        window = df.iloc[entry + 1:exit_idx + 1]
+        is_long = trade.signal_type == 'LONG'
+        adverse = trade.entry_price - window['low'].min() if is_long else window['high'].max() - trade.entry_price
+        favorable = window['high'].max() - trade.entry_price if is_long else trade.entry_price - window['low'].min()
+        assert trade.max_adverse_excursion == pytest.approx(max(0.0, min(adverse, abs(trade.entry_price - trade.stop_loss))))
+        assert trade.max_favorable_excursion == pytest.approx(max(0.0, min(favorable, abs(trade.take_profit - trade.entry_price))))
+
+        size = capital * 0.015 / abs(trade.entry_price - trade.stop_loss)
+        direction = 1 if is_long else -1
+        for bar in range(entry, exit_idx):
+            unrealized[bar] += direction * size * (df['close'].iloc[bar] - trade.entry_price)
+        realized[exit_idx:] += trade.pnl_points * size
+        capital += trade.pnl_points * size
+
+    expected = backtester.initial_capital + realized + unrealized
+    np.testing.assert_allclose(results.equity_curve.to_numpy(), expected, rtol=1e-9)
+    assert results.equity_curve.iloc[-1] == pytest.approx(results.final_capital)
+
+
+def test_batch_level_validation(monkeypatch):
+    """La validación en lote da los mismos reportes que señal a señal y el backtest valida una sola vez"""
+    from smc_backtester import LevelValidationResult, ValidationContext, validate_sl_tp_levels, validate_sl_tp_levels_batch
+
+    df = make_market_df(n=1500, seed=31)
+    signals = make_signals(df, count=120, seed=32)
+    for k, signal in enumerate(signals):
+        if k % 3 == 0:
+            signal.stop_loss = signal.entry_price + (signal.stop_loss - signal.entry_price) * 20
+        if k % 5 == 0:
+            signal.take_profit = signal.entry_price + (signal.take_profit - signal.entry_price) * 0.1
+
+    batch = validate_sl_tp_levels_batch(df, [s.entry_price for s in signals], [s.stop_loss for s in signals],
+                                        [s.take_profit for s in signals], [s.signal_type.value for s in signals])
+    single = [validate_sl_tp_levels(df, s.entry_price, s.stop_loss, s.take_profit, s.signal_type.value)
+              for s in signals]
+
+    assert batch.reports() == single
+    assert batch.results == [report.result for report in single]
+    assert {LevelValidationResult.VALID, LevelValidationResult.OUTSIDE_RANGE} < set(batch.results)
+
+    calls = []
+    original = ValidationContext.from_dataframe.__func__
+    monkeypatch.setattr(ValidationContext, 'from_dataframe',
+                        classmethod(lambda cls, *args, **kwargs: calls.append(1) or original(cls, *args, **kwargs)))
+    SMCBacktester().run_backtest(df, signals)
+    assert len(calls) == 1
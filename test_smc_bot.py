@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Tests de paridad entre los motores vectorizados y los bucles originales del SMC Bot
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from smc_bot import SMCBot, SMCConfig
+from smc_advanced import detect_swings_vectorized
+
+
+def make_ohlc(n: int = 600, seed: int = 7, decimals: int = 0) -> pd.DataFrame:
+    """Generar velas sintéticas (redondeadas para forzar empates de precios)"""
+    rng = np.random.default_rng(seed)
+    close = 50000 * np.cumprod(1 + rng.normal(0, 0.004, n))
+    open_ = np.r_[close[0], close[:-1]]
+    spread = np.abs(rng.normal(0, 0.003, n)) * close
+    high = np.maximum(open_, close) + spread * rng.random(n)
+    low = np.minimum(open_, close) - spread * rng.random(n)
+    df = pd.DataFrame({
+        'open': open_.round(decimals),
+        'high': high.round(decimals),
+        'low': low.round(decimals),
+        'close': close.round(decimals),
+        'volume': rng.integers(50, 200, n).astype(float),
+    }, index=pd.date_range('2024-01-01', periods=n, freq='15min', tz='UTC'))
+    return df
+
+
+def make_bot(df: pd.DataFrame, **config) -> SMCBot:
+    bot = SMCBot(SMCConfig(**config))
+    bot.df = df.copy()
+    return bot
+
+
+@pytest.mark.parametrize('seed,decimals', [(1, 0), (2, -1), (3, 2)])
+def test_swings_vectorized_matches_loop(seed, decimals):
+    """El motor NumPy produce exactamente los mismos swings que el bucle"""
+    bot = make_bot(make_ohlc(seed=seed, decimals=decimals))
+
+    expected = bot._detect_swings_loop()
+    result = bot.detect_swings()
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+@pytest.mark.parametrize('n', [1, 3, 5, 6])
+def test_swings_vectorized_short_frames(n):
+    """Frames más cortos que la ventana no generan swings ni fallan"""
+    bot = make_bot(make_ohlc(n=n))
+
+    pd.testing.assert_frame_equal(detect_swings_vectorized(bot.df), bot._detect_swings_loop())
+
+
+def test_swings_opt_out_uses_loop():
+    """use_vectorized=False mantiene el bucle original"""
+    df = make_ohlc(n=200)
+    bot = make_bot(df, use_vectorized=False)
+
+    pd.testing.assert_frame_equal(bot.detect_swings(), make_bot(df).detect_swings())
+
+
+def assert_zone_lists_equal(result, expected):
+    """Comparar listas de zonas (dicts) campo a campo"""
+    assert len(result) == len(expected)
+    for got, want in zip(result, expected):
+        assert got.keys() == want.keys()
+        for key, value in want.items():
+            if isinstance(value, float):
+                assert got[key] == pytest.approx(value, nan_ok=True), key
+            else:
+                assert got[key] == value, key
+
+
+@pytest.mark.parametrize('seed,min_size', [(4, 0.05), (5, 0.0), (6, 0.2)])
+def test_fvg_vectorized_matches_loop(seed, min_size):
+    """Detección y llenado de FVG idénticos a detect_fvg_advanced"""
+    from smc_advanced import detect_fvg_advanced, detect_fvg_vectorized
+
+    df = make_ohlc(n=800, seed=seed)
+    # Huecos de apertura para forzar velas que saltan el gap sin tocarlo
+    df.iloc[300:, :4] += 2000
+    df.iloc[550:, :4] -= 4000
+
+    expected = detect_fvg_advanced(df, min_size)
+    assert any(fvg['filled'] for fvg in expected)
+    assert_zone_lists_equal(detect_fvg_vectorized(df, min_size), expected)
+
+
+def test_resolve_first_touch_handles_nan():
+    """Las velas con NaN nunca cuentan como toque"""
+    from smc_advanced import resolve_first_touch
+
+    high = np.array([10.0, np.nan, 12.0, 9.0, 11.0])
+    low = np.array([9.0, np.nan, 11.0, 8.0, 10.0])
+    touch = resolve_first_touch(high, low, np.array([1, 1, 4]),
+                                np.array([10.5, 8.5, 5.0]), np.array([10.2, 8.1, 4.0]))
+
+    assert touch.tolist() == [4, 3, -1]
+
+
+@pytest.mark.parametrize('seed', [8, 9, 10])
+def test_order_blocks_vectorized_matches_loop(seed):
+    """Order Blocks y mitigación idénticos a detect_order_blocks_advanced"""
+    from smc_advanced import detect_order_blocks_advanced, detect_order_blocks_vectorized
+
+    bot = make_bot(make_ohlc(n=1000, seed=seed))
+    bot.swings = bot.detect_swings()
+    bot.structure = bot.detect_structure()
+    choch_bos = bot.detect_choch_bos()
+
+    expected = detect_order_blocks_advanced(bot.df, bot.swings, choch_bos)
+    assert expected
+    assert_zone_lists_equal(detect_order_blocks_vectorized(bot.df, bot.swings, choch_bos), expected)
+
+
+@pytest.mark.parametrize('seed,tolerance', [(14, 0.075), (15, 0.3), (16, 0.0)])
+def test_liquidity_and_sweeps_vectorized_match_loop(seed, tolerance):
+    """Clustering ordenado y resolutor de barridos idénticos a los bucles originales"""
+    from smc_advanced import cluster_liquidity_zones, detect_sweeps_vectorized
+
+    bot = make_bot(make_ohlc(n=1500, seed=seed), equal_tolerance=tolerance)
+    bot.swings = bot.detect_swings()
+
+    expected_zones = bot._detect_liquidity_zones_loop(tolerance / 100)
+    zones = cluster_liquidity_zones(bot.swings, tolerance / 100)
+    assert expected_zones and zones == expected_zones
+
+    bot.liquidity_zones = expected_zones
+    expected = bot._detect_sweeps_loop()
+    result = detect_sweeps_vectorized(bot.df, zones)
+    assert expected and result == expected
+    assert zones == expected_zones  # mismas zonas marcadas como barridas
+
+
+def test_resolve_first_sweep_requires_strict_close():
+    """Mecha por encima del nivel y cierre estrictamente por debajo"""
+    from smc_advanced import resolve_first_sweep
+
+    high = np.array([11.0, 12.0, 10.0, 11.0, 12.0])
+    close = np.array([9.0, 10.0, 9.0, 10.5, 9.5])
+    levels = np.array([10.0, 10.6, 12.0])
+    sweep = resolve_first_sweep(high, close, np.array([1, 3, 0]), levels, above=True)
+
+    assert sweep.tolist() == [4, 3, -1]
+
+
+@pytest.mark.parametrize('config', [
+    SMCConfig(),
+    SMCConfig(enable_engulfing=False, min_wick_ratio=1.5),
+    SMCConfig(enable_pinbar=False, enable_rejection_wick=False, min_confirmation_body=0.3),
+])
+def test_confirmation_table_matches_single_candle(config):
+    """La tabla precalculada da la misma confirmación que el cálculo por vela"""
+    from smc_advanced import (candle_pattern_table, classify_confirmation_patterns,
+                              detect_confirmation_patterns)
+
+    df = make_ohlc(n=400, seed=17)
+    table = classify_confirmation_patterns(candle_pattern_table(df, config.min_wick_ratio), config)
+
+    results = [detect_confirmation_patterns(df, i, config, table) for i in range(len(df))]
+    assert results == [detect_confirmation_patterns(df, i, config) for i in range(len(df))]
+    assert {r['type'] for r in results} >= {None, 'bullish_engulfing' if config.enable_engulfing else 'hammer'}
+
+
+def test_trade_engine_candle_confirmations():
+    """Engulfing estricto y mechas de rechazo del motor TJR"""
+    from smc_trade_engine import SMCTradeEngine, ConfirmationType
+
+    df = pd.DataFrame({
+        'open':  [10.0, 10.0, 8.5, 10.0, 10.0],
+        'high':  [10.5, 10.2, 11.0, 14.0, 10.2],
+        'low':   [9.5, 8.8, 8.4, 9.9, 6.0],
+        'close': [10.2, 9.0, 10.5, 10.5, 10.0],
+    }, index=pd.date_range('2024-01-01', periods=5, freq='15min'))
+
+    confirmations = SMCTradeEngine()._detect_candle_confirmations(df)
+
+    assert [(c['type'], c['direction'], c['index']) for c in confirmations] == [
+        (ConfirmationType.ENGULFING, 'bullish', 2),
+        (ConfirmationType.REJECTION_WICK, 'bearish', 3),
+        (ConfirmationType.REJECTION_WICK, 'bullish', 4),
+    ]
+    assert confirmations[0]['strength'] == pytest.approx(2.0)
+    assert confirmations[2]['strength'] == 5  # cuerpo nulo
+
+
+def test_trade_signals_pick_first_zone_and_confirmation():
+    """Una señal por sweep: primera zona y primera confirmación posteriores"""
+    from smc_trade_engine import SMCTradeEngine, SignalType
+
+    df = make_ohlc(n=50, seed=18)
+    t = df.index
+    price = df['close'].iloc[-1]
+
+    def zone(i, mitigated=False, offset=0.0):
+        return {'type': 'OB', 'top': price + 10 + offset, 'bottom': price - 10 + offset,
+                'index': i, 'timestamp': t[i], 'mitigated': mitigated}
+
+    def confirmation(i, direction, strength=1.5):
+        return {'type': 'ENGULFING', 'direction': direction, 'index': i,
+                'timestamp': t[i], 'strength': strength}
+
+    sweeps = [{'type': 'low_sweep', 'level': price - 50, 'index': 5, 'timestamp': t[5]},
+              {'type': 'high_sweep', 'level': price + 50, 'index': 8, 'timestamp': t[8]},
+              {'type': 'low_sweep', 'level': price - 50, 'index': 40, 'timestamp': t[40]}]
+    breaks = [{'type': 'BOS', 'level': price, 'index': 12, 'timestamp': t[12]},
+              {'type': 'CHOCH', 'level': price, 'index': 20, 'timestamp': t[20]}]
+    zones = [zone(30), zone(9, mitigated=True), zone(15), zone(10, offset=100)]
+    confirmations = [confirmation(18, 'bullish', strength=1.0), confirmation(25, 'bullish'),
+                     confirmation(22, 'bullish'), confirmation(16, 'bearish')]
+
+    signals = SMCTradeEngine()._generate_trade_signals(df, sweeps, breaks, zones, confirmations)
+
+    # El sweep de la vela 40 no tiene CHoCH/BOS posterior
+    assert [s.signal_type for s in signals] == [SignalType.LONG, SignalType.SHORT]
+    assert all(s.setup_components['zone'] is zones[2] for s in signals)
+    assert signals[0].setup_components['confirmation'] is confirmations[2]
+    assert signals[1].setup_components['confirmation'] is confirmations[3]
+
+
+def test_trade_engine_equal_level_sweeps():
+    """Pares de equal highs/lows dentro del 0.2% barridos por velas posteriores"""
+    from smc_trade_engine import SMCTradeEngine
+
+    df = pd.DataFrame({
+        'open': 100.0, 'close': 100.0,
+        'high': [101, 110, 101, 101, 101, 110.1, 101, 101, 112, 111],
+        'low': [99, 99, 99, 90.1, 99, 99, 99, 90.05, 99, 99],
+    }, index=pd.date_range('2024-01-01', periods=10, freq='15min'))
+    swings = pd.DataFrame({
+        'HighLow': [np.nan, 1, np.nan, -1, np.nan, 1, np.nan, -1, 1, np.nan],
+        'Level': [np.nan, 110, np.nan, 90.1, np.nan, 110.1, np.nan, 90.05, 112, np.nan],
+    })
+
+    sweeps = SMCTradeEngine()._detect_liquidity_sweeps(df, {'swing_highs_lows': swings})
+
+    # 110/110.1 barridos por la vela 9; 112 no es igual; los lows nunca se barren
+    assert [(s['type'], s['level'], s['index']) for s in sweeps] == [('high_sweep', 110.1, 5)]
+
+
+def test_analyze_market_runs_each_detector_once(monkeypatch):
+    """Una llamada a analyze_market calcula CHoCH/BOS una sola vez y reporta tiempos"""
+    import smc_advanced
+
+    calls = []
+    original = smc_advanced.detect_choch_bos_advanced
+
+    def counting(*args, **kwargs):
+        calls.append(1)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(smc_advanced, 'detect_choch_bos_advanced', counting)
+
+    df = make_ohlc(n=400)
+    bot = SMCBot(SMCConfig())
+    analysis = bot.analyze_market(df)
+
+    assert len(calls) == 1
+    assert {'swings', 'choch_bos', 'order_blocks', 'fvg', 'sweeps'} <= set(analysis['timings'])
+
+    # Mismos datos y configuración: se reutiliza el contexto memoizado
+    bot.analyze_market(df.copy())
+    assert len(calls) == 1
+
+    # Un detector llamado directamente tras cambiar la configuración no usa el memo
+    memoized = bot.context.results['fvg']
+    bot.config.fvg_min_size = 5.0
+    assert memoized and bot.detect_fvg() != memoized
+    assert bot.context.results['fvg'] is memoized
+
+    bot.config.fvg_min_size = 0.2
+    bot.analyze_market(df)
+    assert len(calls) == 2
+
+
+@pytest.mark.parametrize('seed,tolerance', [(11, 0.075), (12, 0.2)])
+def test_incremental_bot_matches_batch(seed, tolerance):
+    """Alimentar las velas una a una reproduce el estado de analyze_market"""
+    from smc_incremental import IncrementalSMCBot
+
+    df = make_ohlc(n=1500, seed=seed)
+    config = dict(equal_tolerance=tolerance, fvg_min_size=0.02)
+
+    batch = SMCBot(SMCConfig(**config))
+    batch.analyze_market(df)
+    stream = IncrementalSMCBot(SMCConfig(**config))
+    stream.warm_up(df)
+
+    swings = batch.swings
+    assert stream.swing_highs == list(swings.loc[swings['swing_high'], 'swing_high_price'].items())
+    assert stream.swing_lows == list(swings.loc[swings['swing_low'], 'swing_low_price'].items())
+    assert stream.structure == batch.structure
+    assert stream.trend == batch.trend
+    assert stream.choch_bos == batch.context.results['choch_bos']
+    assert stream.fvg_zones == batch.fvg_zones
+    assert stream.liquidity_zones == batch.liquidity_zones
+
+    sweep_key = lambda sweep: (sweep['timestamp'], sweep['zone_price'])
+    assert sorted(stream.sweeps, key=sweep_key) == sorted(batch.context.results['sweeps'], key=sweep_key)
+
+    # Los OB de los últimos eventos esperan todavía sus velas de impulso
+    pending = {event['timestamp'] for event, _ in stream.pending_events}
+    expected_obs = [ob for ob in batch.order_blocks if ob['event_timestamp'] not in pending]
+    assert expected_obs and stream.order_blocks == expected_obs
+
+
+def test_incremental_update_emits_only_new_events():
+    """Cada vela devuelve solo los eventos que ella misma genera"""
+    from smc_incremental import IncrementalSMCBot
+
+    df = make_ohlc(n=300, seed=13)
+    bot = IncrementalSMCBot(SMCConfig())
+    bot.warm_up(df.iloc[:-1])
+    fvg_before = len(bot.fvg_zones)
+
+    events = bot.update(df.iloc[-1])
+
+    assert events['timestamp'] == df.index[-1]
+    assert events['fvg_zones'] == bot.fvg_zones[fvg_before:]
+    assert all(swing['timestamp'] == df.index[-3] for swing in events['swings'])
+
+
+
+def test_frame_version_depends_on_row_order():
+    """La huella cambia si se reordenan las filas, aunque cada fila sea la misma"""
+    from smc_advanced import frame_version
+
+    df = make_ohlc(n=200, seed=72)
+    assert frame_version(df) == frame_version(df.copy())
+    assert frame_version(df) != frame_version(df.iloc[::-1])
+
+def test_indicator_cache_reuses_and_invalidates(monkeypatch):
+    """El ATR se calcula una vez por frame y se recalcula al añadir velas"""
+    import gc
+    from smc_advanced import INDICATOR_CACHE, calculate_atr
+
+    df = make_ohlc(n=300, seed=71)
+    high_low = df['high'] - df['low']
+    high_close = np.abs(df['high'] - df['close'].shift())
+    low_close = np.abs(df['low'] - df['close'].shift())
+    expected = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1).rolling(14).mean()
+
+    atr = INDICATOR_CACHE.atr(df, 14)
+    pd.testing.assert_series_equal(atr, expected)
+    assert INDICATOR_CACHE.atr(df, 14) is atr
+    # Un acierto no recorre las velas
+    with monkeypatch.context() as patched:
+        patched.setattr(pd.util, 'hash_pandas_object', lambda *args, **kwargs: pytest.fail('hash en un acierto'))
+        assert INDICATOR_CACHE.atr(df, 14) is atr
+    # calculate_atr conserva su NaN en la primera vela (sin cierre previo)
+    assert np.isnan(calculate_atr(df, 14).iloc[13]) and not np.isnan(atr.iloc[13])
+    pd.testing.assert_series_equal(calculate_atr(df, 14).iloc[14:], expected.iloc[14:])
+
+    # Las series compartidas no admiten escrituras in situ
+    with pytest.raises(ValueError):
+        atr.iloc[-1] = 0.0
+
+    # Editar una vela intermedia también invalida la entrada
+    df.iloc[150, df.columns.get_loc('high')] += 500
+    edited = INDICATOR_CACHE.atr(df, 14)
+    assert edited is not atr and edited.iloc[150] > atr.iloc[150]
+    atr = edited
+
+    # Añadir una vela invalida la entrada del frame
+    df.loc[df.index[-1] + pd.Timedelta(minutes=15)] = df.iloc[-1] * 1.01
+    refreshed = INDICATOR_CACHE.atr(df, 14)
+    assert refreshed is not atr and len(refreshed) == len(df)
+
+    # Los frames liberados salen de la caché
+    before = len(INDICATOR_CACHE._entries)
+    INDICATOR_CACHE.atr(df.iloc[:100], 14)
+    gc.collect()
+    assert len(INDICATOR_CACHE._entries) == before
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Tests del histórico SMC: construcción del timeline y caché en disco
+"""
+
+import importlib
+import multiprocessing
+import os
+import pickle
+import shutil
+import sys
+import types
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from smc_bot import SignalType, TradingSignal
+from test_ohlcv_store import make_bars
+
+
+BARS = make_bars('2024-01-01', 24 * 60)
+
+
+def fake_analysis(df):
+    """Análisis determinista y barato en lugar del de smartmoneyconcepts"""
+    if len(df) < 20:
+        return {}
+    close = df['close'].to_numpy()
+    marked = np.arange(len(df)) % 7 == 0
+    zones = pd.DataFrame({
+        'top': np.where(marked, df['high'].to_numpy(), np.nan),
+        'bottom': np.where(marked, df['low'].to_numpy(), np.nan),
+    })
+    signals = [
+        TradingSignal(
+            signal_type=SignalType.BUY if close[i] > close[i - 1] else SignalType.SELL,
+            entry_price=float(close[i]),
+            stop_loss=float(close[i]) * 0.99,
+            take_profit=float(close[i]) * 1.02,
+            risk_reward=1.0 + (i % 5) / 2,
+            confidence=0.5 + (i % 3) / 10,
+            reason='test',
+            timestamp=df['timestamp'].iloc[i]
+        )
+        for i in range(len(df) - 3, len(df)) if int(close[i]) % 3 == 0
+    ]
+    return {
+        'trend': 'BULLISH' if close[-1] > close.mean() else 'BEARISH',
+        'order_blocks': zones,
+        'signals': signals,
+    }
+
+
+def fetch_bars(start_time, end_time):
+    """_fetch_range sobre BARS: velas de [start_time, end_time] como get_ohlcv_with_cache"""
+    start, end = (pd.Timestamp(value) for value in (start_time, end_time))
+    start = start.tz_localize('UTC') if start.tzinfo is None else start.tz_convert('UTC')
+    end = end.tz_localize('UTC') if end.tzinfo is None else end.tz_convert('UTC')
+    return BARS[(BARS['timestamp'] >= start) & (BARS['timestamp'] <= end)].reset_index(drop=True)
+
+
+@pytest.fixture
+def historical(monkeypatch, tmp_path):
+    """smc_historical sin streamlit ni proveedores, con análisis y descargas sustituidos"""
+    for name in ('streamlit', 'ccxt', 'yfinance', 'smartmoneyconcepts'):
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+    sys.modules['smartmoneyconcepts'].smc = None
+    for name in ('smc_historical', 'smc_integration', 'smc_analysis'):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    module = importlib.import_module('smc_historical')
+    monkeypatch.setattr(module, 'get_smc_bot_analysis', fake_analysis)
+    monkeypatch.setattr(module.SMCHistoricalManager, '_fetch_range', lambda self, start, end: fetch_bars(start, end))
+    monkeypatch.chdir(tmp_path)  # El manager crea historical_cache/ en el directorio actual
+    return module
+
+
+def test_timeline_data_matches_per_snapshot_ranges(historical):
+    """Las ventanas por posición tienen las mismas velas que [target - delta, target] de get_historical_data"""
+    manager = historical.SMCHistoricalManager('BTC/USDT', '1h')
+    targets = [datetime(2024, 1, 20) + timedelta(hours=7.5) * k for k in range(30)]
+    targets += [
+        datetime(2024, 1, 15, 6),        # Extremo exacto de una vela
+        datetime(2024, 1, 15, 6),        # Repetido
+        datetime(2023, 12, 1),           # Antes de las velas: ventana vacía
+        datetime(2023, 12, 29, 12),      # Ventana que empieza antes de la primera vela
+        datetime(2024, 4, 10),           # Después de la última vela
+    ]
+
+    data, bounds = manager.get_timeline_data('1w', targets)
+    assert bounds.shape == (len(targets), 2)
+    for target, (start, end) in zip(targets, bounds):
+        expected = manager.get_historical_data('1w', target)
+        pd.testing.assert_frame_equal(data.iloc[start:end].reset_index(drop=True), expected)
+
+    empty, empty_bounds = manager.get_timeline_data('1w', [])
+    assert empty.empty and empty_bounds.shape == (0, 2)
+
+
+def test_timeline_pool_matches_inline(historical, monkeypatch):
+    """El pool da los mismos snapshots que el proceso actual y el progreso cuenta las ventanas analizadas"""
+    failing = pd.Timestamp('2024-02-01 12:00', tz='UTC')
+
+    def analysis(df):
+        if df['timestamp'].iloc[-1] == failing:
+            raise ValueError('análisis fallido')
+        return fake_analysis(df)
+
+    monkeypatch.setattr(historical, 'get_smc_bot_analysis', analysis)
+
+    # El pool se crea con SNAPSHOT_POOL_CONTEXT; aquí se fuerza fork para que los
+    # workers vean el análisis sustituido
+    pools = []
+
+    class RecordingPool(ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools.append(dict(kwargs))
+            kwargs['mp_context'] = multiprocessing.get_context('fork')
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(historical, 'ProcessPoolExecutor', RecordingPool)
+    targets = [datetime(2024, 1, 20) + timedelta(hours=13) * k for k in range(24)]
+    targets += [datetime(2024, 2, 1, 12), datetime(2023, 12, 1)]  # Análisis que falla y ventana vacía
+    manager = historical.SMCHistoricalManager('BTC/USDT', '1h')
+
+    timelines, progress = {}, {}
+    for workers in (1, None):
+        seen = progress[workers] = []
+        timelines[workers] = manager.build_timeline(
+            '1w', targets, max_workers=workers,
+            on_snapshot=lambda snapshot, done, total: seen.append((done, total)))
+
+    inline, pooled = timelines[1], timelines[None]
+    assert len(pools) == 1
+    assert pools[0]['mp_context'].get_start_method() == historical.SNAPSHOT_POOL_CONTEXT != 'fork'
+    assert pools[0]['max_workers'] <= historical.MAX_SNAPSHOT_WORKERS
+    assert len(inline) == len(targets) - 2
+    assert sum(len(s.signals) for s in inline) > 0
+    assert [s.timestamp for s in pooled] == [s.timestamp for s in inline] == sorted(targets[:24])
+    for a, b in zip(inline, pooled):
+        pd.testing.assert_frame_equal(a.df, b.df)
+        pd.testing.assert_frame_equal(a.bot_analysis['order_blocks'], b.bot_analysis['order_blocks'])
+        assert a.signals == b.signals
+        assert a.market_conditions == b.market_conditions
+
+    for seen in progress.values():
+        # total = ventanas con velas (la fallida cuenta, la vacía no)
+        assert {total for _, total in seen} == {len(targets) - 1}
+        done = [count for count, _ in seen]
+        assert len(done) == len(inline) and done == sorted(set(done)) and done[-1] <= len(targets) - 1
+
+
+def assert_same_timeline(loaded, timeline):
+    """Mismos snapshots: velas, análisis, señales y condiciones"""
+    assert [s.timestamp for s in loaded] == [s.timestamp for s in timeline]
+    for a, b in zip(loaded, timeline):
+        pd.testing.assert_frame_equal(a.df, b.df)
+        pd.testing.assert_frame_equal(a.bot_analysis['order_blocks'], b.bot_analysis['order_blocks'])
+        assert a.bot_analysis['trend'] == b.bot_analysis['trend']
+        assert a.signals == b.signals
+        assert a.market_conditions == b.market_conditions
+
+
+def test_timeline_cache_roundtrip_and_legacy_formats(historical):
+    """El timeline guardado se recupera igual, las versiones se publican de una vez y se leen los formatos anteriores"""
+    manager = historical.SMCHistoricalManager('BTC/USDT', '1h')
+    targets = [datetime(2024, 1, 20) + timedelta(hours=11) * k for k in range(12)]
+    timeline = manager.build_timeline('1w', targets, max_workers=1)
+    manager.save_timeline_to_cache('1w', timeline)
+
+    loaded = manager.load_timeline_from_cache('1w')
+    assert isinstance(loaded[0].bot_analysis, historical.LazyAnalysis)
+    assert_same_timeline(loaded, timeline)
+
+    # Guardar de nuevo no rompe a un lector que aún no ha cargado su análisis perezoso
+    pending = manager.load_timeline_from_cache('1w')
+    manager.save_timeline_to_cache('1w', timeline[:6])
+    assert pending[-1].bot_analysis['trend'] == timeline[-1].bot_analysis['trend']
+    assert len(manager.load_timeline_from_cache('1w')) == 6
+
+    manager.save_timeline_to_cache('1w', timeline[:6])
+    store = manager._timeline_store('1w')
+    versions = [name for name in os.listdir(store.path) if name.startswith('v')]
+    assert len(versions) == historical.TIMELINE_KEEP_VERSIONS
+    assert store.current_path == os.path.join(store.path, max(versions))
+    assert not [name for name in os.listdir(store.path) if '.tmp' in name]
+
+    # Formato columnar anterior: ficheros en la raíz, sin CURRENT
+    legacy_dir = manager._timeline_store('3d').path
+    shutil.copytree(store.current_path, legacy_dir)
+    assert_same_timeline(manager.load_timeline_from_cache('3d'), timeline[:6])
+    manager.save_timeline_to_cache('3d', timeline)
+    assert not [name for name in os.listdir(legacy_dir) if name.endswith(('.parquet', '.arrow'))]
+    assert_same_timeline(manager.load_timeline_from_cache('3d'), timeline)
+
+    # Lista pickle con el DataFrame de cada snapshot en 'df'
+    legacy = []
+    for snapshot in timeline:
+        old = historical.HistoricalSnapshot.__new__(historical.HistoricalSnapshot)
+        old.__dict__.update(timestamp=snapshot.timestamp, df=snapshot.df, bot_analysis=dict(snapshot.bot_analysis),
+                            signals=snapshot.signals, market_conditions=snapshot.market_conditions,
+                            symbol=snapshot.symbol, timeframe=snapshot.timeframe)
+        legacy.append(old)
+    with open(f"{manager._timeline_store('1d').path}.pkl", 'wb') as f:
+        pickle.dump(legacy, f)
+    unpickled = manager.load_timeline_from_cache('1d')
+    assert all(s.start == 0 and s.end == len(s.data) for s in unpickled)
+    assert_same_timeline(unpickled, timeline)
+
+
+def make_snapshot(historical, timestamp, signals=(), price=100.0):
+    """Snapshot sin análisis (solo para el índice temporal y los agregados)"""
+    return historical.HistoricalSnapshot(
+        timestamp=timestamp, data=BARS, start=0, end=20, bot_analysis={}, signals=list(signals),
+        market_conditions={'price': price, 'volatility': price / 100}, symbol='BTC/USDT', timeframe='1h')
+
+
+def linear_nearest(snapshots, target_time):
+    """get_snapshot_by_time anterior: recorrido completo, el primero gana en empates"""
+    closest, min_diff = None, float('inf')
+    for snapshot in snapshots:
+        diff = abs((snapshot.timestamp - target_time).total_seconds())
+        if diff < min_diff:
+            closest, min_diff = snapshot, diff
+    return closest
+
+
+def test_time_index_matches_linear_scans(historical):
+    """Las búsquedas binarias devuelven lo mismo que los recorridos lineales anteriores"""
+    manager = historical.SMCHistoricalManager('BTC/USDT', '1h')
+    assert manager.get_snapshot_by_time(datetime(2024, 1, 1)) is None
+    assert manager.nearest_snapshot_index(datetime(2024, 1, 1)) is None
+    assert manager.get_snapshots_in_range(datetime(2023, 1, 1), datetime(2025, 1, 1)) == []
+    assert manager.snapshot_position(datetime(2024, 1, 1)) == 0
+
+    base = datetime(2024, 1, 10)
+    offsets = [0, 4, 4, 4, 10, 16, 16, 30, 31]  # Horas, con timestamps repetidos
+    rng = np.random.default_rng(5)
+    for offset in rng.permutation(offsets):
+        manager.add_snapshot(make_snapshot(historical, base + timedelta(hours=int(offset))))
+    times = [s.timestamp for s in manager.snapshots]
+    assert times == sorted(times)
+
+    probes = [base + timedelta(hours=hours) for hours in
+              (-100, -1, 0, 2, 4, 7, 10, 13, 16, 23, 30, 30.5, 31, 32, 500)]  # 2, 7, 13, 23 y 30.5: empates
+    probes += [base + timedelta(minutes=int(m)) for m in rng.integers(-120, 2000, size=40)]
+    for target in probes:
+        assert manager.get_snapshot_by_time(target) is linear_nearest(manager.snapshots, target)
+
+    for start in probes[:15]:
+        for end in probes[:15]:
+            expected = [id(s) for s in manager.snapshots if start <= s.timestamp <= end]
+            assert [id(s) for s in manager.get_snapshots_in_range(start, end)] == expected
+
+
+def make_signals(count, seed):
+    """Señales BUY/SELL con R:R y confianza variables"""
+    rng = np.random.default_rng(seed)
+    return [
+        TradingSignal(signal_type=SignalType.BUY if rng.random() < 0.5 else SignalType.SELL,
+                      entry_price=100.0, stop_loss=99.0, take_profit=102.0,
+                      risk_reward=float(rng.uniform(1, 4)), confidence=float(rng.uniform(0.5, 0.9)),
+                      reason='test', timestamp=pd.Timestamp('2024-01-01'))
+        for _ in range(count)
+    ]
+
+
+def loop_evolution(snapshots):
+    """get_signals_evolution anterior: recorrido de las señales de cada snapshot"""
+    evolution = {key: [] for key in ('timestamps', 'total_signals', 'buy_signals', 'sell_signals',
+                                     'avg_rr', 'avg_confidence', 'market_conditions')}
+    for snapshot in snapshots:
+        signals = snapshot.signals
+        evolution['timestamps'].append(snapshot.timestamp)
+        evolution['total_signals'].append(len(signals))
+        evolution['buy_signals'].append(sum(1 for s in signals if s.signal_type == SignalType.BUY))
+        evolution['sell_signals'].append(sum(1 for s in signals if s.signal_type == SignalType.SELL))
+        evolution['avg_rr'].append(sum(s.risk_reward for s in signals) / len(signals) if signals else 0)
+        evolution['avg_confidence'].append(sum(s.confidence for s in signals) / len(signals) if signals else 0)
+        evolution['market_conditions'].append(snapshot.market_conditions)
+    return evolution
+
+
+def assert_matches_loop(historical, manager):
+    """Evolución, estadísticas y rendimiento iguales a los recorridos por snapshot"""
+    evolution = manager.get_signals_evolution()
+    expected = loop_evolution(manager.snapshots)
+    assert evolution['timestamps'] == expected['timestamps']
+    assert evolution['market_conditions'] == expected['market_conditions']
+    for key in ('total_signals', 'buy_signals', 'sell_signals', 'avg_rr', 'avg_confidence'):
+        np.testing.assert_allclose(evolution[key], expected[key])
+
+    signals = [signal for snapshot in manager.snapshots for signal in snapshot.signals]
+    rr_values = [s.risk_reward for s in signals]
+    statistics = manager.get_signal_statistics()
+    assert statistics['total_signals'] == len(signals) == sum(expected['total_signals'])
+    assert statistics['buy_signals'] == sum(expected['buy_signals'])
+    assert statistics['avg_rr'] == pytest.approx(np.mean(rr_values))
+
+    performance = historical.analyze_historical_performance(manager.snapshots, manager.aggregates)
+    assert performance['buy_signals'] + performance['sell_signals'] == len(signals)
+    assert performance['avg_rr'] == pytest.approx(np.mean(rr_values))
+    assert performance['avg_confidence'] == pytest.approx(np.mean([s.confidence for s in signals]))
+    assert (performance['best_rr'], performance['worst_rr']) == (max(rr_values), min(rr_values))
+    assert performance['timespan']['start'] == manager.snapshots[0].timestamp
+
+
+def test_aggregates_match_per_snapshot_loops(historical):
+    """Los agregados siguen a los snapshots tras insertar, sustituir elementos y reasignar la lista"""
+    manager = historical.SMCHistoricalManager('BTC/USDT', '1h')
+    base = datetime(2024, 1, 10)
+    for k in np.random.default_rng(9).permutation(12):
+        manager.add_snapshot(make_snapshot(historical, base + timedelta(hours=int(k)),
+                                           make_signals(int(k) % 4, seed=int(k)), price=100.0 + k))
+    assert_matches_loop(historical, manager)
+
+    # Sustituir un elemento (misma longitud) y uno con otro timestamp
+    manager.snapshots[3] = make_snapshot(historical, manager.snapshots[3].timestamp, make_signals(5, seed=50))
+    assert_matches_loop(historical, manager)
+    manager.snapshots[0] = make_snapshot(historical, base + timedelta(hours=30), make_signals(2, seed=51))
+    assert [s.timestamp for s in manager.snapshots] == sorted(s.timestamp for s in manager.snapshots)
+    assert_matches_loop(historical, manager)
+    assert manager.get_snapshot_by_time(base + timedelta(hours=29)).timestamp == base + timedelta(hours=30)
+
+    manager.snapshots.append(make_snapshot(historical, base - timedelta(hours=1), make_signals(3, seed=52)))
+    assert_matches_loop(historical, manager)
+    manager.snapshots = manager.snapshots[4:]
+    assert_matches_loop(historical, manager)
+
+    # Lo devuelto no puede desalinear los agregados
+    evolution = manager.get_signals_evolution()
+    with pytest.raises(ValueError):
+        evolution['total_signals'][0] = 99
+    evolution['timestamps'].append(base)
+    evolution['market_conditions'].clear()
+    assert_matches_loop(historical, manager)
+
+    # Los pickles guardan una lista normal
+    assert type(pickle.loads(pickle.dumps(manager.snapshots))) is list
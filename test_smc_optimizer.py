@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests del barrido de parámetros SMC
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from smc_bot import SMCConfig
+from smc_optimizer import (
+    SharedOHLC, attach_shared_ohlc, config_key, grid_configs, random_configs,
+    run_parameter_sweep
+)
+from test_smc_bot import make_ohlc
+
+
+GRID = {'swing_length': [3, 5], 'min_rr': [2.0, 3.0]}
+
+
+def test_shared_ohlc_roundtrip():
+    """El DataFrame reconstruido desde memoria compartida es idéntico"""
+    df = make_ohlc(n=300, seed=31)
+    with SharedOHLC(df) as shared:
+        rebuilt, blocks = attach_shared_ohlc(shared.handle)
+        try:
+            assert rebuilt.index.equals(df.index)
+            np.testing.assert_array_equal(rebuilt.to_numpy(), df[['open', 'high', 'low', 'close', 'volume']].to_numpy())
+        finally:
+            del rebuilt
+            for block in blocks:
+                block.close()
+
+
+def test_grid_and_random_configs():
+    """Grid completo, muestreo reproducible y parámetros inválidos"""
+    configs = grid_configs(GRID)
+    assert len(configs) == 4
+    assert len({config_key(c) for c in configs}) == 4
+
+    space = {'swing_length': (3, 8), 'min_rr': [2.0, 2.5, 3.0]}
+    first = random_configs(space, 5, seed=7)
+    assert [config_key(c) for c in first] == [config_key(c) for c in random_configs(space, 5, seed=7)]
+    assert all(3 <= c.swing_length <= 8 for c in first)
+
+    with pytest.raises(ValueError):
+        grid_configs({'no_existe': [1]})
+
+
+def test_sweep_pool_matches_inline_and_resumes(tmp_path):
+    """El pool da los mismos resultados que la ejecución en proceso y el checkpoint evita recalcular"""
+    df = make_ohlc(n=400, seed=32)
+    configs = grid_configs(GRID, base=SMCConfig())
+    columns = ['config_key', 'total_trades', 'total_return', 'order_blocks', 'fvg_zones']
+
+    inline = run_parameter_sweep(df, configs, max_workers=1)
+    checkpoint = tmp_path / 'sweep.jsonl'
+    pooled = run_parameter_sweep(df, configs, max_workers=2, checkpoint_path=str(checkpoint))
+
+    assert len(pooled) == 4 and pooled['error'].isna().all()
+    assert (pooled['total_trades'] > 0).all()
+    assert list(pooled['rank']) == [1, 2, 3, 4]
+    pd.testing.assert_frame_equal(inline.sort_values('config_key')[columns].reset_index(drop=True),
+                                  pooled.sort_values('config_key')[columns].reset_index(drop=True))
+
+    # Simular una interrupción: quedan la cabecera, dos celdas y una línea cortada
+    lines = checkpoint.read_text().splitlines()
+    assert 'checkpoint' in json.loads(lines[0])
+    checkpoint.write_text('\n'.join(lines[:3]) + '\n{"config_key": "cort')
+    resumed = run_parameter_sweep(df, configs, max_workers=1, checkpoint_path=str(checkpoint))
+    assert len(resumed) == 4
+
+    # La línea cortada se descarta y solo se añaden las dos celdas pendientes
+    saved = checkpoint.read_text().splitlines()
+    assert saved[0] == lines[0]
+    keys = [json.loads(line)['config_key'] for line in saved[1:]]
+    assert keys[:2] == [json.loads(line)['config_key'] for line in lines[1:3]]
+    assert sorted(keys) == sorted(config_key(c) for c in configs)
+
+    # Un checkpoint de otros datos u opciones se rechaza en lugar de reutilizarse
+    with pytest.raises(ValueError):
+        run_parameter_sweep(df, configs, max_workers=1, checkpoint_path=str(checkpoint), initial_capital=5000)
+    changed = df.copy()
+    changed.iloc[-1, changed.columns.get_loc('close')] *= 1.01
+    with pytest.raises(ValueError):
+        run_parameter_sweep(changed, configs, max_workers=1, checkpoint_path=str(checkpoint))